@@ -0,0 +1,108 @@
+import threading
+import time
+from logger import log_message
+from quote_stream import drain_latest
+
+# Intervalo (segundos) para recarregar os alertas ativos do banco
+DEFAULT_RELOAD_SECONDS = 30
+
+
+class AlertEngine:
+    """Consumidor do barramento de cotações que avalia os alertas ativos a cada tick.
+
+    Os alertas ativos e o preço médio de cada posição ficam em memória e são
+    recarregados periodicamente (ou sob demanda, via request_reload), de modo
+    que cada tick é avaliado sem consultar o banco nem o provedor.
+    """
+
+    def __init__(self, db_manager, stream, on_alert=None, reload_seconds=DEFAULT_RELOAD_SECONDS):
+        self.db = db_manager
+        self.subscriber = stream.subscribe("alerts")
+        self.on_alert = on_alert
+        self.reload_seconds = reload_seconds
+        self.lock = threading.Lock()
+        self._alerts = {}  # ticker -> [(id, tipo, valor alvo, variação percentual), ...]
+        self._average_prices = {}  # ticker -> preço médio de compra
+        self._loaded_at = None
+        self._reload_requested = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def reload(self):
+        alerts = {}
+        for alert_id, asset_name, alert_type, target_value, percentage_change in self.db.get_active_alerts():
+            alerts.setdefault(asset_name + ".SA", []).append((alert_id, alert_type, target_value, percentage_change))
+        average_prices = {}
+        for asset_id, name, asset_type, total_quantity, total_invested_cost in self.db.get_all_assets_with_transactions():
+            average_prices[name + ".SA"] = total_invested_cost / total_quantity if total_quantity > 0 else 0.0
+        with self.lock:
+            self._alerts = alerts
+            self._average_prices = average_prices
+            self._loaded_at = time.monotonic()
+
+    def request_reload(self):
+        """Pede a releitura dos alertas (ex: após cadastrar ou excluir um alerta)"""
+        self._reload_requested.set()
+
+    def alert_tickers(self):
+        with self.lock:
+            return set(self._alerts)
+
+    def evaluate(self, ticker, current_price):
+        """Verifica os alertas de um ticker. Retorna as mensagens dos alertas disparados"""
+        with self.lock:
+            alerts = list(self._alerts.get(ticker, []))
+            average_buy_price = self._average_prices.get(ticker, 0.0)
+        asset_name = ticker[:-3] if ticker.endswith(".SA") else ticker
+
+        messages = []
+        for alert_id, alert_type, target_value, percentage_change in alerts:
+            title = alert_message = None
+            if alert_type == "price_target":
+                if current_price >= target_value:
+                    title = "Alerta de Preço"
+                    alert_message = f"ALERTA DE PREÇO: {asset_name} atingiu ou superou o preço alvo de R$ {target_value:.2f}! Preço atual: R$ {current_price:.2f}"
+            elif alert_type == "percentage_change":
+                # Variação medida em relação ao preço médio de compra
+                if average_buy_price > 0:
+                    current_percentage_change = ((current_price - average_buy_price) / average_buy_price) * 100
+                    if abs(current_percentage_change) >= percentage_change:
+                        title = "Alerta de Variação"
+                        alert_message = f"ALERTA DE VARIAÇÃO: {asset_name} teve uma variação de {current_percentage_change:.2f}% (alvo: {percentage_change:.2f}%)! Preço atual: R$ {current_price:.2f}"
+            if alert_message is None:
+                continue
+
+            log_message(alert_message)
+            self.db.deactivate_alert(alert_id) # Desativa o alerta após ser acionado
+            with self.lock:
+                remaining = [a for a in self._alerts.get(ticker, []) if a[0] != alert_id]
+                if remaining:
+                    self._alerts[ticker] = remaining
+                else:
+                    self._alerts.pop(ticker, None)
+            if self.on_alert:
+                self.on_alert(title, alert_message)
+            messages.append(alert_message)
+        return messages
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                if (self._loaded_at is None or self._reload_requested.is_set()
+                        or time.monotonic() - self._loaded_at > self.reload_seconds):
+                    self._reload_requested.clear()
+                    self.reload()
+                for ticker, tick in drain_latest(self.subscriber, timeout=1.0).items():
+                    self.evaluate(ticker, tick.price)
+            except Exception as e:
+                log_message(f"Erro ao verificar alertas: {e}")
+                time.sleep(1)
@@ -2,11 +2,12 @@ import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 
 class AlertManagerWindow(tk.Toplevel):
-    def __init__(self, parent, db_manager, yf_integration, refresh_callback):
+    def __init__(self, parent, async_db, price_provider, refresh_callback):
         super().__init__(parent)
         self.title("Gerenciar Alertas")
-        self.db = db_manager
-        self.yf_integration = yf_integration
+        # Fachada assíncrona (AsyncDatabase): os resultados chegam por callback
+        self.db = async_db
+        self.price_provider = price_provider
         self.refresh_callback = refresh_callback
 
         self.create_widgets()
@@ -76,7 +77,9 @@ class AlertManagerWindow(tk.Toplevel):
             messagebox.showwarning("Erro", "Por favor, preencha todos os campos.")
             return
 
-        asset = self.db.get_asset_by_name(asset_name)
+        self.db.get_asset_by_name(asset_name, callback=lambda asset: self._add_alert_for(asset, asset_name, alert_type, target_value_str))
+
+    def _add_alert_for(self, asset, asset_name, alert_type, target_value_str):
         if not asset:
             messagebox.showerror("Erro", f"Ativo \'{asset_name}\' não encontrado no banco de dados.")
             return
@@ -89,10 +92,11 @@ class AlertManagerWindow(tk.Toplevel):
             return
 
         if alert_type == "Preço Alvo":
-            self.db.add_alert(asset_id, "price_target", target_value=value)
+            self.db.add_alert(asset_id, "price_target", target_value=value, callback=self._alert_added)
         elif alert_type == "Variação Percentual":
-            self.db.add_alert(asset_id, "percentage_change", percentage_change=value)
-        
+            self.db.add_alert(asset_id, "percentage_change", percentage_change=value, callback=self._alert_added)
+
+    def _alert_added(self, alert_id):
         messagebox.showinfo("Sucesso", "Alerta adicionado com sucesso!")
         self.asset_name_entry.delete(0, tk.END)
         self.target_value_entry.delete(0, tk.END)
@@ -101,10 +105,13 @@ class AlertManagerWindow(tk.Toplevel):
         self.refresh_callback() # Atualiza a tela principal para verificar novos alertas
 
     def load_alerts(self):
+        # A consulta roda na thread do banco; a tabela é preenchida quando o resultado chega
+        self.db.get_active_alerts(callback=self._show_alerts)
+
+    def _show_alerts(self, alerts):
         for item in self.alerts_tree.get_children():
             self.alerts_tree.delete(item)
-        
-        alerts = self.db.get_active_alerts()
+
         for alert in alerts:
             # alert: (id, asset_name, alert_type, target_value, percentage_change)
             alert_id = alert[0]
@@ -132,11 +139,14 @@ class AlertManagerWindow(tk.Toplevel):
         alert_id = self.alerts_tree.item(selected_item[0], "values")[0]
         
         if messagebox.askyesno("Confirmar Desativação", f"Tem certeza que deseja desativar o alerta ID {alert_id}? "):
-            if self.db.deactivate_alert(alert_id):
-                messagebox.showinfo("Sucesso", "Alerta desativado com sucesso!")
-                self.load_alerts()
-                self.refresh_callback()
-            else:
-                messagebox.showerror("Erro", "Erro ao desativar o alerta.")
+            self.db.deactivate_alert(alert_id, callback=self._alert_deactivated)
+
+    def _alert_deactivated(self, success):
+        if success:
+            messagebox.showinfo("Sucesso", "Alerta desativado com sucesso!")
+            self.load_alerts()
+            self.refresh_callback()
+        else:
+            messagebox.showerror("Erro", "Erro ao desativar o alerta.")
 
 
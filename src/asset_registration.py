@@ -1,18 +1,21 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from database_manager import DatabaseManager
+from async_database import AsyncDatabase
 from datetime import datetime
 from yfinance_integration import YFinanceIntegration
 
 class AssetRegistrationWindow(tk.Toplevel):
-    def __init__(self, parent, on_save_callback):
+    def __init__(self, parent, on_save_callback, db_manager=None, price_provider=None, async_db=None):
         super().__init__(parent)
         self.title("Cadastrar Novo Ativo")
         self.geometry("550x450")
         self.resizable(True, True)
         self.on_save_callback = on_save_callback
-        self.db = DatabaseManager() # Instanciar o DatabaseManager
-        self.yf_integration = YFinanceIntegration() # Instanciar o YFinanceIntegration
+        self.db = db_manager or DatabaseManager() # Reutilizar o DatabaseManager do app, se fornecido
+        # A gravação roda na thread do banco, para a janela não travar enquanto outra gravação segura o banco
+        self.async_db = async_db or AsyncDatabase(self.db, self)
+        self.price_provider = price_provider or YFinanceIntegration() # Qualquer PriceProvider
 
         self.create_widgets()
 
@@ -134,7 +137,7 @@ class AssetRegistrationWindow(tk.Toplevel):
                 ticker_with_suffix = ticker
             
             # Buscar cotação atual
-            current_price = self.yf_integration.get_current_price(ticker_with_suffix)
+            current_price = self.price_provider.get_current_price(ticker_with_suffix, asset_type)
             
             if current_price and current_price > 0:
                 # Preencher o campo de preço
@@ -216,28 +219,33 @@ class AssetRegistrationWindow(tk.Toplevel):
             messagebox.showerror("Erro", "Data deve estar no formato DD/MM/AAAA (ex: 15/01/2024).", parent=self)
             return
 
-        # Verificar se o ativo já existe
-        asset = self.db.get_asset_by_name(name)
-        asset_id = None
-
-        if asset:
-            asset_id = asset[0] # ID do ativo existente
-        else:
-            # Adicionar novo ativo se não existir
-            asset_id = self.db.add_asset(name, asset_type)
-            if not asset_id:
-                messagebox.showerror("Erro", "Não foi possível adicionar o ativo.", parent=self)
-                return
-
-        # Adicionar a transação
-        transaction_id = self.db.add_transaction(asset_id, transaction_type, quantity, price, date_db)
-
-        if transaction_id:
-            messagebox.showinfo("Sucesso", "Ativo e transação cadastrados com sucesso!", parent=self)
-            self.on_save_callback() # Chamar callback para atualizar a Treeview principal
-            self.destroy()
-        else:
-            messagebox.showerror("Erro", "Não foi possível registrar a transação.", parent=self)
+        self.async_db.submit(self._save, name, asset_type, transaction_type, quantity, price, date_db,
+                             callback=self._saved, on_error=lambda e: messagebox.showerror("Erro", str(e), parent=self))
+
+    def _save(self, name, asset_type, transaction_type, quantity, price, date_db):
+        # Ativo e transação são gravados juntos: se a transação falhar, o ativo novo não fica sem transações
+        with self.db.transaction():
+            # Verificar se o ativo já existe
+            asset = self.db.get_asset_by_name(name)
+            asset_id = None
+
+            if asset:
+                asset_id = asset[0] # ID do ativo existente
+            else:
+                # Adicionar novo ativo se não existir
+                asset_id = self.db.add_asset(name, asset_type)
+                if not asset_id:
+                    raise ValueError("Não foi possível adicionar o ativo.")
+
+            # Adicionar a transação
+            transaction_id = self.db.add_transaction(asset_id, transaction_type, quantity, price, date_db)
+            if not transaction_id:
+                raise ValueError("Não foi possível registrar a transação.")
+
+    def _saved(self, result):
+        messagebox.showinfo("Sucesso", "Ativo e transação cadastrados com sucesso!", parent=self)
+        self.on_save_callback() # Chamar callback para atualizar a Treeview principal
+        self.destroy()
 
 
 
@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+from logger import log_message
+
+
+class BackgroundWorker:
+    """Executa tarefas longas em threads próprias, fora da thread da interface Tk.
+
+    submit() retorna um Future; callback(resultado) e on_error(exceção) são
+    entregues na thread da interface por root.after (sem root, rodam na
+    própria thread da tarefa).
+    """
+
+    # Como as tarefas aparecem nas mensagens de erro
+    task_description = "tarefa em segundo plano"
+
+    def __init__(self, root=None, max_workers=1, thread_name_prefix="tarefas"):
+        self.root = root
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+    def submit(self, func, *args, callback=None, on_error=None, **kwargs):
+        """Executa func(*args, **kwargs) em segundo plano. Retorna o Future"""
+        future = self._executor.submit(func, *args, **kwargs)
+        if callback or on_error:
+            future.add_done_callback(lambda f: self._deliver(f, callback, on_error))
+        return future
+
+    def _deliver(self, future, callback, on_error):
+        # Chamado na thread da tarefa: os widgets só podem ser tocados na thread da interface
+        if self.root is not None:
+            self.root.after(0, lambda: self._run_callback(future, callback, on_error))
+        else:
+            self._run_callback(future, callback, on_error)
+
+    def _run_callback(self, future, callback, on_error):
+        try:
+            error = future.exception()
+            if error is None:
+                if callback:
+                    callback(future.result())
+            elif on_error:
+                on_error(error)
+            else:
+                log_message(f"Erro em {self.task_description}: {error}")
+        except Exception as e:
+            log_message(f"Erro ao tratar o resultado de {self.task_description}: {e}")
+
+    def close(self, wait=True):
+        """Encerra as threads depois das tarefas já enviadas"""
+        self._executor.shutdown(wait=wait)
+
+
+class AsyncDatabase(BackgroundWorker):
+    """Fachada assíncrona do DatabaseManager para a interface Tk.
+
+    As chamadas rodam em uma thread dedicada ao banco, uma de cada vez, e
+    retornam um Future. Os métodos do DatabaseManager podem ser chamados
+    pela fachada com o mesmo nome e argumentos, mais callback(resultado) e
+    on_error(exceção): async_db.get_active_alerts(callback=self.show_alerts).
+    Com root, os callbacks são entregues na thread da interface por
+    root.after; sem root, rodam na própria thread do banco. Downloads e
+    outras tarefas demoradas vão para um BackgroundWorker próprio, para não
+    atrasar as consultas da interface na fila do banco.
+    """
+
+    task_description = "consulta ao banco de dados"
+
+    def __init__(self, db_manager, root=None):
+        self.db = db_manager
+        super().__init__(root, max_workers=1, thread_name_prefix="banco")
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        def call(*args, callback=None, on_error=None, **kwargs):
+            return self.submit(method, *args, callback=callback, on_error=on_error, **kwargs)
+
+        return call
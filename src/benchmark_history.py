@@ -0,0 +1,120 @@
+import datetime
+import threading
+import pandas as pd
+
+# Benchmarks mantidos em dia pelo backfill agendado, mesmo antes de serem consultados
+DEFAULT_BENCHMARKS = ("^BVSP",)
+# Folga (dias) aceita entre a data inicial pedida e a primeira data gravada,
+# para cobrir fins de semana e feriados sem pregão
+COVERAGE_TOLERANCE_DAYS = 7
+
+
+class BenchmarkHistoryStore:
+    """Histórico de índices de referência (ex: ^BVSP) gravado no banco de dados.
+
+    Cada benchmark é baixado uma vez e depois atualizado de forma incremental,
+    só com os pregões que faltam. A série fica também em memória, de modo que
+    cálculos de beta e comparações para muitos ativos não fazem nenhuma
+    requisição adicional ao provedor de cotações.
+    """
+
+    def __init__(self, db_manager, price_provider, lookback_days=365):
+        self.db = db_manager
+        self.price_provider = price_provider
+        self.lookback_days = lookback_days
+        self.lock = threading.Lock()
+        self._ticker_locks = {}
+        self._series = {}  # ticker -> Series de fechamentos indexada por data
+        self._checked_on = {}  # ticker -> data da última atualização incremental
+        self._tracked = dict.fromkeys(DEFAULT_BENCHMARKS)  # ticker -> data inicial pedida
+
+    def _ticker_lock(self, ticker):
+        with self.lock:
+            return self._ticker_locks.setdefault(ticker, threading.Lock())
+
+    def _download(self, ticker, start_date, end_date):
+        # A data final do provedor é exclusiva
+        end_exclusive = (datetime.date.fromisoformat(end_date) + datetime.timedelta(days=1)).isoformat()
+        history = self.price_provider.get_historical_prices_bulk([ticker], start_date, end_exclusive)
+        prices = history.get(ticker) or []
+        if prices:
+            self.db.add_benchmark_history(ticker, prices)
+            print(f"Histórico do benchmark {ticker}: {len(prices)} registros baixados ({start_date} a {end_date})")
+        return prices
+
+    def refresh(self, ticker, start_date=None):
+        """Garante que o banco tem o histórico do benchmark desde start_date até hoje"""
+        today = datetime.date.today()
+        if not start_date:
+            start_date = (today - datetime.timedelta(days=self.lookback_days)).isoformat()
+        with self._ticker_lock(ticker):
+            first_date, last_date = self.db.get_benchmark_date_range(ticker)
+            changed = False
+            if first_date is None:
+                changed = bool(self._download(ticker, start_date, today.isoformat()))
+                if changed:
+                    self._checked_on[ticker] = today
+            else:
+                tolerance = datetime.timedelta(days=COVERAGE_TOLERANCE_DAYS)
+                if datetime.date.fromisoformat(first_date) - tolerance > datetime.date.fromisoformat(start_date):
+                    previous_day = (datetime.date.fromisoformat(first_date) - datetime.timedelta(days=1)).isoformat()
+                    changed = bool(self._download(ticker, start_date, previous_day))
+                # A atualização incremental é feita no máximo uma vez por dia
+                if last_date < today.isoformat() and self._checked_on.get(ticker) != today:
+                    next_day = (datetime.date.fromisoformat(last_date) + datetime.timedelta(days=1)).isoformat()
+                    # Só uma consulta com dados conta como feita: uma falha passageira é tentada de novo
+                    if self._download(ticker, next_day, today.isoformat()):
+                        changed = True
+                        self._checked_on[ticker] = today
+            if changed or ticker not in self._series:
+                self._series[ticker] = self._load(ticker)
+            return self._series[ticker]
+
+    def track(self, ticker, start_date=None):
+        """Inclui o benchmark nas atualizações de refresh_tracked, desde start_date"""
+        default_start = (datetime.date.today() - datetime.timedelta(days=self.lookback_days)).isoformat()
+        with self.lock:
+            # Vale a data inicial mais antiga pedida (None = os últimos lookback_days)
+            if ticker not in self._tracked or (start_date or default_start) < (self._tracked[ticker] or default_start):
+                self._tracked[ticker] = start_date
+
+    def refresh_tracked(self):
+        """Atualiza todos os benchmarks acompanhados (chamado pelo backfill agendado)"""
+        with self.lock:
+            tracked = dict(self._tracked)
+        for ticker, start_date in tracked.items():
+            try:
+                self.refresh(ticker, start_date)
+            except Exception as e:
+                print(f"Erro ao atualizar o histórico do benchmark {ticker}: {e}")
+
+    def _load(self, ticker, start_date=None, end_date=None):
+        rows = self.db.get_benchmark_history(ticker, start_date, end_date)
+        if not rows:
+            return pd.Series(dtype=float)
+        df = pd.DataFrame(rows, columns=["Date", "Price"])
+        return pd.Series(df["Price"].values, index=pd.to_datetime(df["Date"]), dtype=float)
+
+    def get_series(self, ticker, start_date=None, end_date=None):
+        """Série de fechamentos do benchmark entre start_date e end_date (AAAA-MM-DD)"""
+        series = self.refresh(ticker, start_date)
+        if start_date:
+            series = series[series.index >= pd.Timestamp(start_date)]
+        if end_date:
+            series = series[series.index <= pd.Timestamp(end_date)]
+        return series
+
+    def read_series(self, ticker, start_date=None, end_date=None):
+        """Como get_series, mas lida direto do banco, sem a série em memória nem download.
+
+        Dentro de db.snapshot() enxerga o mesmo retrato das demais leituras.
+        """
+        return self._load(ticker, start_date, end_date)
+
+    def get_history(self, ticker, start_date=None, end_date=None):
+        """Mesmo conteúdo de get_series, como lista de tuplas (data "AAAA-MM-DD", preço)"""
+        series = self.get_series(ticker, start_date, end_date)
+        return list(zip(series.index.strftime("%Y-%m-%d"), series.tolist()))
+
+    def get_daily_returns(self, ticker, start_date=None, end_date=None):
+        return self.get_series(ticker, start_date, end_date).pct_change().dropna()
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import deque
+
+
+class NegativeCache:
+    """Suprime temporariamente tickers cujas consultas falham.
+
+    Cada falha seguida de um ticker dobra o tempo de supressão (recuo
+    exponencial), de base_delay até max_delay segundos. Um sucesso limpa o
+    histórico do ticker.
+    """
+
+    def __init__(self, base_delay=5 * 60, max_delay=24 * 60 * 60):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self._entries = {}  # ticker -> (falhas seguidas, suprimido até)
+
+    def record_failure(self, ticker):
+        with self.lock:
+            failures = self._entries.get(ticker, (0, 0))[0] + 1
+            delay = min(self.base_delay * 2 ** (failures - 1), self.max_delay)
+            self._entries[ticker] = (failures, time.time() + delay)
+
+    def record_success(self, ticker):
+        with self.lock:
+            self._entries.pop(ticker, None)
+
+    def is_suppressed(self, ticker):
+        with self.lock:
+            entry = self._entries.get(ticker)
+            return entry is not None and entry[1] > time.time()
+
+    def suppressed(self):
+        """Retorna {ticker: (falhas seguidas, segundos restantes)} dos tickers suprimidos agora"""
+        now = time.time()
+        with self.lock:
+            return {ticker: (failures, until - now)
+                    for ticker, (failures, until) in self._entries.items() if until > now}
+
+    def clear(self, tickers=None):
+        with self.lock:
+            if tickers is None:
+                self._entries.clear()
+            else:
+                for ticker in tickers:
+                    self._entries.pop(ticker, None)
+
+
+class CircuitBreaker:
+    """Interrompe as requisições ao provedor quando a taxa de erros dispara.
+
+    Fechado: as requisições passam e seus resultados entram em uma janela
+    deslizante de window segundos. Se houver ao menos min_requests na janela e
+    a taxa de erro atingir error_threshold, o circuito abre e nenhuma
+    requisição é feita por cooldown segundos. Depois disso, fica semiaberto:
+    uma requisição de teste decide se ele fecha novamente ou volta a abrir.
+    """
+
+    CLOSED = "fechado"
+    OPEN = "aberto"
+    HALF_OPEN = "semiaberto"
+
+    def __init__(self, window=60, min_requests=10, error_threshold=0.5, cooldown=2 * 60):
+        self.window = window
+        self.min_requests = min_requests
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._outcomes = deque()  # (timestamp, sucesso)
+
+    def allow_request(self):
+        with self.lock:
+            if self.state == self.OPEN:
+                if time.time() - self._opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record(self, success):
+        now = time.time()
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                if success:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._outcomes.append((now, success))
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._outcomes.popleft()
+            errors = sum(1 for _, ok in self._outcomes if not ok)
+            if len(self._outcomes) >= self.min_requests and errors / len(self._outcomes) >= self.error_threshold:
+                self._open(now)
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        print(f"Circuito do provedor de cotações aberto por {self.cooldown} segundos devido a erros.")
+
+    def status(self):
+        with self.lock:
+            return self.state
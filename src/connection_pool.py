@@ -0,0 +1,203 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Pragmas aplicados a toda conexão. Em WAL, leitores não bloqueiam o escritor
+# (nem são bloqueados por ele) e synchronous=NORMAL é seguro contra corrupção.
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,  # negativo = KiB (~16 MB por conexão)
+    "mmap_size": 128 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,  # ms
+    "foreign_keys": "ON",  # necessário para o ON DELETE CASCADE das tabelas filhas de assets
+}
+# Número máximo de conexões de leitura abertas ao mesmo tempo
+DEFAULT_READERS = 4
+
+
+class ConnectionPool:
+    """Conexões SQLite gerenciadas: um único escritor e um pool limitado de leitores.
+
+    Toda escrita passa por writer(), que serializa as threads com um RLock e
+    confirma (ou desfaz) a transação ao sair do bloco. Blocos writer()
+    aninhados viram savepoints: um erro dentro deles desfaz só a parte
+    aninhada. Leituras usam reader(), que empresta uma das conexões de leitura
+    (somente leitura) e a devolve ao final; se todas estiverem em uso, a
+    thread espera a próxima livre. Uma thread que já tem uma conexão de
+    leitura emprestada recebe a mesma conexão em chamadas aninhadas, e uma
+    thread com uma transação de escrita aberta lê pela conexão de escrita,
+    enxergando o que ainda não foi confirmado.
+    """
+
+    def __init__(self, db_name, readers=DEFAULT_READERS, pragmas=None):
+        self.db_name = db_name
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        # Um banco em memória só existe na conexão que o criou: sem leitores separados
+        self.max_readers = 0 if db_name == ":memory:" else readers
+        self.write_lock = threading.RLock()
+        self._writer = None
+        self._write_depth = 0
+        self._writer_owner = None
+        self._readers = queue.Queue()
+        self._reader_count = 0
+        self._readers_lock = threading.Lock()
+        self._all_readers = []
+        self._local = threading.local()
+        self.trace_callback = None
+        self.closed = False
+
+    def _connect(self, read_only=False):
+        conn = sqlite3.connect(self.db_name, check_same_thread=False, timeout=self.pragmas["busy_timeout"] / 1000)
+        for name, value in self.pragmas.items():
+            if name == "journal_mode" and (read_only or self.db_name == ":memory:"):
+                continue  # definido pelo escritor; vale para o arquivo todo
+            conn.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        conn.set_trace_callback(self.trace_callback)
+        return conn
+
+    def set_trace_callback(self, callback):
+        """Registra callback(sql) para cada comando executado, em todas as conexões"""
+        self.trace_callback = callback
+        with self._readers_lock:
+            connections = [self._writer] + self._all_readers
+        for conn in connections:
+            if conn is not None:
+                conn.set_trace_callback(callback)
+
+    def _get_writer(self):
+        if self._writer is None:
+            self._writer = self._connect()
+        return self._writer
+
+    @contextmanager
+    def writer(self):
+        """Conexão de escrita exclusiva; commit ao sair do bloco (rollback em caso de erro)"""
+        with self.write_lock:
+            conn = self._get_writer()
+            self._write_depth += 1
+            savepoint = f"sp_{self._write_depth}"
+            try:
+                if self._write_depth == 1:
+                    self._writer_owner = threading.get_ident()
+                    if not conn.in_transaction:
+                        conn.execute("BEGIN IMMEDIATE")
+                else:
+                    conn.execute(f"SAVEPOINT {savepoint}")
+                try:
+                    yield conn
+                except BaseException:
+                    if self._write_depth == 1:
+                        conn.rollback()
+                    elif conn.in_transaction:
+                        conn.execute(f"ROLLBACK TO {savepoint}")
+                        conn.execute(f"RELEASE {savepoint}")
+                    raise
+                if self._write_depth == 1:
+                    conn.commit()
+                elif conn.in_transaction:
+                    conn.execute(f"RELEASE {savepoint}")
+            finally:
+                self._write_depth -= 1
+                if self._write_depth == 0:
+                    self._writer_owner = None
+
+    @contextmanager
+    def exclusive(self):
+        """Conexão de escrita sem transação aberta, com as outras threads impedidas de gravar.
+
+        Para operações que gerenciam a própria transação, como a API de backup
+        do SQLite usando o banco em uso como destino.
+        """
+        with self.write_lock:
+            if self._write_depth:
+                raise sqlite3.OperationalError("exclusive() não pode ser usado dentro de writer()")
+            yield self._get_writer()
+
+    @contextmanager
+    def reader(self):
+        """Conexão de leitura emprestada do pool"""
+        if self.max_readers == 0 or self._writer_owner == threading.get_ident():
+            with self.write_lock:
+                yield self._get_writer()
+            return
+
+        held = getattr(self._local, "reader", None)
+        if held is not None:
+            yield held
+            return
+
+        conn = self._acquire_reader()
+        self._local.reader = conn
+        try:
+            yield conn
+        finally:
+            self._local.reader = None
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    @contextmanager
+    def snapshot(self):
+        """Conexão de leitura presa a um único retrato do banco durante todo o bloco.
+
+        Abre uma transação de leitura na conexão emprestada: em WAL, todas as
+        consultas do bloco enxergam o banco como estava na primeira leitura,
+        mesmo que outras threads confirmem gravações nesse meio tempo, e o
+        escritor não espera o bloco terminar. Como a conexão fica associada à
+        thread, os métodos do DatabaseManager chamados dentro do bloco também
+        leem desse retrato; gravações feitas no bloco não aparecem nessas
+        leituras. O retrato impede o checkpoint de avançar além dele, então o
+        bloco deve durar só o tempo da análise.
+        """
+        with self.reader() as conn:
+            # Retrato já aberto (bloco aninhado), conexão de escrita com transação
+            # em andamento ou banco em memória, em que o bloqueio de escrita já isola a leitura
+            if conn.in_transaction or self.max_readers == 0:
+                yield conn
+                return
+            conn.execute("BEGIN")
+            try:
+                # O retrato é fixado na primeira leitura, não no BEGIN
+                conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+
+    def _acquire_reader(self):
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._readers_lock:
+            if self._reader_count < self.max_readers:
+                conn = self._connect(read_only=True)
+                self._reader_count += 1
+                self._all_readers.append(conn)
+                return conn
+        return self._readers.get()
+
+    def close(self):
+        with self.write_lock:
+            for conn in self._all_readers:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._all_readers = []
+            self._readers = queue.Queue()
+            self._reader_count = 0
+            if self._writer is not None:
+                try:
+                    self._writer.close()
+                except sqlite3.Error:
+                    pass
+                self._writer = None
+            self.closed = True
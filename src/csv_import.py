@@ -0,0 +1,222 @@
+import csv
+import os
+from collections import namedtuple
+import pandas as pd
+from data_export import prefixed_path
+
+# Linhas lidas do CSV, validadas e gravadas por vez
+DEFAULT_CSV_CHUNK_SIZE = 100000
+
+# Descrição de um CSV importável: colunas aceitas, obrigatórias, numéricas,
+# coluna de data, chave de conflito do upsert e verificações extras
+# (função df -> máscara das linhas inválidas, motivo). Só chaves naturais
+# (ex: ativo e data) atualizam o registro gravado; um id já usado por outro
+# registro é rejeitado, e um id com o mesmo conteúdo é mantido como está
+CsvTable = namedtuple("CsvTable", ["table", "columns", "required", "integers", "reals", "date_column", "conflict", "checks"])
+
+CSV_IMPORT_TABLES = (
+    CsvTable("assets", ("id", "name", "type"), ("name", "type"), ("id",), (), None, (), ()),
+    CsvTable("transactions", ("id", "asset_id", "transaction_type", "quantity", "price", "transaction_date"),
+             ("asset_id", "transaction_type", "quantity", "price", "transaction_date"), ("id", "asset_id"), ("quantity", "price"),
+             "transaction_date", (),
+             ((lambda df: ~df["transaction_type"].isin(["compra", "venda"]), "tipo de transação deve ser compra ou venda"),
+              (lambda df: df["quantity"] <= 0, "quantidade deve ser positiva"),
+              (lambda df: df["price"] < 0, "preço negativo"))),
+    # Sem id: o histórico é identificado por ativo e data, e um preço repetido substitui o gravado
+    CsvTable("price_history", ("asset_id", "price", "record_date"), ("asset_id", "price", "record_date"), ("asset_id",), ("price",),
+             "record_date", ("asset_id", "record_date"),
+             ((lambda df: df["price"] <= 0, "preço deve ser positivo"),)),
+    CsvTable("dividends", ("id", "asset_id", "dividend_value", "payment_date"), ("asset_id", "dividend_value", "payment_date"),
+             ("id", "asset_id"), ("dividend_value",), "payment_date", (),
+             ((lambda df: df["dividend_value"] < 0, "dividendo negativo"),)),
+    CsvTable("alerts", ("id", "asset_id", "alert_type", "target_value", "percentage_change", "is_active"), ("asset_id", "alert_type"),
+             ("id", "asset_id", "is_active"), ("target_value", "percentage_change"), None, (),
+             ((lambda df: ~df["alert_type"].isin(["price_target", "percentage_change"]), "tipo de alerta desconhecido"),)),
+    CsvTable("events", ("id", "event_date", "event_type", "description", "asset_id"), ("event_date", "event_type", "description"),
+             ("id", "asset_id"), (), "event_date", (), ()),
+)
+
+SQL_TYPES = {"integer": "INTEGER", "real": "REAL", "text": "TEXT"}
+
+
+def parse_dates(values):
+    """Converte uma Series de datas (AAAA-MM-DD[...] ou DD/MM/AAAA) para AAAA-MM-DD; inválidas viram NaN"""
+    values = values.str.strip()
+    dates = pd.to_datetime(values.str[:10], format="%Y-%m-%d", errors="coerce")
+    dates = dates.fillna(pd.to_datetime(values, format="%d/%m/%Y", errors="coerce"))
+    return dates.dt.strftime("%Y-%m-%d")
+
+
+def validate_chunk(spec, df):
+    """Valida e converte um bloco lido como texto. Retorna (linhas válidas, motivo de cada linha rejeitada)"""
+    reasons = pd.Series("", index=df.index)
+
+    def reject(mask, reason):
+        reasons[mask & (reasons == "")] = reason
+
+    blank = {column: df[column].str.strip() == "" for column in df.columns}
+    for column in spec.required:
+        reject(blank[column], f"{column} vazio")
+    for column in spec.integers + spec.reals:
+        if column in df.columns:
+            raw = df[column]
+            df[column] = pd.to_numeric(raw.where(~blank[column]), errors="coerce")
+            reject(df[column].isna() & ~blank[column], f"{column} não é numérico")
+            if column in spec.integers:
+                reject(df[column].notna() & (df[column] % 1 != 0), f"{column} não é inteiro")
+    if spec.date_column:
+        df[spec.date_column] = parse_dates(df[spec.date_column])
+        reject(df[spec.date_column].isna() & ~blank[spec.date_column], f"{spec.date_column} não é uma data válida")
+    for check, reason in spec.checks:
+        reject(check(df).fillna(False), reason)
+
+    return df[reasons == ""], reasons[reasons != ""]
+
+
+class CsvImportReport:
+    """Resultado da importação de CSV: linhas importadas e rejeitadas por tabela.
+
+    É verdadeiro quando a importação foi concluída (mesmo com linhas rejeitadas).
+    """
+
+    def __init__(self):
+        self.ok = False
+        self.imported = {}
+        self.rejected = {}
+        self.skipped = {}
+        self.reject_files = []
+
+    def __bool__(self):
+        return self.ok
+
+    def summary(self):
+        lines = [f"{table}: {count} linhas importadas, {self.rejected.get(table, 0)} rejeitadas"
+                 for table, count in self.imported.items()]
+        lines += [f"{table}: não importado ({reason})" for table, reason in self.skipped.items()]
+        if self.reject_files:
+            lines.append("Linhas rejeitadas gravadas em: " + ", ".join(self.reject_files))
+        return "\n".join(lines)
+
+
+class CsvImporter:
+    """Importa CSVs em blocos por uma tabela temporária de preparação.
+
+    Cada bloco é lido como texto, validado com operações vetorizadas do
+    pandas, gravado na tabela temporária e mesclado na tabela real com
+    INSERT ... ON CONFLICT. A tabela temporária guarda um bloco por vez, então
+    a memória não cresce com o tamanho do arquivo. Linhas inválidas, de
+    ativos inexistentes ou com id de outro registro já gravado vão para
+    rejeitados_<arquivo>, com a linha e o motivo.
+    Deve rodar dentro de uma transação de escrita.
+    """
+
+    def __init__(self, conn, chunk_size=DEFAULT_CSV_CHUNK_SIZE):
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.report = CsvImportReport()
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS rejected_asset_ids (id INTEGER PRIMARY KEY)")
+
+    def _column_type(self, spec, column):
+        if column in spec.integers:
+            return "integer"
+        if column in spec.reals:
+            return "real"
+        return "text"
+
+    def _merge_sql(self, spec, columns, staging):
+        column_list = ", ".join(columns)
+        updates = [column for column in columns if column not in spec.conflict]
+        if spec.conflict and all(column in columns for column in spec.conflict) and updates:
+            action = (f"ON CONFLICT ({', '.join(spec.conflict)}) DO UPDATE SET "
+                      + ", ".join(f"{column} = excluded.{column}" for column in updates))
+        else:
+            action = "ON CONFLICT DO NOTHING"
+        # "WHERE true" separa o SELECT da cláusula ON CONFLICT
+        return f"INSERT INTO {spec.table} ({column_list}) SELECT {column_list} FROM {staging} WHERE true ORDER BY line {action}"
+
+    def _invalid_references_sql(self, spec, columns, staging):
+        """Linhas da preparação que não podem ser mescladas: (linha, motivo)"""
+        checks = []
+        if "id" in columns:
+            # Um id já gravado com outro conteúdo é de outro registro (ex: CSV de outra carteira)
+            differs = " OR ".join(f"t.{column} IS NOT s.{column}" for column in columns if column != "id") or "0"
+            checks.append(f"SELECT line, 'id já usado por outro registro' FROM {staging} s "
+                          f"WHERE EXISTS (SELECT 1 FROM {spec.table} t WHERE t.id = s.id AND ({differs}))")
+        if spec.table == "assets" and "id" in columns:
+            checks.append(f"SELECT line, 'nome já cadastrado para outro ativo' FROM {staging} s "
+                          f"WHERE EXISTS (SELECT 1 FROM assets a WHERE a.name = s.name AND a.id != s.id)")
+        if "asset_id" in columns:
+            checks.append(f"SELECT line, 'ativo inexistente' FROM {staging} "
+                          f"WHERE asset_id IS NOT NULL AND asset_id NOT IN (SELECT id FROM assets)")
+            checks.append(f"SELECT line, 'ativo rejeitado na importação' FROM {staging} "
+                          f"WHERE asset_id IN (SELECT id FROM temp.rejected_asset_ids)")
+        return " UNION ALL ".join(checks) or None
+
+    def import_file(self, spec, filename):
+        if not filename or not os.path.exists(filename):
+            self.report.skipped[spec.table] = "arquivo não encontrado"
+            return
+        header = pd.read_csv(filename, nrows=0).columns
+        missing = [column for column in spec.required if column not in header]
+        if missing:
+            self.report.skipped[spec.table] = f"colunas ausentes: {', '.join(missing)}"
+            return
+        columns = [column for column in spec.columns if column in header]
+        staging = f"temp.staging_{spec.table}"
+        self.conn.execute(f"DROP TABLE IF EXISTS {staging}")
+        self.conn.execute(f"CREATE TEMP TABLE staging_{spec.table} (line INTEGER PRIMARY KEY, "
+                          + ", ".join(f"{c} {SQL_TYPES[self._column_type(spec, c)]}" for c in columns) + ")")
+        insert_staging = f"INSERT INTO {staging} (line, {', '.join(columns)}) VALUES ({', '.join('?' for _ in range(len(columns) + 1))})"
+        merge = self._merge_sql(spec, columns, staging)
+        invalid_sql = self._invalid_references_sql(spec, columns, staging)
+
+        imported = rejected = 0
+        reject_writer = None
+        reject_file = None
+        try:
+            for chunk in pd.read_csv(filename, usecols=columns, dtype=str, keep_default_na=False, chunksize=self.chunk_size):
+                chunk.index = chunk.index + 2  # número da linha no arquivo (a 1 é o cabeçalho)
+                valid, reasons = validate_chunk(spec, chunk.copy())
+
+                self.conn.executemany(insert_staging, valid.astype(object).where(valid.notna(), None)[columns]
+                                      .itertuples(index=True, name=None))
+                if invalid_sql:
+                    bad = self.conn.execute(invalid_sql).fetchall()
+                    if bad:
+                        if spec.table == "assets":
+                            # As linhas que referenciam um ativo rejeitado também são rejeitadas,
+                            # para não irem parar no ativo local que tem o mesmo id
+                            self.conn.executemany(f"INSERT OR IGNORE INTO temp.rejected_asset_ids SELECT id FROM {staging} "
+                                                  f"WHERE line = ? AND id IS NOT NULL", [(line,) for line, _ in bad])
+                        self.conn.executemany(f"DELETE FROM {staging} WHERE line = ?", [(line,) for line, _ in bad])
+                        reasons = pd.concat([reasons, pd.Series(dict(reversed(bad)))])  # o primeiro motivo de cada linha
+                imported += self.conn.execute(merge).rowcount
+                self.conn.execute(f"DELETE FROM {staging}")
+
+                if len(reasons):
+                    if reject_writer is None:
+                        reject_file = open(prefixed_path("rejeitados", filename), "w", encoding="utf-8", newline="")
+                        reject_writer = csv.writer(reject_file)
+                        reject_writer.writerow(["linha", "motivo"] + columns)
+                    reasons = reasons.sort_index()
+                    # As linhas rejeitadas vão para o relatório como estavam no arquivo
+                    original = chunk.loc[reasons.index, columns].itertuples(index=False, name=None)
+                    reject_writer.writerows([line, reason] + list(values) for line, reason, values in zip(reasons.index, reasons, original))
+                    rejected += len(reasons)
+        finally:
+            if reject_file:
+                reject_file.close()
+                self.report.reject_files.append(reject_file.name)
+            self.conn.execute(f"DROP TABLE IF EXISTS {staging}")
+        self.report.imported[spec.table] = imported
+        self.report.rejected[spec.table] = rejected
+
+    def import_files(self, filenames):
+        """Importa {tabela: arquivo} na ordem de CSV_IMPORT_TABLES (ativos antes das tabelas que os referenciam)"""
+        try:
+            for spec in CSV_IMPORT_TABLES:
+                self.import_file(spec, filenames.get(spec.table))
+        finally:
+            self.conn.execute("DROP TABLE IF EXISTS temp.rejected_asset_ids")
+        self.report.ok = True
+        return self.report
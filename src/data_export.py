@@ -0,0 +1,107 @@
+import csv
+import gzip
+import json
+import os
+
+# Tabelas exportadas, na ordem em que são gravadas (e relidas na importação)
+EXPORT_TABLES = ("assets", "transactions", "price_history", "dividends", "alerts", "events")
+# Linhas lidas do cursor e gravadas no arquivo por vez
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def detect_compression(filename):
+    """Compressão indicada pela extensão do arquivo: "gzip" (.gz), "zstd" (.zst) ou None"""
+    if filename.endswith(".gz"):
+        return "gzip"
+    if filename.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def open_export_file(filename, compression=None, mode="wt"):
+    """Abre um arquivo de exportação em texto UTF-8, com compressão gzip ou zstd opcional.
+
+    A compressão zstd depende do pacote opcional zstandard.
+    """
+    if compression is None:
+        return open(filename, mode, encoding="utf-8", newline="")
+    if compression == "gzip":
+        return gzip.open(filename, mode, encoding="utf-8", newline="")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("A compressão zstd requer o pacote zstandard (pip install zstandard).")
+        return zstandard.open(filename, mode, encoding="utf-8", newline="")
+    raise ValueError(f"Compressão desconhecida: {compression}")
+
+
+def prefixed_path(prefix, filename):
+    """Caminho de um arquivo por tabela: /pasta/dados.csv -> /pasta/assets_dados.csv"""
+    folder, name = os.path.split(filename)
+    return os.path.join(folder, f"{prefix}_{name}")
+
+
+class TableStreamer:
+    """Lê as tabelas em blocos de chunk_size linhas a partir de um cursor aberto.
+
+    A memória usada é a de um bloco, qualquer que seja o tamanho da tabela.
+    progress(linhas gravadas, total de linhas, tabela atual) é chamado a cada bloco.
+    """
+
+    def __init__(self, conn, tables=EXPORT_TABLES, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        self.conn = conn
+        self.tables = tables
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.total = sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables)
+        self.done = 0
+
+    def chunks(self, table):
+        """Retorna (colunas, gerador de blocos de linhas) da tabela"""
+        cursor = self.conn.execute(f"SELECT * FROM {table}")
+        columns = [description[0] for description in cursor.description]
+
+        def generate():
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                yield rows
+                self.done += len(rows)
+                if self.progress:
+                    self.progress(self.done, self.total, table)
+
+        return columns, generate()
+
+
+def write_json(streamer, f):
+    """Grava as tabelas como {"tabela": [{coluna: valor}, ...], ...}, um registro por linha"""
+    f.write("{")
+    for i, table in enumerate(streamer.tables):
+        f.write(f"{',' if i else ''}\n    {json.dumps(table)}: [")
+        columns, chunks = streamer.chunks(table)
+        first = True
+        for rows in chunks:
+            parts = []
+            for row in rows:
+                parts.append(("\n        " if first else ",\n        ") + json.dumps(dict(zip(columns, row))))
+                first = False
+            f.write("".join(parts))
+        f.write("]" if first else "\n    ]")
+    f.write("\n}\n")
+
+
+def write_csv(streamer, filename, compression=None):
+    """Grava cada tabela em seu próprio CSV (tabela_arquivo). Retorna os caminhos gravados"""
+    paths = []
+    for table in streamer.tables:
+        path = prefixed_path(table, filename)
+        columns, chunks = streamer.chunks(table)
+        with open_export_file(path, compression) as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for rows in chunks:
+                writer.writerows(rows)
+        paths.append(path)
+    return paths
@@ -0,0 +1,145 @@
+import json
+import os
+
+# Caracteres lidos do arquivo por vez
+DEFAULT_READ_SIZE = 1 << 20
+# Registros gravados por transação na importação em fluxo
+DEFAULT_IMPORT_BATCH_SIZE = 5000
+
+# Seções do formato completo: tabela, colunas, coluna de data e conversão do registro em linha
+IMPORT_SECTIONS = {
+    "assets": ("assets", ("name", "type"), None,
+               lambda a: (a["name"], a["type"])),
+    "transactions": ("transactions", ("asset_id", "transaction_type", "quantity", "price", "transaction_date"), "transaction_date",
+                     lambda t: (t["asset_id"], t["transaction_type"], t["quantity"], t["price"], t["transaction_date"])),
+    "price_history": ("price_history", ("asset_id", "price", "record_date"), "record_date",
+                      lambda p: (p["asset_id"], p["price"], p["record_date"])),
+    "dividends": ("dividends", ("asset_id", "dividend_value", "payment_date"), "payment_date",
+                  lambda d: (d["asset_id"], d["dividend_value"], d["payment_date"])),
+    "alerts": ("alerts", ("asset_id", "alert_type", "target_value", "percentage_change", "is_active"), None,
+               lambda a: (a["asset_id"], a["alert_type"], a.get("target_value"), a.get("percentage_change"), a.get("is_active", 1))),
+    "events": ("events", ("event_date", "event_type", "description", "asset_id"), "event_date",
+               lambda e: (e["event_date"], e["event_type"], e["description"], e.get("asset_id"))),
+}
+
+
+def file_signature(filename):
+    """Identifica uma versão do arquivo (tamanho e data de modificação) para validar o ponto de retomada"""
+    stat = os.stat(filename)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def assets_first(items):
+    """Reordena (seção, registro) para que os ativos venham antes das seções que os referenciam.
+
+    Registros que aparecem antes da seção "assets" ficam em memória até ela
+    terminar; os exportados por export_data_to_json já começam pelos ativos
+    e passam direto. A ordem resultante depende só do arquivo, então as
+    posições do ponto de retomada continuam valendo.
+    """
+    pending = []
+    assets_read = False
+    for section, item in items:
+        if section == "assets":
+            yield section, item
+            assets_read = True
+        elif assets_read and not pending:
+            yield section, item
+        elif assets_read:
+            # Primeiro registro depois dos ativos: liberar os que estavam esperando
+            yield from pending
+            pending.clear()
+            yield section, item
+        else:
+            pending.append((section, item))
+    yield from pending
+
+
+class JsonStreamReader:
+    """Lê um documento JSON grande sem carregá-lo inteiro na memória.
+
+    O arquivo é lido em blocos de read_size caracteres e cada elemento dos
+    arrays de primeiro nível é decodificado com JSONDecoder.raw_decode assim
+    que está completo no buffer. Serve para "[{...}, ...]" (array_items) e
+    para {"seção": [{...}, ...], ...} (object_items).
+    """
+
+    def __init__(self, f, read_size=DEFAULT_READ_SIZE):
+        self.f = f
+        self.read_size = read_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Descartar o que já foi consumido, para o buffer não crescer com o arquivo
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        """Próximo caractere não branco, sem consumi-lo ("" no fim do arquivo)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"JSON inválido: esperado um de {chars!r}, encontrado {char or 'fim do arquivo'!r}")
+        self.pos += 1
+        return char
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # Um número no fim do buffer pode continuar no próximo bloco
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def start(self):
+        """Consome a abertura do documento e retorna "[" ou "{" """
+        return self._expect("[{")
+
+    def array_items(self):
+        """Elementos do array aberto, um por vez"""
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(",]") == "]":
+                return
+
+    def object_items(self):
+        """(seção, elemento) de cada array do objeto aberto; valores que não são arrays são ignorados"""
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if self._peek() == "[":
+                self.pos += 1
+                for item in self.array_items():
+                    yield key, item
+            else:
+                self._value()
+            if self._expect(",}") == "}":
+                return
@@ -2,43 +2,340 @@ import sqlite3
 import datetime
 import pandas as pd
 import json
+import os
 import threading
+import time
+from contextlib import contextmanager
+from connection_pool import ConnectionPool, DEFAULT_READERS
+from data_export import DEFAULT_CHUNK_SIZE, TableStreamer, detect_compression, open_export_file, write_csv, write_json
+from csv_import import DEFAULT_CSV_CHUNK_SIZE, CsvImporter, CsvImportReport
+from data_import import DEFAULT_IMPORT_BATCH_SIZE, IMPORT_SECTIONS, JsonStreamReader, assets_first, file_signature
+from schema_migrations import BatchedStatement, Migration, MigrationRunner
+from logger import log_message
+
+# Formato canônico de todas as colunas de data: texto ISO, ordenável e comparável
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def normalize_date(value):
+    """Converte uma data (date, datetime, "AAAA-MM-DD[...]" ou "DD/MM/AAAA") para "AAAA-MM-DD" """
+    if value is None:
+        return None
+    if hasattr(value, "strftime"):
+        return value.strftime(DATE_FORMAT)
+    value = str(value).strip()
+    if len(value) >= 10 and value[4] == "-" and value[7] == "-":
+        return value[:10]
+    try:
+        return datetime.datetime.strptime(value, "%d/%m/%Y").strftime(DATE_FORMAT)
+    except ValueError:
+        return value
+
+
+def _iso_date_sql(column):
+    """Expressão SQL que converte column de DD/MM/AAAA ou AAAA-MM-DD HH:MM:SS para AAAA-MM-DD"""
+    return (f"CASE WHEN {column} GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]' "
+            f"THEN substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || substr({column}, 1, 2) "
+            f"WHEN {column} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]?*' THEN substr({column}, 1, 10) "
+            f"ELSE {column} END")
+
+
+def _normalize_dates_steps(table, column, unique=False):
+    """Passos em lote da conversão de uma coluna de data para o formato canônico.
+
+    Em tabelas com restrição UNIQUE na data (unique=True), uma linha que
+    colidiria com outra já gravada no formato canônico é descartada (fica a canônica).
+    """
+    iso = _iso_date_sql(column)
+    steps = [BatchedStatement(table, f"UPDATE OR IGNORE {table} SET {column} = {iso} WHERE rowid BETWEEN :first AND :last AND {column} != {iso}")]
+    if unique:
+        steps.append(BatchedStatement(table, f"DELETE FROM {table} WHERE rowid BETWEEN :first AND :last AND {column} != {iso}"))
+    return steps
+
+
+# Páginas copiadas por passo do backup online e pausa entre os passos (segundos)
+DEFAULT_BACKUP_PAGES = 1024
+DEFAULT_BACKUP_SLEEP = 0.005
+
+
+# Posições (quantidade e custo investido por ativo) calculadas a partir de todas as transações
+POSITIONS_QUERY = """
+    SELECT
+        asset_id,
+        SUM(CASE WHEN transaction_type = 'compra' THEN quantity ELSE -quantity END),
+        SUM(CASE WHEN transaction_type = 'compra' THEN quantity * price ELSE 0 END)
+    FROM transactions
+    GROUP BY asset_id
+"""
+POSITIONS_REBUILD_SQL = f"INSERT OR REPLACE INTO positions (asset_id, total_quantity, total_invested) {POSITIONS_QUERY}"
+# Diferença máxima aceita entre a posição mantida e a recalculada (somas em ponto flutuante)
+POSITIONS_TOLERANCE = 1e-6
+
+
+# Índices secundários (migração 1), recriados quando as tabelas são reconstruídas
+SECONDARY_INDEXES = [
+    # Cobre a soma por ativo em get_all_assets_with_transactions e as transações de um ativo por data
+    "CREATE INDEX IF NOT EXISTS idx_transactions_asset ON transactions (asset_id, transaction_date, transaction_type, quantity, price)",
+    "CREATE INDEX IF NOT EXISTS idx_dividends_asset ON dividends (asset_id, payment_date)",
+    "CREATE INDEX IF NOT EXISTS idx_alerts_asset ON alerts (asset_id)",
+    # Índice parcial: só os alertas ativos, com as colunas lidas pela verificação de alertas
+    "CREATE INDEX IF NOT EXISTS idx_alerts_active ON alerts (asset_id, alert_type, target_value, percentage_change) WHERE is_active = 1",
+    "CREATE INDEX IF NOT EXISTS idx_events_date ON events (event_date, asset_id)",
+    "CREATE INDEX IF NOT EXISTS idx_events_asset ON events (asset_id)",
+]
+
+# Gatilhos que mantêm a tabela positions a partir de transactions (migração 3)
+POSITIONS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_position AFTER INSERT ON transactions
+    BEGIN
+        INSERT OR IGNORE INTO positions (asset_id) VALUES (NEW.asset_id);
+        UPDATE positions SET
+            total_quantity = total_quantity + CASE WHEN NEW.transaction_type = 'compra' THEN NEW.quantity ELSE -NEW.quantity END,
+            total_invested = total_invested + CASE WHEN NEW.transaction_type = 'compra' THEN NEW.quantity * NEW.price ELSE 0 END
+        WHERE asset_id = NEW.asset_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_position AFTER DELETE ON transactions
+    BEGIN
+        UPDATE positions SET
+            total_quantity = total_quantity - CASE WHEN OLD.transaction_type = 'compra' THEN OLD.quantity ELSE -OLD.quantity END,
+            total_invested = total_invested - CASE WHEN OLD.transaction_type = 'compra' THEN OLD.quantity * OLD.price ELSE 0 END
+        WHERE asset_id = OLD.asset_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_update_position AFTER UPDATE ON transactions
+    BEGIN
+        UPDATE positions SET
+            total_quantity = total_quantity - CASE WHEN OLD.transaction_type = 'compra' THEN OLD.quantity ELSE -OLD.quantity END,
+            total_invested = total_invested - CASE WHEN OLD.transaction_type = 'compra' THEN OLD.quantity * OLD.price ELSE 0 END
+        WHERE asset_id = OLD.asset_id;
+        INSERT OR IGNORE INTO positions (asset_id) VALUES (NEW.asset_id);
+        UPDATE positions SET
+            total_quantity = total_quantity + CASE WHEN NEW.transaction_type = 'compra' THEN NEW.quantity ELSE -NEW.quantity END,
+            total_invested = total_invested + CASE WHEN NEW.transaction_type = 'compra' THEN NEW.quantity * NEW.price ELSE 0 END
+        WHERE asset_id = NEW.asset_id;
+    END
+    """,
+]
+
+# Tabelas que referenciam assets, recriadas com ON DELETE CASCADE (migração 5),
+# na mesma ordem de colunas das tabelas originais
+CASCADE_TABLES = {
+    "transactions": """
+        CREATE TABLE transactions_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            asset_id INTEGER NOT NULL,
+            transaction_type TEXT NOT NULL, -- 'compra' ou 'venda'
+            quantity REAL NOT NULL,
+            price REAL NOT NULL,
+            transaction_date TEXT NOT NULL,
+            FOREIGN KEY (asset_id) REFERENCES assets(id) ON DELETE CASCADE
+        )
+    """,
+    "price_history": """
+        CREATE TABLE price_history_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            asset_id INTEGER NOT NULL,
+            price REAL NOT NULL,
+            record_date TEXT NOT NULL,
+            FOREIGN KEY (asset_id) REFERENCES assets(id) ON DELETE CASCADE,
+            UNIQUE(asset_id, record_date)
+        )
+    """,
+    "dividends": """
+        CREATE TABLE dividends_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            asset_id INTEGER NOT NULL,
+            dividend_value REAL NOT NULL,
+            payment_date TEXT NOT NULL,
+            FOREIGN KEY (asset_id) REFERENCES assets(id) ON DELETE CASCADE
+        )
+    """,
+    "alerts": """
+        CREATE TABLE alerts_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            asset_id INTEGER NOT NULL,
+            alert_type TEXT NOT NULL, -- 'price_target', 'percentage_change'
+            target_value REAL,
+            percentage_change REAL,
+            is_active INTEGER DEFAULT 1, -- 1 for active, 0 for inactive
+            FOREIGN KEY (asset_id) REFERENCES assets(id) ON DELETE CASCADE
+        )
+    """,
+    "events": """
+        CREATE TABLE events_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_date TEXT NOT NULL,
+            event_type TEXT NOT NULL, -- 'dividendo', 'desdobramento', 'vencimento'
+            description TEXT NOT NULL,
+            asset_id INTEGER,
+            FOREIGN KEY (asset_id) REFERENCES assets(id) ON DELETE CASCADE
+        )
+    """,
+    "positions": """
+        CREATE TABLE positions_new (
+            asset_id INTEGER PRIMARY KEY,
+            total_quantity REAL NOT NULL DEFAULT 0,
+            total_invested REAL NOT NULL DEFAULT 0,
+            FOREIGN KEY (asset_id) REFERENCES assets(id) ON DELETE CASCADE
+        )
+    """,
+}
+# Tabelas apagadas junto com o ativo, na contagem de delete_assets
+ASSET_CHILD_TABLES = ("transactions", "price_history", "dividends", "alerts", "events")
+
+
+def _rebuild_with_cascade_steps():
+    """Passos da reconstrução das tabelas filhas com ON DELETE CASCADE.
+
+    Roda com as chaves estrangeiras desligadas e as confere no final. Linhas
+    órfãs (de ativos que não existem mais) violariam a chave: vão para
+    <tabela>_orphans, com a contagem no log, em vez de serem apagadas. A cópia
+    é feita em lotes; índices e gatilhos somem com a tabela antiga e são
+    recriados no final, e o gatilho que limpava positions ao excluir um ativo
+    é substituído pela cascata.
+    """
+    steps = ["DROP TRIGGER IF EXISTS trg_assets_delete_position"]
+    for table, create_sql in CASCADE_TABLES.items():
+        steps += [
+            f"DROP TABLE IF EXISTS {table}_new",
+            create_sql,
+            _set_aside_orphans_step(table),
+            BatchedStatement(table, f"INSERT INTO {table}_new SELECT * FROM {table} WHERE rowid BETWEEN :first AND :last"),
+            f"DROP TABLE {table}",
+            f"ALTER TABLE {table}_new RENAME TO {table}",
+        ]
+    return steps + SECONDARY_INDEXES + POSITIONS_TRIGGERS + [_check_foreign_keys]
+
+
+def _set_aside_orphans_step(table):
+    def set_aside_orphans(conn):
+        orphan = "asset_id IS NOT NULL AND asset_id NOT IN (SELECT id FROM assets)"
+        count = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {orphan}").fetchone()[0]
+        if count:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table}_orphans AS SELECT * FROM {table} WHERE 0")
+            conn.execute(f"INSERT INTO {table}_orphans SELECT * FROM {table} WHERE {orphan}")
+            conn.execute(f"DELETE FROM {table} WHERE {orphan}")
+            log_message(f"Migração do banco: {count} linhas de {table} com ativo inexistente guardadas em {table}_orphans.")
+    return set_aside_orphans
+
+
+def _check_foreign_keys(conn):
+    violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+    if violations:
+        raise sqlite3.IntegrityError(f"{len(violations)} violações de chave estrangeira, ex: {violations[0]}")
+
+
+# Migrações do esquema, aplicadas em ordem por MigrationRunner e registradas em schema_version.
+# Nunca alterar uma migração já publicada: mudanças novas entram como uma nova versão.
+SCHEMA_MIGRATIONS = [
+    Migration(1, "índices secundários", SECONDARY_INDEXES),
+    Migration(2, "datas no formato canônico AAAA-MM-DD",
+        _normalize_dates_steps("price_history", "record_date", unique=True)
+        + _normalize_dates_steps("benchmark_history", "record_date", unique=True)
+        + _normalize_dates_steps("transactions", "transaction_date")
+        + _normalize_dates_steps("dividends", "payment_date")
+        + _normalize_dates_steps("events", "event_date")),
+    Migration(3, "tabela de posições mantida por gatilhos", [
+        """
+        CREATE TABLE IF NOT EXISTS positions (
+            asset_id INTEGER PRIMARY KEY,
+            total_quantity REAL NOT NULL DEFAULT 0,
+            total_invested REAL NOT NULL DEFAULT 0,
+            FOREIGN KEY (asset_id) REFERENCES assets(id)
+        )
+        """,
+    ] + POSITIONS_TRIGGERS + [
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_assets_delete_position AFTER DELETE ON assets
+        BEGIN
+            DELETE FROM positions WHERE asset_id = OLD.id;
+        END
+        """,
+        POSITIONS_REBUILD_SQL,
+    ]),
+    Migration(4, "pontos de retomada da importação de JSON", [
+        """
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            filename TEXT PRIMARY KEY,
+            signature TEXT NOT NULL, -- tamanho e data de modificação do arquivo
+            position INTEGER NOT NULL, -- registros já gravados, em ordem do arquivo
+            updated_at TEXT NOT NULL
+        )
+        """,
+    ]),
+    Migration(5, "chaves estrangeiras com ON DELETE CASCADE", _rebuild_with_cascade_steps(), foreign_keys=False),
+    Migration(6, "registro de preços alterados no histórico", [
+        # Última versão em que cada linha de price_history teve o preço alterado (upserts da
+        # importação e do gravador de cotações); a cópia colunar lê daqui o que mudou no lugar
+        """
+        CREATE TABLE IF NOT EXISTS price_history_updates (
+            price_history_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_price_history_updates_version ON price_history_updates (version)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_price_history_update_version AFTER UPDATE OF price ON price_history
+        WHEN OLD.price IS NOT NEW.price
+        BEGIN
+            INSERT OR REPLACE INTO price_history_updates (price_history_id, version)
+            VALUES (NEW.id, (SELECT COALESCE(MAX(version), 0) + 1 FROM price_history_updates));
+        END
+        """,
+    ]),
+]
 
 class DatabaseManager:
-    def __init__(self, db_name="investment_carteira.db"):
+    def __init__(self, db_name="investment_carteira.db", readers=DEFAULT_READERS):
         self.db_name = db_name
-        self.conn = None
-        self.cursor = None
-        self.lock = threading.Lock()  # Lock para thread-safety
-        self._local = threading.local()  # Para conexões thread-local
+        self.readers = readers
+        self.pool = None
         self.connect()
         self.create_tables()
+        self.migrate()
 
     def connect(self):
-        try:
-            self.conn = sqlite3.connect(self.db_name)
-            self.cursor = self.conn.cursor()
-        except sqlite3.Error as e:
-            print(f"Erro ao conectar ao banco de dados: {e}")
-
-    def get_thread_connection(self):
-        """Obtém uma conexão específica para a thread atual"""
-        if not hasattr(self._local, 'connection'):
-            self._local.connection = sqlite3.connect(self.db_name)
-            self._local.cursor = self._local.connection.cursor()
-        return self._local.connection, self._local.cursor
+        # Um escritor e um pool de leitores (WAL): leituras da interface não
+        # esperam as gravações da atualização em segundo plano
+        self.pool = ConnectionPool(self.db_name, readers=self.readers)
+
+    @contextmanager
+    def transaction(self):
+        """Unidade de trabalho: as gravações feitas dentro do bloco são confirmadas juntas.
+
+        Uso: with db.transaction(): ... Se o bloco terminar com exceção, tudo é
+        desfeito. Blocos aninhados (inclusive os dos métodos add_*) viram
+        savepoints, de modo que uma falha tratada dentro deles desfaz só a
+        própria parte.
+        """
+        with self.pool.writer() as conn:
+            yield conn
+
+    def snapshot(self):
+        """Leitura consistente para análises longas: with db.snapshot(): ...
+
+        Dentro do bloco, todas as leituras desta thread (inclusive pelos
+        métodos get_*) enxergam o mesmo retrato do banco, sem bloquear as
+        gravações de outras threads. Retorna o gerenciador de contexto do pool,
+        que entrega a conexão de leitura.
+        """
+        return self.pool.snapshot()
 
     def create_tables(self):
-        if self.conn:
-            try:
-                self.cursor.execute("""
+        try:
+            with self.pool.writer() as conn:
+                conn.execute("""
                     CREATE TABLE IF NOT EXISTS assets (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         name TEXT NOT NULL UNIQUE,
                         type TEXT NOT NULL
                     )
                 """)
-                self.cursor.execute("""
+                conn.execute("""
                     CREATE TABLE IF NOT EXISTS transactions (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         asset_id INTEGER NOT NULL,
@@ -49,7 +346,7 @@ class DatabaseManager:
                         FOREIGN KEY (asset_id) REFERENCES assets(id)
                     )
                 """)
-                self.cursor.execute("""
+                conn.execute("""
                     CREATE TABLE IF NOT EXISTS price_history (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         asset_id INTEGER NOT NULL,
@@ -59,7 +356,7 @@ class DatabaseManager:
                         UNIQUE(asset_id, record_date)
                     )
                 """)
-                self.cursor.execute("""
+                conn.execute("""
                     CREATE TABLE IF NOT EXISTS dividends (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         asset_id INTEGER NOT NULL,
@@ -68,7 +365,7 @@ class DatabaseManager:
                         FOREIGN KEY (asset_id) REFERENCES assets(id)
                     )
                 """)
-                self.cursor.execute("""
+                conn.execute("""
                     CREATE TABLE IF NOT EXISTS alerts (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         asset_id INTEGER NOT NULL,
@@ -79,7 +376,7 @@ class DatabaseManager:
                         FOREIGN KEY (asset_id) REFERENCES assets(id)
                     )
                 """)
-                self.cursor.execute("""
+                conn.execute("""
                     CREATE TABLE IF NOT EXISTS events (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         event_date TEXT NOT NULL,
@@ -89,41 +386,60 @@ class DatabaseManager:
                         FOREIGN KEY (asset_id) REFERENCES assets(id)
                     )
                 """)
-                self.conn.commit()
-            except sqlite3.Error as e:
-                print(f"Erro ao criar tabelas: {e}")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS benchmark_history (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        ticker TEXT NOT NULL, -- ex: '^BVSP'
+                        price REAL NOT NULL,
+                        record_date TEXT NOT NULL,
+                        UNIQUE(ticker, record_date)
+                    )
+                """)
+        except sqlite3.Error as e:
+            print(f"Erro ao criar tabelas: {e}")
+
+    def migrate(self):
+        """Aplica as migrações de SCHEMA_MIGRATIONS ainda não aplicadas. Retorna as versões aplicadas"""
+        try:
+            return MigrationRunner(self.pool, SCHEMA_MIGRATIONS).run()
+        except sqlite3.Error as e:
+            print(f"Erro ao migrar o banco de dados: {e}")
+            return []
+
+    def get_schema_version(self):
+        """Maior versão de migração aplicada ao banco"""
+        try:
+            return MigrationRunner(self.pool, SCHEMA_MIGRATIONS).current_version()
+        except sqlite3.Error as e:
+            print(f"Erro ao consultar a versão do esquema: {e}")
+            return 0
 
     def add_asset(self, name, asset_type):
-        with self.lock:
-            if self.conn:
-                try:
-                    self.cursor.execute("INSERT INTO assets (name, type) VALUES (?, ?)",
-                                        (name, asset_type))
-                    self.conn.commit()
-                    return self.cursor.lastrowid
-                except sqlite3.Error as e:
-                    print(f"Erro ao adicionar ativo: {e}")
-            return None
+        try:
+            with self.pool.writer() as conn:
+                cursor = conn.execute("INSERT INTO assets (name, type) VALUES (?, ?)",
+                                      (name, asset_type))
+                return cursor.lastrowid
+        except sqlite3.Error as e:
+            print(f"Erro ao adicionar ativo: {e}")
+        return None
 
     def add_transaction(self, asset_id, transaction_type, quantity, price, transaction_date):
-        with self.lock:
-            if self.conn:
-                try:
-                    self.cursor.execute("INSERT INTO transactions (asset_id, transaction_type, quantity, price, transaction_date) VALUES (?, ?, ?, ?, ?)",
-                                        (asset_id, transaction_type, quantity, price, transaction_date))
-                    self.conn.commit()
-                    return self.cursor.lastrowid
-                except sqlite3.Error as e:
-                    print(f"Erro ao adicionar transação: {e}")
-            return None
+        try:
+            with self.pool.writer() as conn:
+                cursor = conn.execute("INSERT INTO transactions (asset_id, transaction_type, quantity, price, transaction_date) VALUES (?, ?, ?, ?, ?)",
+                                      (asset_id, transaction_type, quantity, price, normalize_date(transaction_date)))
+                return cursor.lastrowid
+        except sqlite3.Error as e:
+            print(f"Erro ao adicionar transação: {e}")
+        return None
 
     def add_price_history(self, asset_id, price, record_date):
         try:
-            conn, cursor = self.get_thread_connection()
-            cursor.execute("INSERT OR IGNORE INTO price_history (asset_id, price, record_date) VALUES (?, ?, ?)",
-                            (asset_id, price, record_date))
-            conn.commit()
-            return cursor.lastrowid
+            with self.pool.writer() as conn:
+                cursor = conn.execute("INSERT OR IGNORE INTO price_history (asset_id, price, record_date) VALUES (?, ?, ?)",
+                                      (asset_id, price, normalize_date(record_date)))
+                return cursor.lastrowid
         except sqlite3.Error as e:
             print(f"Erro ao adicionar histórico de preço: {e}")
             return None
@@ -131,60 +447,140 @@ class DatabaseManager:
             print(f"Erro inesperado ao adicionar histórico de preço: {e}")
             return None
 
+    @staticmethod
+    def _bulk_rows(rows, columns):
+        """Normaliza as linhas de uma gravação em lote (DataFrame ou iterável de tuplas)"""
+        if isinstance(rows, pd.DataFrame):
+            return list(rows[list(columns)].itertuples(index=False, name=None))
+        return [tuple(row) for row in rows]
+
+    def _insert_bulk(self, table, columns, rows, date_column=None, upsert=None):
+        """Insere várias linhas com executemany em uma única transação. Retorna (inseridas, ignoradas).
+
+        Linhas que violam alguma restrição (ex: duplicadas) são ignoradas; com
+        upsert=(colunas da chave, colunas atualizadas), as já existentes são atualizadas.
+        A coluna date_column é gravada no formato canônico.
+        """
+        rows = self._bulk_rows(rows, columns)
+        if date_column:
+            i = columns.index(date_column)
+            rows = [row[:i] + (normalize_date(row[i]),) + row[i + 1:] for row in rows]
+        if not rows:
+            return 0, 0
+        placeholders = ", ".join("?" for _ in columns)
+        with self.pool.writer() as conn:
+            if "asset_id" in columns:
+                # OR IGNORE não se aplica a chaves estrangeiras: linhas de ativos inexistentes são descartadas antes
+                i = columns.index("asset_id")
+                # Só os ids do lote são procurados, pela chave primária (sem ler a tabela de ativos inteira)
+                wanted = json.dumps(sorted({row[i] for row in rows if row[i] is not None}))
+                known = {row[0] for row in conn.execute("SELECT id FROM assets WHERE id IN (SELECT value FROM json_each(?))", (wanted,))}
+                valid_rows = [row for row in rows if row[i] is None or row[i] in known]
+            else:
+                valid_rows = rows
+            if upsert:
+                keys, updates = upsert
+                # Valores iguais aos já gravados não são regravados
+                sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+                       + ", ".join(f"{c} = excluded.{c}" for c in updates)
+                       + " WHERE " + " OR ".join(f"{c} IS NOT excluded.{c}" for c in updates))
+            else:
+                sql = f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+            # rowcount soma só as linhas da própria tabela, sem as alteradas por gatilhos
+            inserted = conn.executemany(sql, valid_rows).rowcount
+        return inserted, len(rows) - inserted
+
+    def add_price_history_bulk(self, rows):
+        """Grava vários preços (asset_id, price, record_date); datas já gravadas são ignoradas.
+
+        Retorna (inseridos, ignorados).
+        """
+        try:
+            return self._insert_bulk("price_history", ("asset_id", "price", "record_date"), rows, "record_date")
+        except sqlite3.Error as e:
+            print(f"Erro ao adicionar histórico de preços em lote: {e}")
+            return 0, 0
+
+    def upsert_price_history_bulk(self, rows):
+        """Grava vários preços (asset_id, price, record_date); numa data já gravada, o preço é substituído.
+
+        Retorna (gravados, ignorados); preços iguais aos já gravados contam como ignorados.
+        """
+        try:
+            return self._insert_bulk("price_history", ("asset_id", "price", "record_date"), rows, "record_date",
+                                     upsert=(("asset_id", "record_date"), ("price",)))
+        except sqlite3.Error as e:
+            print(f"Erro ao gravar histórico de preços em lote: {e}")
+            return 0, 0
+
+    def add_transactions_bulk(self, rows):
+        """Grava várias transações (asset_id, transaction_type, quantity, price, transaction_date).
+
+        Retorna (inseridas, ignoradas).
+        """
+        try:
+            return self._insert_bulk("transactions", ("asset_id", "transaction_type", "quantity", "price", "transaction_date"), rows, "transaction_date")
+        except sqlite3.Error as e:
+            print(f"Erro ao adicionar transações em lote: {e}")
+            return 0, 0
+
+    def add_dividends_bulk(self, rows):
+        """Grava vários dividendos (asset_id, dividend_value, payment_date). Retorna (inseridos, ignorados)"""
+        try:
+            return self._insert_bulk("dividends", ("asset_id", "dividend_value", "payment_date"), rows, "payment_date")
+        except sqlite3.Error as e:
+            print(f"Erro ao adicionar dividendos em lote: {e}")
+            return 0, 0
+
     def add_dividend(self, asset_id, dividend_value, payment_date):
-        if self.conn:
-            try:
-                self.cursor.execute("INSERT INTO dividends (asset_id, dividend_value, payment_date) VALUES (?, ?, ?)",
-                                    (asset_id, dividend_value, payment_date))
-                self.conn.commit()
-                return self.cursor.lastrowid
-            except sqlite3.Error as e:
-                print(f"Erro ao adicionar dividendo: {e}")
+        try:
+            with self.pool.writer() as conn:
+                cursor = conn.execute("INSERT INTO dividends (asset_id, dividend_value, payment_date) VALUES (?, ?, ?)",
+                                      (asset_id, dividend_value, normalize_date(payment_date)))
+                return cursor.lastrowid
+        except sqlite3.Error as e:
+            print(f"Erro ao adicionar dividendo: {e}")
         return None
 
     def add_event(self, event_date, event_type, description, asset_id=None):
-        if self.conn:
-            try:
-                self.cursor.execute("INSERT INTO events (event_date, event_type, description, asset_id) VALUES (?, ?, ?, ?)",
-                                    (event_date, event_type, description, asset_id))
-                self.conn.commit()
-                return self.cursor.lastrowid
-            except sqlite3.Error as e:
-                print(f"Erro ao adicionar evento: {e}")
+        try:
+            with self.pool.writer() as conn:
+                cursor = conn.execute("INSERT INTO events (event_date, event_type, description, asset_id) VALUES (?, ?, ?, ?)",
+                                      (normalize_date(event_date), event_type, description, asset_id))
+                return cursor.lastrowid
+        except sqlite3.Error as e:
+            print(f"Erro ao adicionar evento: {e}")
         return None
 
     def add_alert(self, asset_id, alert_type, target_value=None, percentage_change=None):
-        if self.conn:
-            try:
-                self.cursor.execute("INSERT INTO alerts (asset_id, alert_type, target_value, percentage_change) VALUES (?, ?, ?, ?)",
-                                    (asset_id, alert_type, target_value, percentage_change))
-                self.conn.commit()
-                return self.cursor.lastrowid
-            except sqlite3.Error as e:
-                print(f"Erro ao adicionar alerta: {e}")
+        try:
+            with self.pool.writer() as conn:
+                cursor = conn.execute("INSERT INTO alerts (asset_id, alert_type, target_value, percentage_change) VALUES (?, ?, ?, ?)",
+                                      (asset_id, alert_type, target_value, percentage_change))
+                return cursor.lastrowid
+        except sqlite3.Error as e:
+            print(f"Erro ao adicionar alerta: {e}")
         return None
 
     def get_events(self, start_date=None, end_date=None):
-        if self.conn:
-            try:
-                query = "SELECT e.id, e.event_date, e.event_type, e.description, a.name FROM events e LEFT JOIN assets a ON e.asset_id = a.id"
-                params = []
-                if start_date and end_date:
-                    query += " WHERE e.event_date BETWEEN ? AND ?"
-                    params.append(start_date)
-                    params.append(end_date)
-                query += " ORDER BY e.event_date ASC"
-                self.cursor.execute(query, tuple(params))
-                return self.cursor.fetchall()
-            except sqlite3.Error as e:
-                print(f"Erro ao buscar eventos: {e}")
+        try:
+            query = "SELECT e.id, e.event_date, e.event_type, e.description, a.name FROM events e LEFT JOIN assets a ON e.asset_id = a.id"
+            params = []
+            if start_date and end_date:
+                query += " WHERE e.event_date BETWEEN ? AND ?"
+                params.append(normalize_date(start_date))
+                params.append(normalize_date(end_date))
+            query += " ORDER BY e.event_date ASC"
+            with self.pool.reader() as conn:
+                return conn.execute(query, tuple(params)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar eventos: {e}")
         return []
 
     def get_active_alerts(self):
         try:
-            conn, cursor = self.get_thread_connection()
-            cursor.execute("SELECT al.id, a.name, al.alert_type, al.target_value, al.percentage_change FROM alerts al JOIN assets a ON al.asset_id = a.id WHERE al.is_active = 1")
-            return cursor.fetchall()
+            with self.pool.reader() as conn:
+                return conn.execute("SELECT al.id, a.name, al.alert_type, al.target_value, al.percentage_change FROM alerts al JOIN assets a ON al.asset_id = a.id WHERE al.is_active = 1").fetchall()
         except sqlite3.Error as e:
             print(f"Erro ao buscar alertas ativos: {e}")
             return []
@@ -194,9 +590,8 @@ class DatabaseManager:
 
     def deactivate_alert(self, alert_id):
         try:
-            conn, cursor = self.get_thread_connection()
-            cursor.execute("UPDATE alerts SET is_active = 0 WHERE id = ?", (alert_id,))
-            conn.commit()
+            with self.pool.writer() as conn:
+                conn.execute("UPDATE alerts SET is_active = 0 WHERE id = ?", (alert_id,))
             return True
         except sqlite3.Error as e:
             print(f"Erro ao desativar alerta: {e}")
@@ -207,18 +602,16 @@ class DatabaseManager:
 
     def get_all_assets_with_transactions(self):
         try:
-            conn, cursor = self.get_thread_connection()
-            cursor.execute("""
-                SELECT
-                    a.id, a.name, a.type,
-                    SUM(CASE WHEN t.transaction_type = 'compra' THEN t.quantity ELSE -t.quantity END) as total_quantity,
-                    SUM(CASE WHEN t.transaction_type = 'compra' THEN t.quantity * t.price ELSE 0 END) as total_invested
-                FROM assets a
-                LEFT JOIN transactions t ON a.id = t.asset_id
-                GROUP BY a.id, a.name, a.type
-                HAVING total_quantity > 0 OR total_invested > 0
-            """)
-            return cursor.fetchall()
+            # A tabela positions é mantida pelos gatilhos de transactions: custo O(ativos)
+            with self.pool.reader() as conn:
+                return conn.execute("""
+                    SELECT
+                        a.id, a.name, a.type, p.total_quantity, p.total_invested
+                    FROM positions p
+                    JOIN assets a ON a.id = p.asset_id
+                    WHERE p.total_quantity > 0 OR p.total_invested > 0
+                    ORDER BY a.id
+                """).fetchall()
         except sqlite3.Error as e:
             print(f"Erro ao buscar ativos com transações: {e}")
             return []
@@ -226,293 +619,399 @@ class DatabaseManager:
             print(f"Erro inesperado ao buscar ativos com transações: {e}")
             return []
 
+    def verify_positions(self):
+        """Compara a tabela positions com o recálculo a partir das transações.
+
+        Retorna [(asset_id, posição gravada, posição recalculada), ...] dos ativos divergentes.
+        """
+        try:
+            with self.pool.reader() as conn:
+                stored = {row[0]: row[1:] for row in conn.execute("SELECT asset_id, total_quantity, total_invested FROM positions")}
+                computed = {row[0]: row[1:] for row in conn.execute(POSITIONS_QUERY)}
+        except sqlite3.Error as e:
+            print(f"Erro ao verificar posições: {e}")
+            return []
+        mismatches = []
+        for asset_id in sorted(set(stored) | set(computed)):
+            expected = computed.get(asset_id, (0.0, 0.0))
+            actual = stored.get(asset_id)
+            if actual is None or any(abs(a - b) > POSITIONS_TOLERANCE for a, b in zip(actual, expected)):
+                mismatches.append((asset_id, actual, expected))
+        return mismatches
+
+    def rebuild_positions(self):
+        """Recalcula a tabela positions a partir das transações. Retorna o número de posições"""
+        try:
+            with self.transaction() as conn:
+                conn.execute("DELETE FROM positions")
+                conn.execute(POSITIONS_REBUILD_SQL)
+                return conn.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Erro ao reconstruir posições: {e}")
+            return None
+
+    def get_all_assets(self):
+        try:
+            with self.pool.reader() as conn:
+                return conn.execute("SELECT id, name, type FROM assets ORDER BY name").fetchall()
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar ativos: {e}")
+            return []
+
+    def get_last_price_dates(self, before_date=None):
+        """Retorna {asset_id: data mais recente em price_history}, opcionalmente anterior a before_date"""
+        try:
+            query = "SELECT asset_id, MAX(record_date) FROM price_history"
+            params = []
+            if before_date:
+                query += " WHERE record_date < ?"
+                params.append(normalize_date(before_date))
+            query += " GROUP BY asset_id"
+            with self.pool.reader() as conn:
+                return dict(conn.execute(query, tuple(params)).fetchall())
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar datas do histórico de preços: {e}")
+            return {}
+
+    def add_benchmark_history(self, ticker, prices):
+        """Grava [(data "AAAA-MM-DD", preço), ...] de um índice de referência; datas já gravadas são ignoradas"""
+        try:
+            with self.pool.writer() as conn:
+                cursor = conn.executemany("INSERT OR IGNORE INTO benchmark_history (ticker, price, record_date) VALUES (?, ?, ?)",
+                                          [(ticker, price, normalize_date(record_date)) for record_date, price in prices])
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"Erro ao adicionar histórico do benchmark {ticker}: {e}")
+            return 0
+
+    def get_benchmark_history(self, ticker, start_date=None, end_date=None):
+        try:
+            query = "SELECT record_date, price FROM benchmark_history WHERE ticker = ?"
+            params = [ticker]
+            if start_date:
+                query += " AND record_date >= ?"
+                params.append(normalize_date(start_date))
+            if end_date:
+                query += " AND record_date <= ?"
+                params.append(normalize_date(end_date))
+            query += " ORDER BY record_date ASC"
+            with self.pool.reader() as conn:
+                return conn.execute(query, tuple(params)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar histórico do benchmark {ticker}: {e}")
+            return []
+
+    def get_benchmark_date_range(self, ticker):
+        """Retorna (primeira data, última data) gravadas para o benchmark, ou (None, None)"""
+        try:
+            with self.pool.reader() as conn:
+                return conn.execute("SELECT MIN(record_date), MAX(record_date) FROM benchmark_history WHERE ticker = ?", (ticker,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar datas do benchmark {ticker}: {e}")
+            return None, None
+
     def get_asset_transactions(self, asset_id):
-        if self.conn:
-            try:
-                self.cursor.execute("SELECT * FROM transactions WHERE asset_id = ? ORDER BY transaction_date ASC", (asset_id,))
-                return self.cursor.fetchall()
-            except sqlite3.Error as e:
-                print(f"Erro ao buscar transações do ativo: {e}")
+        try:
+            with self.pool.reader() as conn:
+                return conn.execute("SELECT * FROM transactions WHERE asset_id = ? ORDER BY transaction_date ASC", (asset_id,)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar transações do ativo: {e}")
         return []
 
     def get_price_history(self, asset_id, start_date=None, end_date=None):
-        if self.conn:
-            try:
-                query = "SELECT record_date, price FROM price_history WHERE asset_id = ?"
-                params = [asset_id]
-                if start_date:
-                    query += " AND record_date >= ?"
-                    params.append(start_date)
-                if end_date:
-                    query += " AND record_date <= ?"
-                    params.append(end_date)
-                query += " ORDER BY record_date ASC"
-                self.cursor.execute(query, tuple(params))
-                return self.cursor.fetchall()
-            except sqlite3.Error as e:
-                print(f"Erro ao buscar histórico de preços: {e}")
+        try:
+            query = "SELECT record_date, price FROM price_history WHERE asset_id = ?"
+            params = [asset_id]
+            if start_date:
+                query += " AND record_date >= ?"
+                params.append(normalize_date(start_date))
+            if end_date:
+                query += " AND record_date <= ?"
+                params.append(normalize_date(end_date))
+            query += " ORDER BY record_date ASC"
+            with self.pool.reader() as conn:
+                return conn.execute(query, tuple(params)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar histórico de preços: {e}")
         return []
 
     def get_all_price_history(self):
-        if self.conn:
-            try:
-                self.cursor.execute("""
+        try:
+            with self.pool.reader() as conn:
+                return conn.execute("""
                     SELECT
                         a.name, ph.record_date, ph.price
                     FROM price_history ph
                     JOIN assets a ON ph.asset_id = a.id
                     ORDER BY a.name, ph.record_date
-                """)
-                return self.cursor.fetchall()
-            except sqlite3.Error as e:
-                print(f"Erro ao buscar histórico de preços de todos os ativos: {e}")
+                """).fetchall()
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar histórico de preços de todos os ativos: {e}")
         return []
 
+    def get_price_history_changes(self, after_id=0, after_version=0):
+        """Alterações de price_history desde a última sincronização de uma cópia do histórico.
+
+        Retorna (total de linhas da tabela, linhas com id maior que after_id,
+        versão atual, linhas até after_id com preço alterado depois de
+        after_version), com as linhas como (id, asset_id, record_date, price),
+        tudo lido do mesmo retrato do banco.
+        """
+        try:
+            with self.snapshot() as conn:
+                total = conn.execute("SELECT COUNT(*) FROM price_history").fetchone()[0]
+                rows = conn.execute("""
+                    SELECT id, asset_id, record_date, price
+                    FROM price_history
+                    WHERE id > ?
+                    ORDER BY id
+                """, (after_id,)).fetchall()
+                version = conn.execute("SELECT COALESCE(MAX(version), 0) FROM price_history_updates").fetchone()[0]
+                updated = conn.execute("""
+                    SELECT p.id, p.asset_id, p.record_date, p.price
+                    FROM price_history_updates u
+                    JOIN price_history p ON p.id = u.price_history_id
+                    WHERE u.version > ? AND u.price_history_id <= ?
+                """, (after_version, after_id)).fetchall() if version > after_version else []
+                return total, rows, version, updated
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar alterações do histórico de preços: {e}")
+        return None, [], 0, []
+
     def get_asset_dividends(self, asset_id):
-        if self.conn:
-            try:
-                self.cursor.execute("SELECT * FROM dividends WHERE asset_id = ? ORDER BY payment_date ASC", (asset_id,))
-                return self.cursor.fetchall()
-            except sqlite3.Error as e:
-                print(f"Erro ao buscar dividendos do ativo: {e}")
+        try:
+            with self.pool.reader() as conn:
+                return conn.execute("SELECT * FROM dividends WHERE asset_id = ? ORDER BY payment_date ASC", (asset_id,)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar dividendos do ativo: {e}")
         return []
 
     def close(self):
-        if self.conn:
-            self.conn.close()
-        
-        # Fechar conexões thread-local
-        if hasattr(self._local, 'connection'):
-            try:
-                self._local.connection.close()
-            except:
-                pass
-
-    def backup_database(self, backup_path):
-        if self.conn:
-            try:
-                backup_conn = sqlite3.connect(backup_path)
-                with backup_conn:
-                    self.conn.backup(backup_conn)
-                backup_conn.close()
-                print(f"Backup do banco de dados criado em: {backup_path}")
-                return True
-            except sqlite3.Error as e:
-                print(f"Erro ao criar backup do banco de dados: {e}")
-                return False
-        return False
-
-    def restore_database(self, backup_path):
-        if self.conn:
-            self.close() # Fechar a conexão atual antes de restaurar
-            try:
-                # Renomear o banco de dados atual para um backup temporário
-                import os
-                if os.path.exists(self.db_name):
-                    os.rename(self.db_name, self.db_name + ".bak")
-                
-                # Copiar o backup para o nome do banco de dados original
-                import shutil
-                shutil.copy(backup_path, self.db_name)
-                
-                self.connect() # Reconectar ao banco de dados restaurado
-                print(f"Banco de dados restaurado de: {backup_path}")
-                return True
-            except Exception as e:
-                print(f"Erro ao restaurar banco de dados: {e}")
-                # Tentar reverter se a restauração falhar
-                if os.path.exists(self.db_name + ".bak"):
-                    os.rename(self.db_name + ".bak", self.db_name)
-                self.connect()
+        if self.pool:
+            self.pool.close()
+
+    def _backup_progress(self, conn, progress):
+        """Adapta o progresso da API de backup para progress(páginas copiadas, total, bytes/s)"""
+        if not progress:
+            return None
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        started = time.monotonic()
+
+        def report(status, remaining, total):
+            copied = total - remaining
+            elapsed = time.monotonic() - started
+            progress(copied, total, copied * page_size / elapsed if elapsed else 0.0)
+
+        return report
+
+    def backup_database(self, backup_path, pages=DEFAULT_BACKUP_PAGES, sleep=DEFAULT_BACKUP_SLEEP, progress=None):
+        """Backup online incremental: copia pages páginas por passo, com uma pausa de sleep segundos entre eles.
+
+        As gravações do aplicativo continuam durante a cópia. progress(páginas
+        copiadas, total de páginas, bytes/s) é chamado a cada passo. O arquivo
+        só aparece em backup_path quando o backup termina.
+        """
+        tmp_path = backup_path + ".tmp"
+        try:
+            with self.snapshot() as source:
+                target = sqlite3.connect(tmp_path)
+                try:
+                    source.backup(target, pages=pages, progress=self._backup_progress(source, progress), sleep=sleep)
+                finally:
+                    target.close()
+            os.replace(tmp_path, backup_path)
+            print(f"Backup do banco de dados criado em: {backup_path}")
+            return True
+        except (sqlite3.Error, OSError) as e:
+            print(f"Erro ao criar backup do banco de dados: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    def backup_in_background(self, backup_path, progress=None, on_done=None, **kwargs):
+        """Roda backup_database em uma thread; on_done(sucesso) é chamado ao final. Retorna a thread"""
+        def run():
+            result = self.backup_database(backup_path, progress=progress, **kwargs)
+            if on_done:
+                on_done(result)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def restore_database(self, backup_path, pages=DEFAULT_BACKUP_PAGES, progress=None):
+        """Restaura um backup sem reiniciar o aplicativo.
+
+        O backup é copiado para o banco em uso pela API de backup do SQLite, na
+        conexão de escrita e com as outras gravações bloqueadas. Para as demais
+        conexões a troca é atômica: quem já estava lendo continua no retrato
+        antigo e as leituras seguintes veem o banco restaurado. O banco atual é
+        guardado antes em <banco>.bak e as migrações pendentes são aplicadas
+        ao restaurado.
+        """
+        if not os.path.exists(backup_path):
+            print(f"Arquivo de backup não encontrado: {backup_path}")
+            return False
+        source = None
+        try:
+            source = sqlite3.connect(backup_path)
+            if source.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+                raise sqlite3.DatabaseError("o arquivo de backup está corrompido")
+            if self.db_name != ":memory:" and not self.backup_database(self.db_name + ".bak", pages=-1, sleep=0):
                 return False
-        return False
+            with self.pool.exclusive() as conn:
+                # Sem pausa entre os passos: o escritor fica bloqueado até o fim da cópia
+                source.backup(conn, pages=pages, progress=self._backup_progress(source, progress), sleep=0)
+            self.migrate()
+            print(f"Banco de dados restaurado de: {backup_path}")
+            return True
+        except sqlite3.Error as e:
+            print(f"Erro ao restaurar banco de dados: {e}")
+            return False
+        finally:
+            if source is not None:
+                source.close()
 
     def get_asset_by_name(self, name):
-        if self.conn:
-            try:
-                self.cursor.execute("SELECT id, name, type FROM assets WHERE name = ?", (name,))
-                return self.cursor.fetchone()
-            except sqlite3.Error as e:
-                print(f"Erro ao buscar ativo por nome: {e}")
+        try:
+            with self.pool.reader() as conn:
+                return conn.execute("SELECT id, name, type FROM assets WHERE name = ?", (name,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar ativo por nome: {e}")
         return None
 
     def get_asset_by_id(self, asset_id):
-        if self.conn:
-            try:
-                self.cursor.execute("SELECT id, name, type FROM assets WHERE id = ?", (asset_id,))
-                return self.cursor.fetchone()
-            except sqlite3.Error as e:
-                print(f"Erro ao buscar ativo por ID: {e}")
+        try:
+            with self.pool.reader() as conn:
+                return conn.execute("SELECT id, name, type FROM assets WHERE id = ?", (asset_id,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Erro ao buscar ativo por ID: {e}")
         return None
 
-    def export_data_to_csv(self, filename="export_data.csv"):
-        if self.conn:
-            try:
-                # Exportar ativos
-                assets_df = pd.read_sql_query("SELECT * FROM assets", self.conn)
-                assets_df.to_csv(f"assets_{filename}", index=False)
-
-                # Exportar transações
-                transactions_df = pd.read_sql_query("SELECT * FROM transactions", self.conn)
-                transactions_df.to_csv(f"transactions_{filename}", index=False)
-
-                # Exportar histórico de preços
-                price_history_df = pd.read_sql_query("SELECT * FROM price_history", self.conn)
-                price_history_df.to_csv(f"price_history_{filename}", index=False)
-
-                # Exportar dividendos
-                dividends_df = pd.read_sql_query("SELECT * FROM dividends", self.conn)
-                dividends_df.to_csv(f"dividends_{filename}", index=False)
-
-                # Exportar alertas
-                alerts_df = pd.read_sql_query("SELECT * FROM alerts", self.conn)
-                alerts_df.to_csv(f"alerts_{filename}", index=False)
-
-                # Exportar eventos
-                events_df = pd.read_sql_query("SELECT * FROM events", self.conn)
-                events_df.to_csv(f"events_{filename}", index=False)
-
-                print(f"Dados exportados para CSV com sucesso: assets_{filename}, transactions_{filename}, price_history_{filename}, dividends_{filename}, alerts_{filename}, events_{filename}")
-                return True
-            except Exception as e:
-                print(f"Erro ao exportar dados para CSV: {e}")
-                return False
-        return False
-
-    def import_data_from_csv(self, assets_filename="assets_export_data.csv", transactions_filename="transactions_export_data.csv", price_history_filename="price_history_export_data.csv", dividends_filename="dividends_export_data.csv", alerts_filename="alerts_export_data.csv", events_filename="events_export_data.csv"):
-        if self.conn:
-            try:
-                # Importar ativos
-                assets_df = pd.read_csv(assets_filename)
-                assets_df.to_sql("assets", self.conn, if_exists="append", index=False)
-
-                # Importar transações
-                transactions_df = pd.read_csv(transactions_filename)
-                transactions_df.to_sql("transactions", self.conn, if_exists="append", index=False)
-
-                # Importar histórico de preços
-                price_history_df = pd.read_csv(price_history_filename)
-                price_history_df.to_sql("price_history", self.conn, if_exists="append", index=False)
-
-                # Importar dividendos
-                dividends_df = pd.read_csv(dividends_filename)
-                dividends_df.to_sql("dividends", self.conn, if_exists="append", index=False)
-
-                # Importar alertas
-                alerts_df = pd.read_csv(alerts_filename)
-                alerts_df.to_sql("alerts", self.conn, if_exists="append", index=False)
-
-                # Importar eventos
-                events_df = pd.read_csv(events_filename)
-                events_df.to_sql("events", self.conn, if_exists="append", index=False)
-
-                print("Dados importados de CSV com sucesso.")
-                return True
-            except Exception as e:
-                print(f"Erro ao importar dados de CSV: {e}")
-                return False
-        return False
-
-    def export_data_to_json(self, filename="export_data.json"):
-        if self.conn:
-            try:
-                data = {
-                    "assets": [],
-                    "transactions": [],
-                    "price_history": [],
-                    "dividends": [],
-                    "alerts": [],
-                    "events": []
-                }
-
-                self.cursor.execute("SELECT * FROM assets")
-                assets_cols = [description[0] for description in self.cursor.description]
-                for row in self.cursor.fetchall():
-                    data["assets"].append(dict(zip(assets_cols, row)))
-
-                self.cursor.execute("SELECT * FROM transactions")
-                transactions_cols = [description[0] for description in self.cursor.description]
-                for row in self.cursor.fetchall():
-                    data["transactions"].append(dict(zip(transactions_cols, row)))
-
-                self.cursor.execute("SELECT * FROM price_history")
-                price_history_cols = [description[0] for description in self.cursor.description]
-                for row in self.cursor.fetchall():
-                    data["price_history"].append(dict(zip(price_history_cols, row)))
-
-                self.cursor.execute("SELECT * FROM dividends")
-                dividends_cols = [description[0] for description in self.cursor.description]
-                for row in self.cursor.fetchall():
-                    data["dividends"].append(dict(zip(dividends_cols, row)))
-
-                self.cursor.execute("SELECT * FROM alerts")
-                alerts_cols = [description[0] for description in self.cursor.description]
-                for row in self.cursor.fetchall():
-                    data["alerts"].append(dict(zip(alerts_cols, row)))
-
-                self.cursor.execute("SELECT * FROM events")
-                events_cols = [description[0] for description in self.cursor.description]
-                for row in self.cursor.fetchall():
-                    data["events"].append(dict(zip(events_cols, row)))
-
-                with open(filename, "w") as f:
-                    json.dump(data, f, indent=4)
-
-                print(f"Dados exportados para JSON com sucesso: {filename}")
-                return True
-            except Exception as e:
-                print(f"Erro ao exportar dados para JSON: {e}")
-                return False
-        return False
-
-    def import_data_from_json(self, filename="export_data.json"):
-        if self.conn:
-            try:
-                with open(filename, "r") as f:
-                    data = json.load(f)
-
-                # Verificar se é o formato de carteira simplificado
-                if isinstance(data, list) and len(data) > 0 and "asset_id" in data[0]:
-                    return self._import_carteira_format(data)
-                
+    def export_data_to_csv(self, filename="export_data.csv", chunk_size=DEFAULT_CHUNK_SIZE, progress=None, compression=None):
+        """Exporta cada tabela para tabela_filename, lendo o banco em blocos de chunk_size linhas.
+
+        compression: None, "gzip" ou "zstd" (padrão: pela extensão, .gz ou .zst).
+        progress(linhas gravadas, total de linhas, tabela) é chamado a cada bloco.
+        """
+        try:
+            compression = compression or detect_compression(filename)
+            # Um único retrato do banco: contagens e tabelas exportadas ficam coerentes entre si
+            with self.snapshot() as conn:
+                paths = write_csv(TableStreamer(conn, chunk_size=chunk_size, progress=progress), filename, compression)
+            print(f"Dados exportados para CSV com sucesso: {', '.join(paths)}")
+            return True
+        except Exception as e:
+            print(f"Erro ao exportar dados para CSV: {e}")
+            return False
+
+    def import_data_from_csv(self, assets_filename="assets_export_data.csv", transactions_filename="transactions_export_data.csv", price_history_filename="price_history_export_data.csv", dividends_filename="dividends_export_data.csv", alerts_filename="alerts_export_data.csv", events_filename="events_export_data.csv", chunk_size=DEFAULT_CSV_CHUNK_SIZE):
+        """Importa os CSVs exportados em uma única transação, validando e mesclando em blocos.
+
+        Linhas inválidas não interrompem a importação: são gravadas em
+        rejeitados_<arquivo>. Arquivos ausentes são pulados. Retorna um
+        CsvImportReport (falso se a importação falhou e foi desfeita).
+        """
+        filenames = {
+            "assets": assets_filename,
+            "transactions": transactions_filename,
+            "price_history": price_history_filename,
+            "dividends": dividends_filename,
+            "alerts": alerts_filename,
+            "events": events_filename,
+        }
+        importer = None
+        try:
+            with self.transaction() as conn:
+                importer = CsvImporter(conn, chunk_size)
+                report = importer.import_files(filenames)
+            print(f"Dados importados de CSV com sucesso.\n{report.summary()}")
+            return report
+        except Exception as e:
+            print(f"Erro ao importar dados de CSV: {e}")
+            report = importer.report if importer else CsvImportReport()
+            report.ok = False
+            return report
+
+    def export_data_to_json(self, filename="export_data.json", chunk_size=DEFAULT_CHUNK_SIZE, progress=None, compression=None):
+        """Exporta todas as tabelas para um arquivo JSON, gravado em blocos de chunk_size linhas.
+
+        compression: None, "gzip" ou "zstd" (padrão: pela extensão, .gz ou .zst).
+        progress(linhas gravadas, total de linhas, tabela) é chamado a cada bloco.
+        """
+        try:
+            compression = compression or detect_compression(filename)
+            with self.snapshot() as conn, open_export_file(filename, compression) as f:
+                write_json(TableStreamer(conn, chunk_size=chunk_size, progress=progress), f)
+            print(f"Dados exportados para JSON com sucesso: {filename}")
+            return True
+        except Exception as e:
+            print(f"Erro ao exportar dados para JSON: {e}")
+            return False
+
+    def import_data_from_json(self, filename="export_data.json", batch_size=DEFAULT_IMPORT_BATCH_SIZE, progress=None):
+        """Importa um JSON exportado (ou no formato simplificado de carteira), lendo o arquivo em fluxo.
+
+        O formato completo é gravado em transações de batch_size registros. Se
+        a importação for interrompida, chamar de novo com o mesmo arquivo
+        retoma do último lote gravado. progress(registros lidos, seção) é
+        chamado a cada lote. Aceita arquivos .gz e .zst.
+        """
+        try:
+            with open_export_file(filename, detect_compression(filename), mode="rt") as f:
+                reader = JsonStreamReader(f)
+                opening = reader.start()
+
+                # Verificar se é o formato de carteira simplificado (pequeno: lido inteiro)
+                if opening == "[":
+                    carteira_data = list(reader.array_items())
+                    if carteira_data and "asset_id" in carteira_data[0]:
+                        return self._import_carteira_format(carteira_data)
+
                 # Formato completo (assets, transactions, etc.)
-                if isinstance(data, dict) and "assets" in data:
-                    return self._import_full_format(data)
-                
-                print("Formato de JSON não reconhecido.")
-                return False
-                
-            except Exception as e:
-                print(f"Erro ao importar dados de JSON: {e}")
-                return False
-        return False
+                if opening == "{":
+                    return self._import_full_format(reader.object_items(), os.path.abspath(filename),
+                                                    file_signature(filename), batch_size, progress)
+
+            print("Formato de JSON não reconhecido.")
+            return False
+
+        except Exception as e:
+            print(f"Erro ao importar dados de JSON: {e}")
+            return False
 
     def _import_carteira_format(self, carteira_data):
         """Importa formato simplificado de carteira"""
         try:
             import datetime
-            
-            for item in carteira_data:
-                asset_id = item["asset_id"]
-                current_quantity = item["current_quantity"]
-                average_price = item["average_price"]
-                
-                # Verificar se o ativo já existe
-                existing_asset = self.get_asset_by_name(asset_id)
-                if not existing_asset:
-                    # Criar ativo se não existir (assumir tipo "Ação" por padrão)
-                    asset_db_id = self.add_asset(asset_id, "Ação")
-                else:
-                    asset_db_id = existing_asset[0]
-                
-                if asset_db_id and current_quantity > 0:
-                    # Adicionar transação de compra para representar a posição atual
-                    today = datetime.datetime.now().strftime("%Y-%m-%d")
-                    self.add_transaction(asset_db_id, "compra", current_quantity, average_price, today)
-                    
-                    # Adicionar preço atual ao histórico
-                    self.add_price_history(asset_db_id, average_price, today)
-            
+
+            # Tudo ou nada: uma falha desfaz a importação inteira
+            with self.transaction():
+                transactions = []
+                prices = []
+                for item in carteira_data:
+                    asset_id = item["asset_id"]
+                    current_quantity = item["current_quantity"]
+                    average_price = item["average_price"]
+
+                    # Verificar se o ativo já existe
+                    existing_asset = self.get_asset_by_name(asset_id)
+                    if not existing_asset:
+                        # Criar ativo se não existir (assumir tipo "Ação" por padrão)
+                        asset_db_id = self.add_asset(asset_id, "Ação")
+                    else:
+                        asset_db_id = existing_asset[0]
+
+                    if asset_db_id and current_quantity > 0:
+                        # Adicionar transação de compra para representar a posição atual
+                        today = datetime.datetime.now().strftime("%Y-%m-%d")
+                        transactions.append((asset_db_id, "compra", current_quantity, average_price, today))
+
+                        # Adicionar preço atual ao histórico
+                        prices.append((asset_db_id, average_price, today))
+
+                self.add_transactions_bulk(transactions)
+                self.add_price_history_bulk(prices)
             print("Dados de carteira importados com sucesso.")
             return True
             
@@ -520,65 +1019,89 @@ class DatabaseManager:
             print(f"Erro ao importar formato de carteira: {e}")
             return False
 
-    def _import_full_format(self, data):
-        """Importa formato completo de dados"""
-        try:
-            # Importar ativos
-            for asset in data["assets"]:
-                self.add_asset(asset["name"], asset["type"])
-
-            # Importar transações
-            for transaction in data["transactions"]:
-                # Usar asset_id diretamente do JSON exportado
-                asset_id = transaction["asset_id"]
-                self.add_transaction(asset_id, transaction["transaction_type"], transaction["quantity"], transaction["price"], transaction["transaction_date"])
-
-            # Importar histórico de preços
-            for price_entry in data["price_history"]:
-                # Usar asset_id diretamente do JSON exportado
-                asset_id = price_entry["asset_id"]
-                self.add_price_history(asset_id, price_entry["price"], price_entry["record_date"])
-            
-            # Importar dividendos
-            for dividend_entry in data["dividends"]:
-                # Usar asset_id diretamente do JSON exportado
-                asset_id = dividend_entry["asset_id"]
-                self.add_dividend(asset_id, dividend_entry["dividend_value"], dividend_entry["payment_date"])
-
-            # Importar alertas
-            for alert_entry in data["alerts"]:
-                # Usar asset_id diretamente do JSON exportado
-                asset_id = alert_entry["asset_id"]
-                self.add_alert(asset_id, alert_entry["alert_type"], alert_entry["target_value"], alert_entry["percentage_change"])
-
-            # Importar eventos
-            for event_entry in data["events"]:
-                asset_id = event_entry["asset_id"]
-                self.add_event(event_entry["event_date"], event_entry["event_type"], event_entry["description"], asset_id)
+    def _import_checkpoint(self, key, signature):
+        """Registros já gravados de uma importação interrompida do mesmo arquivo (0 se não houver)"""
+        with self.pool.reader() as conn:
+            row = conn.execute("SELECT signature, position FROM import_checkpoints WHERE filename = ?", (key,)).fetchone()
+        if row and row[0] == signature:
+            return row[1]
+        return 0
 
+    def _import_full_format(self, items, key, signature, batch_size=DEFAULT_IMPORT_BATCH_SIZE, progress=None):
+        """Importa formato completo de dados a partir de (seção, registro), em lotes retomáveis"""
+        try:
+            done = self._import_checkpoint(key, signature)
+            if done:
+                print(f"Retomando importação após {done} registros já gravados.")
+            counts = {section: [0, 0] for section in IMPORT_SECTIONS}
+            batch = []
+            batch_section = None
+            position = 0
+
+            def flush():
+                table, columns, date_column, _ = IMPORT_SECTIONS[batch_section]
+                # O lote e o ponto de retomada são gravados na mesma transação
+                with self.transaction() as conn:
+                    inserted, ignored = self._insert_bulk(table, columns, batch, date_column)
+                    conn.execute("INSERT OR REPLACE INTO import_checkpoints (filename, signature, position, updated_at) VALUES (?, ?, ?, ?)",
+                                 (key, signature, position, datetime.datetime.now().isoformat(timespec="seconds")))
+                counts[batch_section][0] += inserted
+                counts[batch_section][1] += ignored
+                batch.clear()
+                if progress:
+                    progress(position, batch_section)
+
+            # Transações, preços etc. só são gravados depois dos ativos a que se referem
+            for section, item in assets_first(items):
+                if section not in IMPORT_SECTIONS:
+                    continue
+                # Usando asset_id diretamente do JSON exportado
+                row = IMPORT_SECTIONS[section][3](item)
+                if batch and section != batch_section:
+                    flush()
+                position += 1
+                if position <= done:
+                    continue
+                batch.append(row)
+                batch_section = section
+                if len(batch) >= batch_size:
+                    flush()
+            if batch:
+                flush()
+
+            with self.transaction() as conn:
+                conn.execute("DELETE FROM import_checkpoints WHERE filename = ?", (key,))
+            for section, (inserted, ignored) in counts.items():
+                if inserted or ignored:
+                    print(f"{section}: {inserted} registros importados (ignorados: {ignored})")
             print("Dados completos importados de JSON com sucesso.")
             return True
-            
+
         except Exception as e:
             print(f"Erro ao importar formato completo: {e}")
             return False
 
+    def delete_assets(self, asset_ids):
+        """Exclui vários ativos e tudo o que se refere a eles em uma única transação.
+
+        As tabelas filhas são limpas pelo ON DELETE CASCADE, usando os índices
+        por asset_id. Retorna {tabela: linhas excluídas} ou None em caso de erro.
+        """
+        ids = json.dumps([int(asset_id) for asset_id in asset_ids])
+        try:
+            with self.transaction() as conn:
+                # Contagem antes da exclusão: changes() não inclui as linhas apagadas em cascata
+                counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE asset_id IN (SELECT value FROM json_each(?))",
+                                              (ids,)).fetchone()[0]
+                          for table in ASSET_CHILD_TABLES}
+                counts["assets"] = conn.execute("DELETE FROM assets WHERE id IN (SELECT value FROM json_each(?))", (ids,)).rowcount
+            return counts
+        except sqlite3.Error as e:
+            print(f"Erro ao excluir ativos: {e}")
+        return None
+
     def delete_asset(self, asset_id):
-        if self.conn:
-            try:
-                # Excluir transações, histórico de preços, dividendos, alertas e eventos relacionados ao ativo
-                self.cursor.execute("DELETE FROM transactions WHERE asset_id = ?", (asset_id,))
-                self.cursor.execute("DELETE FROM price_history WHERE asset_id = ?", (asset_id,))
-                self.cursor.execute("DELETE FROM dividends WHERE asset_id = ?", (asset_id,))
-                self.cursor.execute("DELETE FROM alerts WHERE asset_id = ?", (asset_id,))
-                self.cursor.execute("DELETE FROM events WHERE asset_id = ?", (asset_id,))
-                # Excluir o ativo
-                self.cursor.execute("DELETE FROM assets WHERE id = ?", (asset_id,))
-                self.conn.commit()
-                return True
-            except Exception as e:
-                print(f'Erro ao excluir ativo: {e}')
-        return False
+        return self.delete_assets([asset_id]) is not None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,43 @@
+import argparse
+import sys
+from database_manager import DatabaseManager
+
+
+def verify_positions(db):
+    """Imprime as posições divergentes das transações. Retorna True se não houver divergência"""
+    mismatches = db.verify_positions()
+    for asset_id, stored, expected in mismatches:
+        print(f"Ativo {asset_id}: posição gravada {stored}, recalculada {expected}")
+    print(f"{len(mismatches)} posições divergentes.")
+    return not mismatches
+
+
+def rebuild_positions(db):
+    """Recalcula a tabela positions a partir das transações"""
+    count = db.rebuild_positions()
+    if count is None:
+        return False
+    print(f"{count} posições reconstruídas.")
+    return True
+
+
+COMMANDS = {
+    "verificar-posicoes": verify_positions,
+    "reconstruir-posicoes": rebuild_positions,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutenção do banco de dados da carteira.")
+    parser.add_argument("comando", choices=sorted(COMMANDS))
+    parser.add_argument("banco", nargs="?", default="investment_carteira.db")
+    args = parser.parse_args(argv)
+    db = DatabaseManager(args.banco)
+    try:
+        return 0 if COMMANDS[args.comando](db) else 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,10 +3,11 @@ from tkinter import ttk, messagebox, simpledialog
 import datetime
 
 class EventCalendarWindow(tk.Toplevel):
-    def __init__(self, parent, db_manager):
+    def __init__(self, parent, async_db):
         super().__init__(parent)
         self.title("Calendário de Eventos")
-        self.db = db_manager
+        # Fachada assíncrona (AsyncDatabase): os resultados chegam por callback
+        self.db = async_db
 
         self.create_widgets()
         self.load_events()
@@ -71,15 +72,18 @@ class EventCalendarWindow(tk.Toplevel):
             messagebox.showerror("Erro", "Formato de data inválido. Use DD/MM/AAAA (ex: 15/01/2024).")
             return
 
-        asset_id = None
         if asset_name:
-            asset = self.db.get_asset_by_name(asset_name)
-            if not asset:
-                messagebox.showerror("Erro", f"Ativo \'{asset_name}\' não encontrado no banco de dados.")
-                return
-            asset_id = asset[0]
+            self.db.get_asset_by_name(asset_name, callback=lambda asset: self._add_event_for(asset, asset_name, event_date_db, event_type, description))
+        else:
+            self.db.add_event(event_date_db, event_type, description, None, callback=self._event_added)
 
-        self.db.add_event(event_date_db, event_type, description, asset_id)
+    def _add_event_for(self, asset, asset_name, event_date_db, event_type, description):
+        if not asset:
+            messagebox.showerror("Erro", f"Ativo \'{asset_name}\' não encontrado no banco de dados.")
+            return
+        self.db.add_event(event_date_db, event_type, description, asset[0], callback=self._event_added)
+
+    def _event_added(self, event_id):
         messagebox.showinfo("Sucesso", "Evento adicionado com sucesso!")
         self.event_date_entry.delete(0, tk.END)
         self.event_type_combobox.set("")
@@ -88,11 +92,13 @@ class EventCalendarWindow(tk.Toplevel):
         self.load_events()
 
     def load_events(self):
+        today = datetime.date.today().strftime("%Y-%m-%d")
+        # Carrega eventos a partir de hoje, na thread do banco
+        self.db.get_events(start_date=today, callback=self._show_events)
+
+    def _show_events(self, events):
         for item in self.events_tree.get_children():
             self.events_tree.delete(item)
-        
-        today = datetime.date.today().strftime("%Y-%m-%d")
-        events = self.db.get_events(start_date=today) # Carrega eventos a partir de hoje
         for event in events:
             event_id, event_date, event_type, description, asset_name = event
             # Converter data para formato brasileiro
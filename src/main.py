@@ -2,7 +2,9 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 from asset_registration import AssetRegistrationWindow
 from database_manager import DatabaseManager
+from async_database import AsyncDatabase, BackgroundWorker
 from yfinance_integration import YFinanceIntegration
+from replay_price_provider import ReplayPriceProvider
 from report_generator import ReportGenerator
 from logger import log_message
 from plot_manager import PlotManager
@@ -10,29 +12,71 @@ from risk_analysis import RiskAnalysis
 from projection_simulation import ProjectionSimulation
 from alert_manager import AlertManagerWindow
 from event_calendar import EventCalendarWindow
+from price_backfill import PriceBackfillService
+from price_archive import PriceArchive
+from benchmark_history import BenchmarkHistoryStore
+from refresh_scheduler import QuoteRefreshScheduler, PRIORITY_ALERT, PRIORITY_VISIBLE, PRIORITY_DORMANT
+from quote_cache import QuoteCache, default_cache_path
+from quote_stream import QuoteStream, ProviderTickSource, SimulatedTickSource, PriceHistoryRecorder, drain_latest
+from alert_engine import AlertEngine
 import datetime
 import threading
 import time
+import os
 
 
 
+def create_price_provider(db_name):
+    """Escolhe o provedor de cotações.
+
+    Por padrão usa o Yahoo Finance, com o cache de cotações ao lado do banco
+    db_name. Se a variável de ambiente CARTEIRA_REPLAY_FILE apontar para um
+    arquivo de cotações gravadas, reproduz essas cotações offline (com latência
+    simulada opcional em CARTEIRA_REPLAY_LATENCY, em segundos).
+    """
+    replay_file = os.environ.get("CARTEIRA_REPLAY_FILE")
+    if replay_file:
+        latency = float(os.environ.get("CARTEIRA_REPLAY_LATENCY", "0"))
+        return ReplayPriceProvider(replay_file, latency=latency)
+    return YFinanceIntegration(cache=QuoteCache(default_cache_path(db_name)))
+
+
 class InvestmentCarteiraApp:
-    def __init__(self, root):
+    def __init__(self, root, price_provider=None):
         self.root = root
         self.root.title("App de Controle e Automação de Carteira de Investimentos")
 
         self.db = DatabaseManager()
-        self.yf_integration = YFinanceIntegration()
+        # Consultas da interface rodam na thread do banco; os resultados voltam por root.after
+        self.async_db = AsyncDatabase(self.db, self.root)
+        # Downloads, importações e cálculos longos rodam à parte, sem segurar a fila do banco
+        self.background = BackgroundWorker(self.root, max_workers=2)
+        self.price_provider = price_provider or create_price_provider(self.db.db_name)
         self.report_gen = ReportGenerator()
         self.plot_m = PlotManager()
-        self.risk_analysis = RiskAnalysis(self.db, self.yf_integration)
-        self.projection_simulation = ProjectionSimulation(self.db, self.yf_integration)
+        self.benchmark_history = BenchmarkHistoryStore(self.db, self.price_provider)
+        self.price_backfill = PriceBackfillService(self.db, self.price_provider, benchmark_store=self.benchmark_history)
+        # Cópia colunar do histórico de preços, lida pelas análises e gráficos
+        self.price_archive = PriceArchive(self.db)
+        self.risk_analysis = RiskAnalysis(self.db, self.price_provider, self.price_backfill, self.benchmark_history, self.price_archive)
+        self.projection_simulation = ProjectionSimulation(self.db, self.price_provider, self.price_archive)
+        # Barramento de cotações: consumido pela tabela, pelos alertas e pelo histórico de preços
+        self.quote_stream = QuoteStream()
+        self.tree_ticks = self.quote_stream.subscribe("treeview")
+        self.asset_details_map = {}
+        self.current_carteira_data = []
+        self.rows_by_ticker = {}
+        self.carteira_rows = {}
+        self._load_request = 0
+        self._on_loaded = []
+        self._quotes_fetched_at = {}  # ticker -> time.monotonic() da última cotação buscada pela tabela
         self.create_widgets()
-        self.load_assets_from_db()
 
-        # Configurar atualização em segundo plano
-        self.update_interval_minutes = 5 # Atualizar a cada 5 minutos
-        self.schedule_background_update()
+        # Configurar atualização em segundo plano, depois da primeira carga da tabela
+        self.priority_update_seconds = 15 # Reavaliar tickers visíveis e com alertas a cada 15 segundos
+        self.stream_poll_ms = 500 # Aplicar os ticks do fluxo de cotações na tabela a cada 0,5 segundo
+        self.load_assets_from_db(on_loaded=self.schedule_background_update)
+        self.price_backfill.start() # Completa o histórico de preços em segundo plano
 
         self.current_theme = "clam" # Tema claro como padrão
         self.apply_theme(self.current_theme)
@@ -379,7 +423,7 @@ class InvestmentCarteiraApp:
             log_message(f"Erro ao aplicar tema {theme_name}, usando tema padrão: {e}")
 
     def register_asset(self):
-        AssetRegistrationWindow(self.root, self.load_assets_from_db)
+        AssetRegistrationWindow(self.root, self.load_assets_from_db, self.db, self.price_provider, self.async_db)
 
     def edit_asset(self):
         selected_item = self.tree.selection()
@@ -392,116 +436,236 @@ class InvestmentCarteiraApp:
 
         if asset_id:
             # Recuperar os dados completos do ativo para preencher o formulário de edição
-            asset_data = self.db.get_asset_by_id(asset_id)
-            if asset_data:
-                # Abrir uma nova janela ou usar a mesma janela de registro para edição
-                # Por simplicidade, vamos usar simpledialog para alguns campos, mas o ideal seria uma janela dedicada
-                new_name = simpledialog.askstring("Editar Ativo", "Novo nome do ativo:", initialvalue=asset_data[1], parent=self.root)
-                new_type = simpledialog.askstring("Editar Ativo", "Novo tipo do ativo:", initialvalue=asset_data[2], parent=self.root)
-
-                if new_name and new_type:
-                    if self.db.update_asset(asset_id, new_name, new_type):
-                        messagebox.showinfo("Editar Ativo", "Ativo atualizado com sucesso!")
-                        log_message(f"Ativo {asset_name} atualizado para {new_name}.")
-                        self.load_assets_from_db()
-                    else:
-                        messagebox.showerror("Editar Ativo", "Erro ao atualizar ativo.")
-                        log_message(f"Erro ao atualizar ativo {asset_name}.")
-                else:
-                    messagebox.showwarning("Editar Ativo", "Edição cancelada ou dados inválidos.")
-            else:
-                messagebox.showerror("Erro", "Não foi possível carregar os dados do ativo para edição.")
+            self.async_db.get_asset_by_id(asset_id, callback=lambda asset_data: self._edit_asset_form(asset_id, asset_name, asset_data))
         else:
             messagebox.showerror("Erro", "Ativo não encontrado para edição.")
 
+    def _edit_asset_form(self, asset_id, asset_name, asset_data):
+        if asset_data:
+            # Abrir uma nova janela ou usar a mesma janela de registro para edição
+            # Por simplicidade, vamos usar simpledialog para alguns campos, mas o ideal seria uma janela dedicada
+            new_name = simpledialog.askstring("Editar Ativo", "Novo nome do ativo:", initialvalue=asset_data[1], parent=self.root)
+            new_type = simpledialog.askstring("Editar Ativo", "Novo tipo do ativo:", initialvalue=asset_data[2], parent=self.root)
+
+            if new_name and new_type:
+                self.async_db.update_asset(asset_id, new_name, new_type,
+                                           callback=lambda success: self._asset_updated(asset_name, new_name, success))
+            else:
+                messagebox.showwarning("Editar Ativo", "Edição cancelada ou dados inválidos.")
+        else:
+            messagebox.showerror("Erro", "Não foi possível carregar os dados do ativo para edição.")
+
+    def _asset_updated(self, asset_name, new_name, success):
+        if success:
+            messagebox.showinfo("Editar Ativo", "Ativo atualizado com sucesso!")
+            log_message(f"Ativo {asset_name} atualizado para {new_name}.")
+            self.load_assets_from_db()
+        else:
+            messagebox.showerror("Editar Ativo", "Erro ao atualizar ativo.")
+            log_message(f"Erro ao atualizar ativo {asset_name}.")
+
     def delete_asset(self):
-        selected_item = self.tree.selection()
-        if not selected_item:
-            messagebox.showwarning("Excluir Ativo", "Selecione um ativo na tabela para excluir.")
+        selected_items = self.tree.selection()
+        if not selected_items:
+            messagebox.showwarning("Excluir Ativo", "Selecione um ou mais ativos na tabela para excluir.")
             return
 
-        asset_name = self.tree.item(selected_item[0], "values")[0]
-        asset_id = self.asset_details_map.get(asset_name)
+        asset_names = [self.tree.item(item, "values")[0] for item in selected_items]
+        asset_ids = [self.asset_details_map.get(name) for name in asset_names]
 
-        if asset_id:
-            confirm = messagebox.askyesno("Confirmar Exclusão", f"Tem certeza que deseja excluir o ativo {asset_name} e todas as suas transações e histórico de preços?")
+        if all(asset_ids):
+            names = ", ".join(asset_names)
+            confirm = messagebox.askyesno("Confirmar Exclusão", f"Tem certeza que deseja excluir {names} e todas as suas transações e histórico de preços?")
             if confirm:
-                if self.db.delete_asset(asset_id):
-                    messagebox.showinfo("Excluir Ativo", "Ativo excluído com sucesso!")
-                    log_message(f"Ativo {asset_name} excluído.")
-                    self.load_assets_from_db()
-                else:
-                    messagebox.showerror("Excluir Ativo", "Erro ao excluir ativo.")
-                    log_message(f"Erro ao excluir ativo {asset_name}.")
+                # Todos os ativos e seus registros são excluídos em uma única transação, na thread do banco
+                self.async_db.delete_assets(asset_ids, callback=lambda counts: self._assets_deleted(names, counts))
         else:
             messagebox.showerror("Erro", "Ativo não encontrado para exclusão.")
 
-    def load_assets_from_db(self, filter_text=""):
+    def _assets_deleted(self, names, counts):
+        if counts is not None:
+            messagebox.showinfo("Excluir Ativo", f"{counts['assets']} ativo(s) excluído(s), com {counts['transactions']} transações "
+                                f"e {counts['price_history']} registros de preço.")
+            log_message(f"Ativos excluídos: {names} ({counts}).")
+            self.load_assets_from_db()
+        else:
+            messagebox.showerror("Excluir Ativo", "Erro ao excluir ativo.")
+            log_message(f"Erro ao excluir ativos {names}.")
+
+    def load_assets_from_db(self, filter_text="", on_loaded=None):
+        """Recarrega a tabela. A consulta roda na thread do banco e on_loaded() é chamado quando as cotações chegam.
+
+        Só o resultado do pedido mais recente é exibido (ex: digitação no
+        filtro); os on_loaded dos pedidos anteriores rodam junto com ele.
+        """
+        self._load_request += 1
+        request = self._load_request
+        if on_loaded:
+            self._on_loaded.append(on_loaded)
+        self.async_db.get_all_assets_with_transactions(callback=lambda assets: self._show_assets(request, assets, filter_text))
+
+    def _show_assets(self, request, assets, filter_text):
+        if request != self._load_request:
+            return
         # Limpar a treeview antes de carregar os dados
         for item in self.tree.get_children():
             self.tree.delete(item)
 
         self.current_carteira_data = [] # Para armazenar os dados para o relatório
         self.asset_details_map = {} # Para mapear o nome do ativo para o ID para buscar histórico
-        total_invested_carteira = 0.0
-        total_current_value_carteira = 0.0
 
-        assets = self.db.get_all_assets_with_transactions()
+        # Aplicar filtro
+        if filter_text:
+            assets = [a for a in assets if filter_text.lower() in a[1].lower() or filter_text.lower() in a[2].lower()]
+
+        # Inserir as linhas imediatamente com os dados do banco; as colunas de
+        # cotação são preenchidas à medida que os preços chegam
+        rows_by_ticker = {}
         for asset in assets:
             asset_id, name, asset_type, total_quantity, total_invested_cost = asset
-            
-            # Aplicar filtro
-            if filter_text and filter_text.lower() not in name.lower() and filter_text.lower() not in asset_type.lower():
-                continue
-
             self.asset_details_map[name] = asset_id
-            
-            current_price = self.yf_integration.get_current_price(name + ".SA")
-            if current_price is None:
-                current_price = 0.0
-            
-            # Salvar histórico de preço
-            today = datetime.date.today().strftime("%Y-%m-%d")
-            self.db.add_price_history(asset_id, current_price, today)
 
             # Calcular preço médio de compra
             average_buy_price = total_invested_cost / total_quantity if total_quantity > 0 else 0.0
 
-            current_value = total_quantity * current_price
-            rentability = ((current_value - total_invested_cost) / total_invested_cost) * 100 if total_invested_cost != 0 else 0.0
-
-            self.tree.insert("", "end", values=(
+            item_id = self.tree.insert("", "end", values=(
                 name,
                 asset_type,
                 total_quantity,
                 f"{average_buy_price:.2f}",
-                f"{current_price:.2f}",
+                "...",
                 f"{total_invested_cost:.2f}",
-                f"{current_value:.2f}",
-                f"{rentability:.2f}"
+                "...",
+                "..."
             ))
-            self.current_carteira_data.append((name, asset_type, total_quantity, average_buy_price, current_price, total_invested_cost, current_value, rentability))
+            rows_by_ticker[name + ".SA"] = (item_id, asset, average_buy_price)
 
-            total_invested_carteira += total_invested_cost
-            total_current_value_carteira += current_value
+        self.rows_by_ticker = rows_by_ticker
+        self.carteira_rows = {}
 
-            # Alerta visual de variação de preço (ex: > 5%)
-            if abs(rentability) > 5.0:
-                alert_message = f"Alerta: {name} teve variação de {rentability:.2f}%!"
-                log_message(alert_message)
+        # Buscar as cotações numa thread, para a janela continuar respondendo durante as
+        # requisições; cada linha é atualizada na thread da interface assim que seu preço chega
+        tickers = list(rows_by_ticker)
+        asset_types = {ticker: row[1][2] for ticker, row in rows_by_ticker.items()}
 
+        def fetch_quotes():
+            try:
+                for ticker, current_price in self.price_provider.iter_current_prices(tickers, asset_types=asset_types):
+                    self.root.after(0, lambda t=ticker, p=current_price: self._quote_received(request, t, p))
+            except Exception as e:
+                log_message(f"Erro ao buscar cotações: {e}")
+            self.root.after(0, lambda: self._quotes_loaded(request))
+
+        threading.Thread(target=fetch_quotes, daemon=True).start()
+
+    def _quote_received(self, request, ticker, current_price):
+        # Cotações de uma carga já substituída por outra são descartadas
+        if request != self._load_request:
+            return
+        self._show_price(ticker, current_price)
+        if current_price is not None:
+            self.quote_stream.publish(ticker, current_price)
+
+    def _quotes_loaded(self, request):
+        if request != self._load_request:
+            return
+        # O agendador não consulta de novo, antes do prazo, o que a tabela acabou de cotar
+        self._quotes_fetched_at.update(dict.fromkeys(self.rows_by_ticker, time.monotonic()))
+        self._update_totals()
+        self._update_refresh_priorities()
+        if hasattr(self, "alert_engine"):
+            self.alert_engine.request_reload()
+
+        stats = self.price_provider.cache_stats()
+        log_message(f"Cache de cotações: {stats['memory_hits']} acertos em memória, {stats['disk_hits']} em disco, "
+                    f"{stats['misses']} falhas (taxa de acerto {stats['hit_rate']:.0%})")
+        suppressed = self.price_provider.suppressed_tickers()
+        if suppressed:
+            log_message(f"Tickers suprimidos temporariamente por falhas consecutivas: {', '.join(sorted(suppressed))}")
+        if self.price_provider.circuit_status() != "fechado":
+            log_message(f"Provedor de cotações instável: circuito {self.price_provider.circuit_status()}.")
+
+        on_loaded, self._on_loaded = self._on_loaded, []
+        for callback in on_loaded:
+            callback()
+
+    def _show_price(self, ticker, current_price):
+        """Preenche a linha do ativo na tabela com a cotação"""
+        item_id, asset, average_buy_price = self.rows_by_ticker[ticker]
+        asset_id, name, asset_type, total_quantity, total_invested_cost = asset
+
+        if current_price is None:
+            current_price = 0.0
+
+        current_value = total_quantity * current_price
+        rentability = ((current_value - total_invested_cost) / total_invested_cost) * 100 if total_invested_cost != 0 else 0.0
+
+        self.tree.item(item_id, values=(
+            name,
+            asset_type,
+            total_quantity,
+            f"{average_buy_price:.2f}",
+            f"{current_price:.2f}",
+            f"{total_invested_cost:.2f}",
+            f"{current_value:.2f}",
+            f"{rentability:.2f}"
+        ))
+        self.carteira_rows[ticker] = (name, asset_type, total_quantity, average_buy_price, current_price, total_invested_cost, current_value, rentability)
+
+        # Alerta visual de variação de preço (ex: > 5%)
+        if abs(rentability) > 5.0:
+            alert_message = f"Alerta: {name} teve variação de {rentability:.2f}%!"
+            log_message(alert_message)
+
+    def _update_totals(self):
+        # Manter os dados do relatório na mesma ordem da tabela
+        self.current_carteira_data = [self.carteira_rows[ticker] for ticker in self.rows_by_ticker if ticker in self.carteira_rows]
+
+        total_invested_carteira = sum(row[5] for row in self.current_carteira_data)
+        total_current_value_carteira = sum(row[6] for row in self.current_carteira_data)
         self.total_invested_carteira = total_invested_carteira
         self.total_current_value_carteira = total_current_value_carteira
         self.total_rentability_carteira = ((total_current_value_carteira - total_invested_carteira) / total_invested_carteira) * 100 if total_invested_carteira != 0 else 0.0
 
+    def _update_refresh_priorities(self):
+        """Informa ao agendador quais tickers têm alertas ativos e quais estão visíveis na tabela"""
+        if not hasattr(self, "quote_scheduler"):
+            return
+        visible_tickers = {ticker for ticker, row in self.rows_by_ticker.items()
+                           if self.tree.exists(row[0]) and self.tree.bbox(row[0])}
+        self.async_db.submit(lambda: (self.db.get_active_alerts(), self.db.get_all_assets()),
+                             callback=lambda result: self._set_refresh_priorities(visible_tickers, *result))
+
+    def _set_refresh_priorities(self, visible_tickers, alerts, assets):
+        alert_tickers = {alert[1] + ".SA" for alert in alerts}
+        priorities = {}
+        asset_types = {}
+        for asset_id, name, asset_type in assets:
+            ticker = name + ".SA"
+            asset_types[ticker] = asset_type
+            if ticker in alert_tickers:
+                priorities[ticker] = PRIORITY_ALERT
+            elif ticker in visible_tickers:
+                priorities[ticker] = PRIORITY_VISIBLE
+            else:
+                priorities[ticker] = PRIORITY_DORMANT
+        self.quote_scheduler.set_tickers(priorities, asset_types, fetched_at=self._quotes_fetched_at)
+
     def apply_filter(self, event=None):
         filter_text = self.search_entry.get()
         self.load_assets_from_db(filter_text)
 
-    def update_quotes(self):
-        self.load_assets_from_db() # Recarrega os dados, o que vai buscar as cotações atualizadas
-        messagebox.showinfo("Atualização", "Cotações atualizadas com sucesso!")
-        log_message("Cotações atualizadas.")
+    def update_quotes(self, on_updated=None):
+        # Atualização explícita: descartar o cache para forçar cotações novas
+        self.price_provider.invalidate_quotes([name + ".SA" for name in self.asset_details_map])
+
+        def updated():
+            messagebox.showinfo("Atualização", "Cotações atualizadas com sucesso!")
+            log_message("Cotações atualizadas.")
+            if on_updated:
+                on_updated()
+
+        self.load_assets_from_db(on_loaded=updated) # Recarrega os dados, o que vai buscar as cotações atualizadas
 
     def generate_report(self):
         if not self.current_carteira_data:
@@ -527,33 +691,61 @@ class InvestmentCarteiraApp:
             log_message("Erro ao gerar relatórios.")
 
     def update_all(self):
-        self.update_quotes()
-        self.generate_report()
-        messagebox.showinfo("Atualizar Tudo", "Processo de atualização e geração de relatórios concluído!")
-        log_message("Processo de atualização e geração de relatórios concluído.")
+        def generate():
+            self.generate_report()
+            messagebox.showinfo("Atualizar Tudo", "Processo de atualização e geração de relatórios concluído!")
+            log_message("Processo de atualização e geração de relatórios concluído.")
+
+        # O relatório usa a tabela recarregada, então só é gerado depois dela
+        self.update_quotes(on_updated=generate)
+
+    def _backup_progress_text(self, copied, total, bytes_per_second):
+        return f"{copied} de {total} páginas ({bytes_per_second / (1024 * 1024):.1f} MB/s)"
 
     def backup_db(self):
         backup_filename = f"investment_carteira_backup_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.db"
-        if self.db.backup_database(backup_filename):
-            messagebox.showinfo("Backup", f"Backup do banco de dados criado em: {backup_filename}")
-            log_message(f"Backup do banco de dados criado em: {backup_filename}")
-        else:
-            messagebox.showerror("Backup", "Erro ao criar backup do banco de dados.")
-            log_message("Erro ao criar backup do banco de dados.")
+
+        # Backup online em segundo plano: o aplicativo continua gravando durante a cópia
+        def task(report):
+            return self.db.backup_database(backup_filename, progress=lambda copied, total, speed: report(
+                copied / total if total else 1.0, self._backup_progress_text(copied, total, speed)))
+
+        def done(result):
+            if result:
+                messagebox.showinfo("Backup", f"Backup do banco de dados criado em: {backup_filename}")
+                log_message(f"Backup do banco de dados criado em: {backup_filename}")
+            else:
+                messagebox.showerror("Backup", "Erro ao criar backup do banco de dados.")
+                log_message("Erro ao criar backup do banco de dados.")
+
+        self._run_with_progress("Backup", "Iniciando backup...", task, done)
 
     def restore_db(self):
         backup_filename = filedialog.askopenfilename(
             title="Selecionar Arquivo de Backup",
             filetypes=[("Database files", "*.db"), ("All files", "*.*")])
-        if backup_filename:
-            if self.db.restore_database(backup_filename):
-                messagebox.showinfo("Restaurar", "Banco de dados restaurado com sucesso! Reinicie o aplicativo para ver as mudanças.")
-                log_message(f"Banco de dados restaurado de: {backup_filename}")
+        if not backup_filename:
+            return
+
+        def task(report):
+            if not self.db.restore_database(backup_filename, progress=lambda copied, total, speed: report(
+                    copied / total if total else 1.0, self._backup_progress_text(copied, total, speed))):
+                return False
+            # O arquivo colunar de preços é refeito a partir do banco restaurado
+            self.price_archive.rebuild()
+            return True
+
+        def done(result):
+            if result:
                 self.load_assets_from_db()
+                messagebox.showinfo("Restaurar", "Banco de dados restaurado com sucesso!")
+                log_message(f"Banco de dados restaurado de: {backup_filename}")
             else:
                 messagebox.showerror("Restaurar", "Erro ao restaurar o banco de dados.")
                 log_message(f"Erro ao restaurar o banco de dados de: {backup_filename}")
 
+        self._run_with_progress("Restaurar", "Restaurando backup...", task, done)
+
     def export_data(self):
         # Criar janela de seleção de tipo de exportação
         export_window = tk.Toplevel(self.root)
@@ -671,29 +863,74 @@ Este formato cria automaticamente os ativos e transações.
         """Exporta dados para arquivos CSV"""
         filename = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            filetypes=[("CSV files", "*.csv"), ("CSV compactado (gzip)", "*.csv.gz"), ("All files", "*.*")],
             title="Salvar Dados como CSV")
         if filename:
-            if self.db.export_data_to_csv(filename):
-                messagebox.showinfo("Exportar", "Dados exportados para CSV com sucesso!")
-                log_message(f"Dados exportados para CSV: {filename}")
-            else:
-                messagebox.showerror("Exportar", "Erro ao exportar dados para CSV.")
-                log_message("Erro ao exportar dados para CSV.")
+            self._run_export("CSV", self.db.export_data_to_csv, filename)
 
     def _export_json_files(self):
         """Exporta dados para arquivo JSON"""
         filename = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            filetypes=[("JSON files", "*.json"), ("JSON compactado (gzip)", "*.json.gz"), ("All files", "*.*")],
             title="Salvar Dados como JSON")
         if filename:
-            if self.db.export_data_to_json(filename):
-                messagebox.showinfo("Exportar", "Dados exportados para JSON com sucesso!")
-                log_message(f"Dados exportados para JSON: {filename}")
+            self._run_export("JSON", self.db.export_data_to_json, filename)
+
+    def _run_export(self, kind, export, filename):
+        """Roda a exportação em segundo plano, com uma janela de progresso"""
+        def task(report):
+            return export(filename, progress=lambda done, total, table: report(
+                done / total if total else 1.0, f"{table}: {done:,} de {total:,} linhas".replace(",", ".")))
+
+        def done(result):
+            if result:
+                messagebox.showinfo("Exportar", f"Dados exportados para {kind} com sucesso!")
+                log_message(f"Dados exportados para {kind}: {filename}")
             else:
-                messagebox.showerror("Exportar", "Erro ao exportar dados para JSON.")
-                log_message("Erro ao exportar dados para JSON.")
+                messagebox.showerror("Exportar", f"Erro ao exportar dados para {kind}.")
+                log_message(f"Erro ao exportar dados para {kind}.")
+
+        self._run_with_progress(f"Exportar {kind}", "Preparando exportação...", task, done)
+
+    def _run_with_progress(self, title, initial_text, task, on_done):
+        """Roda task(report) em segundo plano, com uma janela de progresso.
+
+        task chama report(fração concluída, texto) de qualquer thread; a janela
+        é atualizada pela interface a cada 100 ms. on_done(resultado) roda na
+        thread da interface ao final.
+        """
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.resizable(False, False)
+        window.transient(self.root)
+        label = ttk.Label(window, text=initial_text)
+        label.pack(padx=20, pady=(15, 5))
+        bar = ttk.Progressbar(window, length=320, mode="determinate", maximum=100)
+        bar.pack(padx=20, pady=(0, 15))
+
+        state = {"progress": None, "result": None}
+
+        def report(fraction, text):
+            state["progress"] = (fraction, text)
+
+        def run():
+            state["result"] = task(report)
+
+        def poll():
+            if state["progress"]:
+                fraction, text = state["progress"]
+                label.config(text=text)
+                bar["value"] = 100 * fraction
+            if worker.is_alive():
+                self.root.after(100, poll)
+                return
+            window.destroy()
+            on_done(state["result"])
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        poll()
 
     def import_data(self):
         # Criar janela de seleção de tipo de importação
@@ -907,67 +1144,75 @@ VALE3: 150 ações, preço médio R$ 65,30
             filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
 
         if assets_filename and transactions_filename and price_history_filename and dividends_filename:
-            if self.db.import_data_from_csv(assets_filename, transactions_filename, price_history_filename, dividends_filename):
-                # Adicionar ativos automaticamente à carteira
-                self._add_imported_assets_to_carteira()
-                
-                messagebox.showinfo("Importar", "Dados importados de CSV com sucesso! Ativos adicionados automaticamente à carteira.")
-                log_message(f"Dados importados de CSV: {assets_filename}, {transactions_filename}, {price_history_filename}, {dividends_filename}")
-                self.load_assets_from_db()
-            else:
-                messagebox.showerror("Importar", "Erro ao importar dados de CSV.")
-                log_message("Erro ao importar dados de CSV.")
+            filenames = (assets_filename, transactions_filename, price_history_filename, dividends_filename)
+            # Importação longa: roda à parte, para as consultas da interface não esperarem por ela
+            self.background.submit(self.db.import_data_from_csv, *filenames, callback=lambda report: self._csv_imported(report, filenames))
         else:
             messagebox.showwarning("Importar Dados", "Seleção de arquivos CSV cancelada ou incompleta.")
 
+    def _csv_imported(self, report, filenames):
+        if report:
+            # Adicionar ativos automaticamente à carteira
+            self._add_imported_assets_to_carteira()
+
+            messagebox.showinfo("Importar", "Dados importados de CSV com sucesso! Ativos adicionados automaticamente à carteira.\n\n" + report.summary())
+            log_message(f"Dados importados de CSV: {', '.join(filenames)}")
+            self.load_assets_from_db()
+        else:
+            messagebox.showerror("Importar", "Erro ao importar dados de CSV.")
+            log_message("Erro ao importar dados de CSV.")
+
     def _import_json_files(self):
         """Importa dados de arquivos JSON e adiciona automaticamente à carteira"""
         filename = filedialog.askopenfilename(
             title="Selecionar Arquivo JSON",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            filetypes=[("JSON files", "*.json"), ("JSON compactado (gzip)", "*.json.gz"), ("All files", "*.*")],
             multiple=True) # Permitir seleção de múltiplos arquivos JSON
         if filename:
-            success = True
-            error_details = ""
-            for f in filename:
-                try:
-                    if not self.db.import_data_from_json(f):
-                        success = False
-                        error_details = f"Erro ao importar arquivo: {f}"
-                        break
-                except Exception as e:
-                    success = False
-                    error_details = f"Erro ao importar arquivo {f}: {str(e)}"
-                    log_message(f"Erro detalhado na importação: {error_details}")
-                    import traceback
-                    traceback.print_exc()
-                    break
-            
-            if success:
-                try:
-                    # Adicionar ativos automaticamente à carteira
-                    self._add_imported_assets_to_carteira()
-                    
-                    messagebox.showinfo("Importar", "Dados importados de JSON com sucesso! Ativos adicionados automaticamente à carteira.")
-                    log_message(f"Dados importados de JSON: {filename}")
-                    self.load_assets_from_db()
-                except Exception as e:
-                    log_message(f"Erro ao processar ativos importados: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    messagebox.showerror("Importar", f"Erro ao processar ativos importados: {e}")
-            else:
-                messagebox.showerror("Importar", f"Erro ao importar dados de JSON.\n\nDetalhes: {error_details}")
-                log_message(f"Erro ao importar dados de JSON: {error_details}")
+            # Importação longa: roda à parte, para as consultas da interface não esperarem por ela
+            self.background.submit(self._import_json, filename, callback=lambda result: self._json_imported(filename, *result))
         else:
             messagebox.showwarning("Importar Dados", "Seleção de arquivo JSON cancelada.")
 
+    def _import_json(self, filenames):
+        """Importa os arquivos em ordem, em segundo plano. Retorna (sucesso, detalhes do erro)"""
+        for f in filenames:
+            try:
+                if not self.db.import_data_from_json(f):
+                    return False, f"Erro ao importar arquivo: {f}\nOs lotes já gravados são mantidos; importe o mesmo arquivo de novo para continuar."
+            except Exception as e:
+                error_details = f"Erro ao importar arquivo {f}: {str(e)}"
+                log_message(f"Erro detalhado na importação: {error_details}")
+                import traceback
+                traceback.print_exc()
+                return False, error_details
+        return True, ""
+
+    def _json_imported(self, filename, success, error_details):
+        if success:
+            try:
+                # Adicionar ativos automaticamente à carteira
+                self._add_imported_assets_to_carteira()
+
+                messagebox.showinfo("Importar", "Dados importados de JSON com sucesso! Ativos adicionados automaticamente à carteira.")
+                log_message(f"Dados importados de JSON: {filename}")
+                self.load_assets_from_db()
+            except Exception as e:
+                log_message(f"Erro ao processar ativos importados: {e}")
+                import traceback
+                traceback.print_exc()
+                messagebox.showerror("Importar", f"Erro ao processar ativos importados: {e}")
+        else:
+            messagebox.showerror("Importar", f"Erro ao importar dados de JSON.\n\nDetalhes: {error_details}")
+            log_message(f"Erro ao importar dados de JSON: {error_details}")
+
     def _add_imported_assets_to_carteira(self):
         """Adiciona automaticamente os ativos importados à carteira"""
+        # Obter todos os ativos com transações do banco, na thread do banco
+        self.async_db.get_all_assets_with_transactions(callback=self._add_imported_assets)
+
+    def _add_imported_assets(self, assets_with_transactions):
         try:
-            # Obter todos os ativos com transações do banco
-            assets_with_transactions = self.db.get_all_assets_with_transactions()
-            
             if not assets_with_transactions:
                 log_message("Nenhum ativo com transações encontrado para adicionar à carteira.")
                 return
@@ -1025,14 +1270,18 @@ VALE3: 150 ações, preço médio R$ 65,30
         asset_id = self.asset_details_map.get(asset_name)
 
         if asset_id:
-            price_history = self.db.get_price_history(asset_id)
-            if price_history:
-                self.plot_m.plot_price_history(asset_name, price_history)
-            else:
-                messagebox.showinfo("Histórico de Preços", f"Não há histórico de preços disponível para {asset_name}.")
+            # A leitura do arquivo pode sincronizá-lo com o banco: roda na thread do banco
+            self.async_db.submit(self.price_archive.get_series, asset_id,
+                                 callback=lambda series: self._show_price_series(asset_name, *series))
         else:
             messagebox.showerror("Erro", "Ativo não encontrado para exibir histórico.")
 
+    def _show_price_series(self, asset_name, dates, prices):
+        if len(dates):
+            self.plot_m.plot_price_series(asset_name, dates, prices)
+        else:
+            messagebox.showinfo("Histórico de Preços", f"Não há histórico de preços disponível para {asset_name}.")
+
     def perform_risk_analysis(self):
         selected_item = self.tree.selection()
         if not selected_item:
@@ -1047,24 +1296,32 @@ VALE3: 150 ações, preço médio R$ 65,30
             end_date = datetime.date.today().strftime("%Y-%m-%d")
             start_date = (datetime.date.today() - datetime.timedelta(days=365)).strftime("%Y-%m-%d") # Último ano
 
-            volatility = self.risk_analysis.calculate_volatility(asset_name, start_date, end_date)
-            if volatility is not None:
-                messagebox.showinfo("Análise de Risco", f"Volatilidade de {asset_name} (último ano): {volatility:.4f}")
-                log_message(f"Volatilidade de {asset_name}: {volatility:.4f}")
-            else:
-                messagebox.showinfo("Análise de Risco", f"Não foi possível calcular a volatilidade para {asset_name}. Verifique se há dados históricos suficientes.")
-
-            # Exemplo de cálculo de Beta com IBOV como benchmark
             benchmark_ticker = "^BVSP" # Ticker do Ibovespa
-            beta = self.risk_analysis.calculate_beta(asset_name, benchmark_ticker, start_date, end_date)
-            if beta is not None:
-                messagebox.showinfo("Análise de Risco", f"Beta de {asset_name} vs {benchmark_ticker} (último ano): {beta:.4f}")
-                log_message(f"Beta de {asset_name} vs {benchmark_ticker}: {beta:.4f}")
-            else:
-                messagebox.showinfo("Análise de Risco", f"Não foi possível calcular o Beta para {asset_name}. Verifique se há dados históricos suficientes para o ativo e o benchmark.")
+
+            # Os cálculos leem o banco e o arquivo de preços: rodam em segundo plano
+            def analyse():
+                volatility = self.risk_analysis.calculate_volatility(asset_name, start_date, end_date)
+                # Exemplo de cálculo de Beta com IBOV como benchmark
+                beta = self.risk_analysis.calculate_beta(asset_name, benchmark_ticker, start_date, end_date)
+                return volatility, beta
+
+            self.background.submit(analyse, callback=lambda results: self._show_risk_analysis(asset_name, benchmark_ticker, *results))
         else:
             messagebox.showerror("Erro", "Ativo não encontrado para realizar análise de risco.")
 
+    def _show_risk_analysis(self, asset_name, benchmark_ticker, volatility, beta):
+        if volatility is not None:
+            messagebox.showinfo("Análise de Risco", f"Volatilidade de {asset_name} (último ano): {volatility:.4f}")
+            log_message(f"Volatilidade de {asset_name}: {volatility:.4f}")
+        else:
+            messagebox.showinfo("Análise de Risco", f"Não foi possível calcular a volatilidade para {asset_name}. Verifique se há dados históricos suficientes.")
+
+        if beta is not None:
+            messagebox.showinfo("Análise de Risco", f"Beta de {asset_name} vs {benchmark_ticker} (último ano): {beta:.4f}")
+            log_message(f"Beta de {asset_name} vs {benchmark_ticker}: {beta:.4f}")
+        else:
+            messagebox.showinfo("Análise de Risco", f"Não foi possível calcular o Beta para {asset_name}. Verifique se há dados históricos suficientes para o ativo e o benchmark.")
+
     def compare_with_benchmark(self):
         selected_item = self.tree.selection()
         if not selected_item:
@@ -1080,19 +1337,28 @@ VALE3: 150 ações, preço médio R$ 65,30
                 end_date = datetime.date.today().strftime("%Y-%m-%d")
                 start_date = (datetime.date.today() - datetime.timedelta(days=365)).strftime("%Y-%m-%d") # Último ano
 
-                asset_price_history = self.db.get_price_history(asset_id, start_date, end_date)
-                benchmark_price_history = self.yf_integration.get_historical_prices(benchmark_ticker, start_date, end_date)
+                # O download do benchmark roda em segundo plano e só a leitura do arquivo de
+                # preços passa pela thread do banco, sem prender as demais consultas da interface
+                def benchmark_loaded(benchmark_price_history):
+                    self.async_db.submit(
+                        self.price_archive.get_price_series, asset_id, start_date, end_date,
+                        callback=lambda asset_price_history: self._show_benchmark_comparison(
+                            asset_name, benchmark_ticker, asset_price_history, benchmark_price_history))
 
-                if asset_price_history and benchmark_price_history:
-                    self.plot_m.plot_comparison_with_benchmark(asset_name, asset_price_history, benchmark_ticker, benchmark_price_history)
-                    log_message(f"Comparativo de {asset_name} com {benchmark_ticker} gerado.")
-                else:
-                    messagebox.showinfo("Comparar com Benchmark", f"Não foi possível obter dados históricos suficientes para {asset_name} ou {benchmark_ticker}.")
+                self.background.submit(self.benchmark_history.get_history, benchmark_ticker.strip().upper(), start_date, end_date,
+                                       callback=benchmark_loaded)
             else:
                 messagebox.showwarning("Comparar com Benchmark", "Nenhum ticker de benchmark fornecido.")
         else:
             messagebox.showerror("Erro", "Ativo não encontrado para realizar comparação com benchmark.")
 
+    def _show_benchmark_comparison(self, asset_name, benchmark_ticker, asset_price_history, benchmark_price_history):
+        if len(asset_price_history) and benchmark_price_history:
+            self.plot_m.plot_comparison_with_benchmark(asset_name, asset_price_history, benchmark_ticker, benchmark_price_history)
+            log_message(f"Comparativo de {asset_name} com {benchmark_ticker} gerado.")
+        else:
+            messagebox.showinfo("Comparar com Benchmark", f"Não foi possível obter dados históricos suficientes para {asset_name} ou {benchmark_ticker}.")
+
     def perform_projection_simulation(self):
         # Obter dados da carteira atual para a simulação
         assets_for_simulation = []
@@ -1120,12 +1386,10 @@ VALE3: 150 ações, preço médio R$ 65,30
             num_days = simpledialog.askinteger("Monte Carlo", "Número de dias futuros (ex: 252 para 1 ano):", parent=self.root, minvalue=30, maxvalue=1000)
 
             if num_simulations and num_days:
-                simulated_values = self.projection_simulation.monte_carlo_simulation(initial_carteira_value, assets_for_simulation, num_simulations, num_days, gui_parent=self.root)
-                if simulated_values is not None:
-                    self.projection_simulation.plot_monte_carlo_results(simulated_values, gui_parent=self.root)
-                    log_message(f"Simulação de Monte Carlo realizada com {num_simulations} simulações e {num_days} dias.")
-                else:
-                    messagebox.showerror("Monte Carlo", "Não foi possível realizar a simulação de Monte Carlo. Verifique os dados.", parent=self.root)
+                # A simulação lê o histórico e roda em segundo plano; o gráfico é feito na interface
+                self.background.submit(
+                    self.projection_simulation.monte_carlo_simulation, initial_carteira_value, assets_for_simulation, num_simulations, num_days,
+                    callback=lambda simulated_values: self._show_monte_carlo(simulated_values, num_simulations, num_days))
             else:
                 messagebox.showwarning("Monte Carlo", "Parâmetros de simulação inválidos ou cancelados.", parent=self.root)
 
@@ -1145,76 +1409,61 @@ VALE3: 150 ações, preço médio R$ 65,30
         else:
             messagebox.showwarning("Projeções e Simulações", "Tipo de projeção/simulação inválido ou cancelado.", parent=self.root)
 
+    def _show_monte_carlo(self, simulated_values, num_simulations, num_days):
+        if simulated_values is not None:
+            self.projection_simulation.plot_monte_carlo_results(simulated_values, gui_parent=self.root)
+            log_message(f"Simulação de Monte Carlo realizada com {num_simulations} simulações e {num_days} dias.")
+        else:
+            messagebox.showerror("Monte Carlo", "Não foi possível realizar a simulação de Monte Carlo. Verifique os dados.", parent=self.root)
+
     def manage_alerts(self):
-        AlertManagerWindow(self.root, self.db, self.yf_integration, self.load_assets_from_db)
+        AlertManagerWindow(self.root, self.async_db, self.price_provider, self.load_assets_from_db)
 
     def open_event_calendar(self):
-        EventCalendarWindow(self.root, self.db)
+        EventCalendarWindow(self.root, self.async_db)
 
     def schedule_background_update(self):
-        # Inicia a thread de atualização em segundo plano
-        self.background_update_thread = threading.Thread(target=self._background_update_task, daemon=True)
-        self.background_update_thread.start()
-
-    def _background_update_task(self):
-        while True:
-            try:
-                time.sleep(self.update_interval_minutes * 60) # Espera o tempo configurado
-                log_message("Iniciando atualização em segundo plano...")
-                self._check_and_update_data()
-                self._check_alerts()
-                log_message("Atualização em segundo plano concluída.")
-            except Exception as e:
-                log_message(f"Erro na thread de background: {e}")
-                time.sleep(60)  # Espera 1 minuto antes de tentar novamente
-
-    def _check_and_update_data(self):
-        # Esta função será chamada pela thread de segundo plano
-        # Ela deve atualizar os dados e a UI de forma segura
+        # Cada ticker é atualizado no seu prazo, conforme a prioridade
+        self.quote_scheduler = QuoteRefreshScheduler(self.price_provider)
+        self._update_refresh_priorities()
+        self._schedule_priority_update()
+
+        # Produtor do fluxo de cotações: simulado (offline) ou o próprio agendador
+        self.price_history_recorder = None
+        if os.environ.get("CARTEIRA_SIMULATED_TICKS"):
+            initial_prices = {ticker: row[4] for ticker, row in self.carteira_rows.items()}
+            self.tick_source = SimulatedTickSource(self.quote_stream, initial_prices)
+        else:
+            self.tick_source = ProviderTickSource(self.quote_scheduler, self.quote_stream)
+            # Só cotações reais vão para o histórico; os preços simulados não podem chegar ao banco
+            self.price_history_recorder = PriceHistoryRecorder(self.db, self.quote_stream)
+            self.price_history_recorder.start()
+        self.alert_engine = AlertEngine(self.db, self.quote_stream, on_alert=self._notify_alert)
+        self.alert_engine.start()
+        self.tick_source.start()
+        self._poll_quote_stream()
+
+    def _schedule_priority_update(self):
+        # A rolagem da tabela e os alertas mudam as prioridades; reavaliar periodicamente
+        self._update_refresh_priorities()
+        self.root.after(self.priority_update_seconds * 1000, self._schedule_priority_update)
+
+    def _poll_quote_stream(self):
+        # Aplica na tabela o último tick de cada ticker recebido desde a última verificação
         try:
-            self.root.after(0, self.load_assets_from_db) # Agenda a atualização da UI na thread principal
+            latest = drain_latest(self.tree_ticks)
+            updated = [ticker for ticker in latest if ticker in self.rows_by_ticker]
+            for ticker in updated:
+                self._show_price(ticker, latest[ticker].price)
+            if updated:
+                self._update_totals()
         except Exception as e:
             log_message(f"Erro ao atualizar dados em background: {e}")
+        self.root.after(self.stream_poll_ms, self._poll_quote_stream)
 
-    def _check_alerts(self):
-        # Esta função será chamada pela thread de segundo plano
-        # Verifica os alertas e notifica o usuário se necessário
-        try:
-            active_alerts = self.db.get_active_alerts()
-            for alert in active_alerts:
-                alert_id, asset_name, alert_type, target_value, percentage_change = alert
-                current_price = self.yf_integration.get_current_price(asset_name + ".SA")
-
-                if current_price is None:
-                    log_message(f"Não foi possível obter preço atual para {asset_name} para verificar alerta.")
-                    continue
-
-                if alert_type == "price_target":
-                    if current_price >= target_value:
-                        alert_message = f"ALERTA DE PREÇO: {asset_name} atingiu ou superou o preço alvo de R$ {target_value:.2f}! Preço atual: R$ {current_price:.2f}"
-                        self.root.after(0, lambda msg=alert_message: messagebox.showinfo("Alerta de Preço", msg))
-                        log_message(alert_message)
-                        self.db.deactivate_alert(alert_id) # Desativa o alerta após ser acionado
-                elif alert_type == "percentage_change":
-                    # Precisa do preço anterior para calcular a variação percentual
-                    # Por simplicidade, vamos usar o preço atual e o preço médio de compra como base para um alerta de variação inicial
-                    # Em uma implementação mais robusta, seria necessário armazenar o preço de referência para o alerta
-                    assets = self.db.get_all_assets_with_transactions()
-                    asset_info = next((a for a in assets if a[1] == asset_name), None)
-                    if asset_info:
-                        total_quantity = asset_info[3]
-                        total_invested_cost = asset_info[4]
-                        average_buy_price = total_invested_cost / total_quantity if total_quantity > 0 else 0.0
-
-                        if average_buy_price > 0:
-                            current_percentage_change = ((current_price - average_buy_price) / average_buy_price) * 100
-                            if abs(current_percentage_change) >= percentage_change:
-                                alert_message = f"ALERTA DE VARIAÇÃO: {asset_name} teve uma variação de {current_percentage_change:.2f}% (alvo: {percentage_change:.2f}%)! Preço atual: R$ {current_price:.2f}"
-                                self.root.after(0, lambda msg=alert_message: messagebox.showinfo("Alerta de Variação", msg))
-                                log_message(alert_message)
-                                self.db.deactivate_alert(alert_id) # Desativa o alerta após ser acionado
-        except Exception as e:
-            log_message(f"Erro ao verificar alertas: {e}")
+    def _notify_alert(self, title, alert_message):
+        # Chamado pela thread do motor de alertas
+        self.root.after(0, lambda: messagebox.showinfo(title, alert_message))
 
 
 if __name__ == "__main__":
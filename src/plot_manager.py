@@ -9,18 +9,15 @@ class PlotManager:
         pass
 
     def plot_price_history(self, asset_name, price_history_data):
-        # Parsing robusto das datas
+        # Datas do banco no formato canônico AAAA-MM-DD
         parsed = []
         for row in price_history_data:
             date_str = row[0]
             price = row[1]
             try:
-                date = datetime.strptime(date_str, "%d/%m/%Y")
+                date = datetime.strptime(date_str, "%Y-%m-%d")
             except ValueError:
-                try:
-                    date = datetime.strptime(date_str, "%Y-%m-%d")
-                except ValueError:
-                    continue
+                continue
             parsed.append((date, price))
 
         if not parsed:
@@ -34,8 +31,13 @@ class PlotManager:
         date_price_dict = OrderedDict()
         for date, price in parsed:
             date_price_dict[date] = price
-        dates = list(date_price_dict.keys())
-        prices = list(date_price_dict.values())
+        self.plot_price_series(asset_name, list(date_price_dict.keys()), list(date_price_dict.values()))
+
+    def plot_price_series(self, asset_name, dates, prices):
+        """Plota preços já ordenados por data (ex: arrays do arquivo colunar de preços)"""
+        if len(dates) == 0:
+            print(f"Não há dados de histórico de preços válidos para {asset_name}.")
+            return
 
         plt.figure(figsize=(10, 6))
         plt.plot(dates, prices, marker=".", linestyle="-", color="blue")
@@ -46,21 +48,24 @@ class PlotManager:
         plt.tight_layout()
         plt.show()
 
+    def _to_frame(self, price_history, name):
+        """DataFrame indexado por data a partir de [(data, preço), ...] ou de uma pd.Series já indexada"""
+        if isinstance(price_history, pd.Series):
+            return price_history.rename(name).to_frame()
+        df = pd.DataFrame(price_history, columns=["Date", "Price"])
+        df["Date"] = pd.to_datetime(df["Date"])
+        df.set_index("Date", inplace=True)
+        df.rename(columns={"Price": name}, inplace=True)
+        return df
+
     def plot_comparison_with_benchmark(self, asset_name, asset_price_history, benchmark_ticker, benchmark_price_history):
-        if not asset_price_history or not benchmark_price_history:
+        if len(asset_price_history) == 0 or len(benchmark_price_history) == 0:
             print("Dados insuficientes para plotar a comparação.")
             return
 
         # Converter para DataFrame para facilitar o manuseio
-        df_asset = pd.DataFrame(asset_price_history, columns=["Date", "Price"])
-        df_asset["Date"] = pd.to_datetime(df_asset["Date"])
-        df_asset.set_index("Date", inplace=True)
-        df_asset.rename(columns={"Price": asset_name}, inplace=True)
-
-        df_benchmark = pd.DataFrame(benchmark_price_history, columns=["Date", "Price"])
-        df_benchmark["Date"] = pd.to_datetime(df_benchmark["Date"])
-        df_benchmark.set_index("Date", inplace=True)
-        df_benchmark.rename(columns={"Price": benchmark_ticker}, inplace=True)
+        df_asset = self._to_frame(asset_price_history, asset_name)
+        df_benchmark = self._to_frame(benchmark_price_history, benchmark_ticker)
 
         # Combinar os DataFrames e normalizar para o ponto de partida (primeiro dia)
         combined_df = pd.concat([df_asset, df_benchmark], axis=1).dropna()
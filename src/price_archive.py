@@ -0,0 +1,212 @@
+import json
+import os
+import shutil
+import threading
+import time
+from itertools import groupby
+import numpy as np
+import pandas as pd
+from database_manager import normalize_date
+from logger import log_message
+
+# Intervalo mínimo entre duas sincronizações automáticas com o banco (segundos)
+DEFAULT_SYNC_SECONDS = 2.0
+MANIFEST_FILE = "manifesto.json"
+
+EMPTY_DATES = np.array([], dtype="datetime64[D]")
+EMPTY_PRICES = np.array([], dtype=np.float64)
+
+
+def default_archive_dir(db_name):
+    """Pasta do arquivo de preços ao lado do banco (carteira.db -> carteira_precos/)"""
+    return os.path.splitext(db_name)[0] + "_precos"
+
+
+def _parse_dates(values):
+    """Converte datas AAAA-MM-DD em datetime64[D]; datas inválidas viram NaT"""
+    return pd.to_datetime(pd.Series(values, dtype=object), format="%Y-%m-%d", errors="coerce").to_numpy().astype("datetime64[D]")
+
+
+class PriceArchive:
+    """Cópia colunar de price_history para as análises.
+
+    Os preços ficam em arrays NumPy (.npy) particionados por ativo e ano,
+    lidos por mapeamento de memória: get_series devolve (datas, preços) sem
+    passar por tuplas do SQLite, e get_matrix monta a matriz datas x ativos
+    da carteira. A sincronização é incremental pelo id de price_history
+    (marca d'água) e pela versão de price_history_updates (preços alterados
+    no lugar); se o total de linhas não bater (exclusões, restauração ou
+    importação com ids antigos), o arquivo é reconstruído do zero.
+    """
+
+    def __init__(self, db_manager, directory=None, sync_seconds=DEFAULT_SYNC_SECONDS):
+        self.db = db_manager
+        self.directory = directory or default_archive_dir(db_manager.db_name)
+        self.sync_seconds = sync_seconds
+        self.lock = threading.RLock()
+        self._maps = {}
+        self._last_sync = None
+        self._manifest = self._load_manifest()
+
+    def _empty_manifest(self):
+        return {"watermark": 0, "version": 0, "rows": 0, "partitions": {}}
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return self._empty_manifest()
+
+    def _save_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self._manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def _paths(self, asset_id, year):
+        folder = os.path.join(self.directory, str(asset_id))
+        return os.path.join(folder, f"{year}_datas.npy"), os.path.join(folder, f"{year}_precos.npy")
+
+    def _save_array(self, path, array):
+        # Grava em arquivo temporário e substitui, para um leitor nunca ver um arquivo pela metade
+        tmp = path[:-len(".npy")] + ".tmp.npy"
+        np.save(tmp, array)
+        os.replace(tmp, path)
+
+    def _write_partition(self, asset_id, year, dates, prices):
+        """Mescla as novas linhas na partição (ativo, ano); numa data repetida vale o preço novo"""
+        dates_path, prices_path = self._paths(asset_id, year)
+        self._maps.pop((asset_id, year), None)
+        if os.path.exists(dates_path):
+            dates = np.concatenate([np.load(dates_path), dates])
+            prices = np.concatenate([np.load(prices_path), prices])
+        order = np.argsort(dates, kind="stable")
+        dates, prices = dates[order], prices[order]
+        keep = np.append(dates[1:] != dates[:-1], True)
+        os.makedirs(os.path.dirname(dates_path), exist_ok=True)
+        self._save_array(dates_path, dates[keep])
+        self._save_array(prices_path, prices[keep])
+
+    def _append_rows(self, rows):
+        rows = sorted(rows, key=lambda row: (row[1], row[2]))
+        for (asset_id, year), group in groupby(rows, key=lambda row: (row[1], str(row[2])[:4])):
+            group = list(group)
+            dates = _parse_dates([row[2] for row in group])
+            valid = ~np.isnat(dates)
+            if not valid.any():
+                continue
+            prices = np.array([row[3] for row in group], dtype=np.float64)
+            self._write_partition(asset_id, year, dates[valid], prices[valid])
+            years = self._manifest["partitions"].setdefault(str(asset_id), [])
+            if year not in years:
+                years.append(year)
+                years.sort()
+
+    def sync(self):
+        """Grava no arquivo as linhas novas de price_history. Retorna quantas foram lidas do banco"""
+        with self.lock:
+            self._last_sync = time.monotonic()
+            total, rows, version, updated = self.db.get_price_history_changes(
+                self._manifest["watermark"], self._manifest.get("version", 0))
+            if total is None:
+                return 0
+            if total != self._manifest["rows"] + len(rows):
+                return self.rebuild()
+            if rows or updated:
+                os.makedirs(self.directory, exist_ok=True)
+                # Numa data já gravada, o preço alterado substitui o anterior
+                self._append_rows(rows + updated)
+                self._manifest["watermark"] = max((row[0] for row in rows), default=self._manifest["watermark"])
+                self._manifest["rows"] = total
+            if rows or updated or version != self._manifest.get("version", 0):
+                self._manifest["version"] = version
+                self._save_manifest()
+            return len(rows) + len(updated)
+
+    def rebuild(self):
+        """Apaga o arquivo e o recria a partir de todo o price_history"""
+        with self.lock:
+            self._maps.clear()
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self._manifest = self._empty_manifest()
+            self._last_sync = time.monotonic()
+            total, rows, version, _ = self.db.get_price_history_changes(0)
+            if total is None:
+                return 0
+            os.makedirs(self.directory, exist_ok=True)
+            self._append_rows(rows)
+            self._manifest["watermark"] = max((row[0] for row in rows), default=0)
+            self._manifest["version"] = version
+            self._manifest["rows"] = total
+            self._save_manifest()
+            log_message(f"Arquivo de preços reconstruído: {len(rows)} registros.")
+            return len(rows)
+
+    def _maybe_sync(self):
+        if self._last_sync is not None and time.monotonic() - self._last_sync < self.sync_seconds:
+            return
+        try:
+            self.sync()
+        except OSError as e:
+            # Sem sincronizar, as leituras usam o que já está no arquivo
+            log_message(f"Erro ao sincronizar o arquivo de preços: {e}")
+
+    def _partition(self, asset_id, year):
+        key = (asset_id, year)
+        if key not in self._maps:
+            dates_path, prices_path = self._paths(asset_id, year)
+            self._maps[key] = (np.load(dates_path, mmap_mode="r"), np.load(prices_path, mmap_mode="r"))
+        return self._maps[key]
+
+    def get_series(self, asset_id, start_date=None, end_date=None):
+        """(datas datetime64[D], preços float64) de um ativo, em ordem de data.
+
+        Quando o intervalo cabe em uma partição, os arrays são visões somente
+        leitura do arquivo mapeado, sem cópia.
+        """
+        with self.lock:
+            self._maybe_sync()
+        return self._read_series(asset_id, start_date, end_date)
+
+    def _read_series(self, asset_id, start_date=None, end_date=None):
+        start_date, end_date = normalize_date(start_date), normalize_date(end_date)
+        with self.lock:
+            years = [y for y in self._manifest["partitions"].get(str(asset_id), [])
+                     if (not start_date or y >= start_date[:4]) and (not end_date or y <= end_date[:4])]
+            parts = [self._partition(asset_id, year) for year in years]
+        if not parts:
+            return EMPTY_DATES, EMPTY_PRICES
+        if len(parts) == 1:
+            dates, prices = parts[0]
+        else:
+            dates = np.concatenate([p[0] for p in parts])
+            prices = np.concatenate([p[1] for p in parts])
+        lo = np.searchsorted(dates, np.datetime64(start_date[:10], "D"), "left") if start_date else 0
+        hi = np.searchsorted(dates, np.datetime64(end_date[:10], "D"), "right") if end_date else len(dates)
+        return dates[lo:hi], prices[lo:hi]
+
+    def get_price_series(self, asset_id, start_date=None, end_date=None):
+        """Preços de um ativo como pd.Series indexada por data"""
+        dates, prices = self.get_series(asset_id, start_date, end_date)
+        return pd.Series(prices, index=pd.DatetimeIndex(dates, name="Date"), name="Price")
+
+    def get_matrix(self, asset_ids, start_date=None, end_date=None):
+        """Matriz de preços da carteira: (datas, matriz len(datas) x len(asset_ids)).
+
+        As datas são a união das datas de todos os ativos; dias sem preço de
+        um ativo ficam como NaN. Todos os ativos são lidos após uma única
+        sincronização, sem que outra a intercale.
+        """
+        with self.lock:
+            self._maybe_sync()
+            series = [self._read_series(asset_id, start_date, end_date) for asset_id in asset_ids]
+        dates = np.unique(np.concatenate([s[0] for s in series])) if series else EMPTY_DATES
+        matrix = np.full((len(dates), len(series)), np.nan)
+        for column, (asset_dates, prices) in enumerate(series):
+            matrix[np.searchsorted(dates, asset_dates), column] = prices
+        return dates, matrix
+
+    def close(self):
+        with self.lock:
+            self._maps.clear()
@@ -0,0 +1,105 @@
+import datetime
+import threading
+from collections import defaultdict
+from logger import log_message
+
+# Tipos de ativo sem cotação automática no Yahoo Finance
+MANUAL_PRICE_TYPES = ("Tesouro", "Outro")
+
+
+def parse_record_date(date_str):
+    """Converte uma data do histórico (AAAA-MM-DD ou DD/MM/AAAA) em date"""
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.datetime.strptime(date_str, fmt).date()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class PriceBackfillService:
+    """Completa o histórico de preços de todos os ativos em segundo plano.
+
+    Para cada ativo, consulta a data mais recente já gravada em price_history
+    e baixa do provedor de cotações apenas o intervalo que falta, em lote para todos
+    os ativos de uma vez; com benchmark_store, atualiza também os benchmarks
+    acompanhados. Rodando periodicamente, mantém o histórico em dia para que
+    as análises não precisem acessar a rede.
+    """
+
+    def __init__(self, db_manager, price_provider, lookback_days=365, interval_hours=6, benchmark_store=None):
+        self.db = db_manager
+        self.price_provider = price_provider
+        self.benchmarks = benchmark_store
+        self.lookback_days = lookback_days
+        self.interval_hours = interval_hours
+        self._wake_event = threading.Event()
+        self._run_lock = threading.Lock()
+        self._thread = None
+
+    def backfill_all(self):
+        """Baixa os intervalos faltantes de todos os ativos. Retorna o número de registros inseridos"""
+        with self._run_lock:
+            today = datetime.date.today()
+            # A atualização de cotações grava o preço do dia; ignorá-lo para
+            # não esconder lacunas anteriores a hoje
+            last_dates = self.db.get_last_price_dates(before_date=today.strftime("%Y-%m-%d"))
+
+            # Os ativos com histórico são baixados juntos a partir da lacuna mais antiga
+            # entre eles, e os sem histórico juntos a partir do início da janela: uma
+            # requisição em lote por grupo. As datas já gravadas que vierem no intervalo
+            # comum são descartadas pelo INSERT OR IGNORE
+            missing = defaultdict(list)
+            for asset_id, name, asset_type in self.db.get_all_assets():
+                if asset_type in MANUAL_PRICE_TYPES:
+                    continue
+                last_date = parse_record_date(last_dates.get(asset_id))
+                if last_date:
+                    start_date = last_date + datetime.timedelta(days=1)
+                else:
+                    start_date = today - datetime.timedelta(days=self.lookback_days)
+                if start_date <= today:
+                    missing[last_date is not None].append((start_date, asset_id, name))
+            groups = [(min(start for start, _, _ in assets), [(asset_id, name) for _, asset_id, name in assets])
+                      for assets in missing.values()]
+
+            end_date = (today + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+            inserted_total = 0
+            ignored_total = 0
+            for start_date, group in groups:
+                history = self.price_provider.get_historical_prices_bulk(
+                    [name + ".SA" for _, name in group], start_date.strftime("%Y-%m-%d"), end_date)
+                # Uma única transação por grupo, em vez de um commit por registro
+                inserted, ignored = self.db.add_price_history_bulk(
+                    (asset_id, price, record_date)
+                    for asset_id, name in group
+                    for record_date, price in history.get(name + ".SA", []))
+                inserted_total += inserted
+                ignored_total += ignored
+
+            if inserted_total or ignored_total:
+                log_message(f"Backfill de histórico de preços: {inserted_total} registros inseridos, {ignored_total} já existentes.")
+            # Os benchmarks também são baixados aqui, e não durante as análises
+            if self.benchmarks is not None:
+                self.benchmarks.refresh_tracked()
+            return inserted_total
+
+    def request_backfill(self):
+        """Solicita uma execução antecipada do backfill agendado"""
+        self._wake_event.set()
+
+    def start(self):
+        """Inicia a thread que executa o backfill agora e depois a cada interval_hours"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.backfill_all()
+            except Exception as e:
+                log_message(f"Erro no backfill de histórico de preços: {e}")
+            self._wake_event.wait(self.interval_hours * 3600)
+            self._wake_event.clear()
@@ -0,0 +1,273 @@
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from quote_cache import QuoteCache
+from single_flight import SingleFlight
+from circuit_breaker import NegativeCache, CircuitBreaker
+
+# Quantidade máxima de tickers por requisição em lote
+BULK_CHUNK_SIZE = 100
+# Número de requisições simultâneas ao provedor
+DEFAULT_MAX_WORKERS = 8
+# Tempo limite (segundos) de cada requisição individual
+DEFAULT_REQUEST_TIMEOUT = 15
+# Resultado de _call_source para quem desiste de esperar uma consulta compartilhada
+NOT_ATTEMPTED = (False, None)
+
+
+class PriceProvider:
+    """Interface comum dos provedores de cotações usados pelo app.
+
+    Implementa o que independe da fonte de dados (cache de cotações, divisão
+    em lotes, consultas concorrentes e em fluxo, agrupamento de consultas
+    simultâneas ao mesmo ticker, supressão de tickers com falha e disjuntor
+    para quando a fonte está instável). As subclasses fornecem apenas as
+    consultas à fonte, nos métodos _fetch_*.
+    """
+
+    def __init__(self, chunk_size=BULK_CHUNK_SIZE, cache=None, max_workers=DEFAULT_MAX_WORKERS, request_timeout=DEFAULT_REQUEST_TIMEOUT,
+                 negative_cache=None, circuit_breaker=None):
+        self.chunk_size = chunk_size
+        self.cache = cache if cache is not None else QuoteCache()
+        self.negative_cache = negative_cache if negative_cache is not None else NegativeCache()
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self.max_workers = max_workers
+        self.request_timeout = request_timeout
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Consultas em andamento, compartilhadas entre threads que pedem o mesmo ticker
+        self._in_flight = SingleFlight()
+
+    # Consultas à fonte de dados, implementadas pelas subclasses
+
+    def _fetch_current_prices(self, tickers):
+        """Retorna {ticker: último preço} para um lote; tickers sem dados ficam de fora"""
+        raise NotImplementedError
+
+    def _fetch_current_price(self, ticker):
+        return self._fetch_current_prices([ticker]).get(ticker)
+
+    def _fetch_historical_prices(self, ticker, start_date=None, end_date=None):
+        """Retorna [(data "DD/MM/AAAA", preço de fechamento), ...] ou None"""
+        raise NotImplementedError
+
+    def _fetch_historical_prices_bulk(self, tickers, start_date=None, end_date=None):
+        """Retorna {ticker: [(data "AAAA-MM-DD", preço), ...]} para um lote"""
+        history = {}
+        for ticker in tickers:
+            prices = self._fetch_historical_prices(ticker, start_date, end_date)
+            if prices:
+                history[ticker] = [("-".join(reversed(date.split("/"))), price) for date, price in prices]
+        return history
+
+    def _call_source(self, fetch, empty_is_error=False):
+        """Faz uma requisição à fonte, se o disjuntor permitir.
+
+        Retorna (executada, resultado). Para o disjuntor, contam como erro as
+        requisições que falham e, com empty_is_error (lotes de vários tickers),
+        as que não trazem dado algum; um único ticker sem dados é assunto do
+        cache negativo, não da fonte.
+        """
+        if not self.circuit_breaker.allow_request():
+            return False, None
+        try:
+            result = fetch()
+        except Exception as e:
+            print(f"Erro ao consultar o provedor de cotações: {e}")
+            self.circuit_breaker.record(False)
+            return True, None
+        self.circuit_breaker.record(bool(result) or not empty_is_error)
+        return True, result
+
+    def _record_quote_results(self, tickers, prices):
+        """Atualiza o cache negativo com o resultado de uma consulta de cotações"""
+        for ticker in tickers:
+            if prices.get(ticker) is None:
+                self.negative_cache.record_failure(ticker)
+            else:
+                self.negative_cache.record_success(ticker)
+
+    # API pública
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="price-provider")
+            return self._executor
+
+    def fetch_concurrently(self, fetch_func, items):
+        """Executa fetch_func(item) para cada item no pool de threads limitado.
+
+        É um gerador: produz tuplas (item, resultado) à medida que cada
+        requisição termina, sem esperar pela mais lenta. Itens que não
+        concluírem dentro do tempo limite são produzidos com resultado None.
+        """
+        items = list(dict.fromkeys(items))
+        if not items:
+            return
+        executor = self._get_executor()
+        futures = {executor.submit(fetch_func, item): item for item in items}
+        # As requisições rodam em "ondas" de max_workers; cada uma tem request_timeout
+        waves = math.ceil(len(items) / self.max_workers)
+        deadline = self.request_timeout * waves + self.request_timeout
+        pending = set(futures)
+        try:
+            for future in as_completed(futures, timeout=deadline):
+                pending.discard(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Erro na consulta concorrente de {futures[future]}: {e}")
+                    result = None
+                yield futures[future], result
+        except FuturesTimeoutError:
+            for future in pending:
+                future.cancel()
+                print(f"Tempo limite excedido ao consultar {futures[future]}")
+                yield futures[future], None
+
+    def get_current_price(self, ticker, asset_type=None):
+        cached_price = self.cache.get(ticker, asset_type)
+        if cached_price is not None:
+            return cached_price
+        if self.negative_cache.is_suppressed(ticker):
+            return None
+        _, price = self._in_flight.do(("quote", ticker), lambda: self._fetch_quote(ticker), self.request_timeout * 2, NOT_ATTEMPTED)
+        if price is not None:
+            self.cache.put(ticker, price, asset_type)
+        return price
+
+    def _fetch_quote(self, ticker):
+        # Roda só na thread líder da consulta: quem aguarda por ela não registra o resultado de novo
+        attempted, price = self._call_source(lambda: self._fetch_current_price(ticker))
+        if attempted:
+            self._record_quote_results([ticker], {ticker: price})
+        return attempted, price
+
+    def get_current_prices(self, tickers, asset_types=None):
+        """Busca o preço atual de vários tickers em requisições em lote.
+
+        Tickers com cotação válida no cache não são consultados. asset_types é
+        um dicionário opcional {ticker: tipo do ativo} usado para escolher o TTL.
+        Retorna um dicionário {ticker: preço}; tickers sem dados ficam com None.
+        """
+        return dict(self.iter_current_prices(tickers, asset_types))
+
+    def iter_current_prices(self, tickers, asset_types=None):
+        """Versão em fluxo de get_current_prices.
+
+        Produz tuplas (ticker, preço) conforme ficam disponíveis: primeiro as
+        cotações em cache e os tickers suprimidos (com None), depois os tickers
+        de cada lote assim que ele termina.
+        """
+        unique_tickers = list(dict.fromkeys(tickers))
+        cached, missing = self.cache.get_many(unique_tickers, asset_types)
+        for ticker in unique_tickers:
+            if ticker in cached:
+                yield ticker, cached[ticker]
+
+        # Tickers que falharam recentemente não são consultados até o fim do recuo
+        suppressed = {ticker for ticker in missing if self.negative_cache.is_suppressed(ticker)}
+        for ticker in missing:
+            if ticker in suppressed:
+                yield ticker, None
+        missing = [ticker for ticker in missing if ticker not in suppressed]
+
+        chunks = [tuple(missing[start:start + self.chunk_size]) for start in range(0, len(missing), self.chunk_size)]
+        if len(chunks) == 1:
+            yield from self._quote_chunk(chunks[0], asset_types)
+            return
+        # Vários lotes são consultados em paralelo; cada um é entregue assim que termina
+        for chunk, quotes in self.fetch_concurrently(lambda chunk: self._quote_chunk(chunk, asset_types), chunks):
+            yield from quotes if quotes is not None else [(ticker, None) for ticker in chunk]
+
+    def _quote_chunk(self, chunk, asset_types=None):
+        """Consulta um lote de tickers. Retorna uma lista de tuplas (ticker, preço)"""
+        # Tickers que outra thread já está consultando não entram no lote:
+        # aguarda-se o resultado dela em vez de repetir a requisição
+        calls = {ticker: self._in_flight.begin(("quote", ticker)) for ticker in chunk}
+        own_tickers = [ticker for ticker in chunk if calls[ticker][1]]
+        fetched = {}
+        attempted = False
+        error = None
+        try:
+            if own_tickers:
+                attempted, result = self._call_source(lambda: self._fetch_current_prices(own_tickers), len(own_tickers) > 1)
+                fetched = result or {}
+                # Um lote sem nenhum preço é falha da fonte, não dos tickers: conta só
+                # para o disjuntor (em _call_source), sem suprimir a carteira inteira
+                if attempted and fetched:
+                    self._record_quote_results(own_tickers, fetched)
+                self.cache.put_many(fetched, asset_types)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            for ticker in own_tickers:
+                # Mesmo formato (executada, preço) de get_current_price, que usa a mesma chave
+                self._in_flight.finish(("quote", ticker), calls[ticker][0], (attempted, fetched.get(ticker)), error)
+
+        quotes = []
+        for ticker in chunk:
+            call, is_leader = calls[ticker]
+            if is_leader:
+                quotes.append((ticker, fetched.get(ticker)))
+            else:
+                try:
+                    _, price = self._in_flight.wait(call, self.request_timeout * 2, NOT_ATTEMPTED)
+                    quotes.append((ticker, price))
+                except Exception as e:
+                    print(f"Erro na consulta compartilhada de {ticker}: {e}")
+                    quotes.append((ticker, None))
+        return quotes
+
+    def invalidate_quotes(self, tickers=None):
+        """Descarta cotações em cache (todas, se tickers for None)"""
+        self.cache.invalidate(tickers)
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def coalescing_stats(self):
+        """Consultas executadas e consultas atendidas por uma consulta já em andamento"""
+        return self._in_flight.stats()
+
+    def suppressed_tickers(self):
+        """Tickers suprimidos no momento: {ticker: (falhas seguidas, segundos restantes)}"""
+        return self.negative_cache.suppressed()
+
+    def circuit_status(self):
+        return self.circuit_breaker.status()
+
+    def get_historical_prices(self, ticker, start_date=None, end_date=None):
+        """Retorna uma lista de tuplas (data "DD/MM/AAAA", preço de fechamento) ou None"""
+        _, history = self._in_flight.do(
+            ("history", ticker, start_date, end_date),
+            lambda: self._call_source(lambda: self._fetch_historical_prices(ticker, start_date, end_date)),
+            self.request_timeout * 2, NOT_ATTEMPTED)
+        return history
+
+    def get_historical_prices_bulk(self, tickers, start_date=None, end_date=None):
+        """Busca o histórico de fechamento de vários tickers em requisições em lote.
+
+        Retorna {ticker: [(data "AAAA-MM-DD", preço), ...]}; tickers sem dados
+        ficam fora do dicionário.
+        """
+        unique_tickers = [ticker for ticker in dict.fromkeys(tickers) if not self.negative_cache.is_suppressed(ticker)]
+        history = {}
+        for start in range(0, len(unique_tickers), self.chunk_size):
+            chunk = unique_tickers[start:start + self.chunk_size]
+            _, chunk_history = self._in_flight.do(
+                ("history_bulk", tuple(chunk), start_date, end_date),
+                lambda: self._call_source(lambda: self._fetch_historical_prices_bulk(chunk, start_date, end_date), len(chunk) > 1),
+                self.request_timeout * 2, NOT_ATTEMPTED)
+            history.update(chunk_history or {})
+        return history
+
+    def iter_historical_prices(self, tickers, start_date=None, end_date=None):
+        """Busca o histórico de vários tickers em paralelo.
+
+        Produz tuplas (ticker, histórico) à medida que cada consulta termina.
+        """
+        return self.fetch_concurrently(
+            lambda ticker: self.get_historical_prices(ticker, start_date, end_date), tickers)
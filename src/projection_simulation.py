@@ -12,9 +12,10 @@ MSG_DADOS_INSUFICIENTES = (
 MSG_BUSCA_API = "Tentando buscar dados históricos de 1 ano atrás automaticamente via API (Yahoo Finance)..."
 
 class ProjectionSimulation:
-    def __init__(self, db_manager, yf_integration):
+    def __init__(self, db_manager, price_provider, price_archive=None):
         self.db = db_manager
-        self.yf = yf_integration
+        self.price_provider = price_provider
+        self.price_archive = price_archive
 
     def _show_warning(self, msg, gui_parent=None):
         print(msg)
@@ -24,13 +25,29 @@ class ProjectionSimulation:
             except Exception:
                 pass
 
+    def _archive_daily_returns(self, assets_data, start_date=None, end_date=None):
+        """Soma dos retornos diários dos ativos, a partir da matriz de preços do arquivo colunar"""
+        asset_ids = [asset_id for asset_id, name, quantity in assets_data]
+        dates, matrix = self.price_archive.get_matrix(asset_ids, start_date, end_date)
+        prices = pd.DataFrame(matrix, index=pd.DatetimeIndex(dates, name="Date"), columns=asset_ids)
+        # Retorno de cada ativo entre os seus próprios dias com preço, como no cálculo pelo banco
+        returns = prices.apply(lambda column: column.dropna().pct_change())
+        return returns.sum(axis=1, min_count=1)
+
     def get_carteira_daily_returns(self, assets_data, start_date=None, end_date=None, gui_parent=None):
         carteira_returns = pd.Series(dtype=float)
-        for asset_id, name, quantity in assets_data:
-            price_history = self.db.get_price_history(asset_id, start_date, end_date)
+        if self.price_archive is not None:
+            carteira_returns = self._archive_daily_returns(assets_data, start_date, end_date)
+            if len(carteira_returns.dropna()) >= 2:
+                return carteira_returns.dropna()
+            carteira_returns = pd.Series(dtype=float)
+        # Todos os ativos lidos do mesmo retrato do banco, mesmo com a atualização gravando preços
+        with self.db.snapshot():
+            price_histories = [self.db.get_price_history(asset_id, start_date, end_date) for asset_id, name, quantity in assets_data]
+        for price_history in price_histories:
             if price_history and len(price_history) > 1:
                 df = pd.DataFrame(price_history, columns=["Date", "Price"])
-                df["Date"] = pd.to_datetime(df["Date"], dayfirst=True, errors="coerce")
+                df["Date"] = pd.to_datetime(df["Date"], format="%Y-%m-%d", errors="coerce")
                 df = df.dropna(subset=["Date"])
                 df.set_index("Date", inplace=True)
                 df["Daily_Return"] = df["Price"].pct_change()
@@ -0,0 +1,182 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from data_export import prefixed_path
+from database_manager import DatabaseManager
+
+# Métodos cuja leitura de uma tabela inteira é esperada (exportações, listagens completas)
+EXPECTED_FULL_SCANS = {
+    "get_all_assets": {"assets"},
+    "get_all_assets_with_transactions": {"a"},
+    "get_last_price_dates": {"price_history"},
+    "get_all_price_history": {"a"},
+    # A contagem total detecta exclusões no histórico
+    "get_price_history_changes": {"price_history"},
+    # O índice parcial idx_alerts_active contém apenas os alertas ativos
+    "get_active_alerts": {"al"},
+    "export_data_to_json": {"assets", "transactions", "price_history", "dividends", "alerts", "events"},
+    "export_data_to_csv": {"assets", "transactions", "price_history", "dividends", "alerts", "events"},
+    # Percorre só a lista de ids recebida; as tabelas são lidas pelos índices
+    "delete_assets": {"json_each"},
+    # Gravações em lote conferem os ativos do lote pela lista de ids
+    "add_price_history_bulk": {"json_each"},
+    "upsert_price_history_bulk": {"json_each"},
+    "add_transactions_bulk": {"json_each"},
+    "add_dividends_bulk": {"json_each"},
+    "import_data_from_json": {"json_each"},
+    # Conferência e reconstrução comparam todas as posições com todas as transações
+    "verify_positions": {"positions", "transactions"},
+    "rebuild_positions": {"positions", "transactions"},
+    # A tabela de preparação guarda um bloco do CSV por vez e é lida inteira em cada etapa
+    "import_data_from_csv": {"s"} | {f"temp.staging_{table}" for table in
+                                     ("assets", "transactions", "price_history", "dividends", "alerts", "events")},
+}
+
+# Catálogo do SQLite, lido inteiro para fixar o retrato de leitura (snapshot)
+CATALOG_TABLES = ("sqlite_master", "sqlite_schema")
+
+# Comandos que não passam pelo planejador de consultas
+IGNORED_PREFIXES = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE", "PRAGMA", "CREATE", "ANALYZE")
+
+
+def _exercise(db, workdir):
+    """Chamadas do DatabaseManager, com argumentos representativos, que o auditor rastreia.
+
+    Cobre as gravações (inclusive os upserts), as leituras, a conferência
+    e a reconstrução das posições, a exportação e a importação de CSV e de
+    JSON e a exclusão de ativos. Retorna a sequência de chamadas (nome do
+    método, função); o estado entre elas fica em sample.
+    """
+    sample = {}
+    csv_name = os.path.join(workdir, "audit.csv")
+    json_name = os.path.join(workdir, "audit.json")
+
+    def add_asset():
+        sample["asset_id"] = db.add_asset("AUDIT3", "Ação")
+
+    def csv_files():
+        return {f"{table}_filename": prefixed_path(table, csv_name)
+                for table in ("assets", "transactions", "price_history", "dividends", "alerts", "events")}
+
+    asset_id = lambda: sample["asset_id"]
+    return [
+        ("add_asset", add_asset),
+        ("add_transaction", lambda: db.add_transaction(asset_id(), "compra", 10, 10.0, "2024-01-02")),
+        ("add_price_history", lambda: db.add_price_history(asset_id(), 10.0, "2024-01-02")),
+        ("add_price_history_bulk", lambda: db.add_price_history_bulk([(asset_id(), 10.5, "2024-01-03")])),
+        ("upsert_price_history_bulk", lambda: db.upsert_price_history_bulk([(asset_id(), 10.6, "2024-01-03"), (asset_id(), 10.7, "2024-01-04")])),
+        ("add_transactions_bulk", lambda: db.add_transactions_bulk([(asset_id(), "compra", 5, 10.5, "2024-01-03")])),
+        ("add_dividends_bulk", lambda: db.add_dividends_bulk([(asset_id(), 0.1, "2024-01-04")])),
+        ("add_dividend", lambda: db.add_dividend(asset_id(), 0.1, "2024-01-05")),
+        ("add_alert", lambda: sample.update(alert_id=db.add_alert(asset_id(), "price_target", target_value=12.0))),
+        ("add_event", lambda: db.add_event("2024-01-10", "dividendo", "Auditoria", asset_id())),
+        ("add_benchmark_history", lambda: db.add_benchmark_history("^AUDIT", [("2024-01-02", 100.0)])),
+        ("get_asset_by_name", lambda: db.get_asset_by_name("AUDIT3")),
+        ("get_asset_by_id", lambda: db.get_asset_by_id(asset_id())),
+        ("get_all_assets", db.get_all_assets),
+        ("get_all_assets_with_transactions", db.get_all_assets_with_transactions),
+        ("verify_positions", db.verify_positions),
+        ("rebuild_positions", db.rebuild_positions),
+        ("get_asset_transactions", lambda: db.get_asset_transactions(asset_id())),
+        ("get_price_history", lambda: db.get_price_history(asset_id(), "2024-01-01", "2024-12-31")),
+        ("get_last_price_dates", lambda: db.get_last_price_dates(before_date="2024-12-31")),
+        ("get_all_price_history", db.get_all_price_history),
+        ("get_price_history_changes", lambda: db.get_price_history_changes(0, -1)),
+        ("get_asset_dividends", lambda: db.get_asset_dividends(asset_id())),
+        ("get_active_alerts", db.get_active_alerts),
+        ("deactivate_alert", lambda: db.deactivate_alert(sample["alert_id"])),
+        ("get_events", lambda: db.get_events("2024-01-01", "2024-01-31")),
+        ("get_benchmark_history", lambda: db.get_benchmark_history("^AUDIT", "2024-01-01", "2024-12-31")),
+        ("get_benchmark_date_range", lambda: db.get_benchmark_date_range("^AUDIT")),
+        ("export_data_to_csv", lambda: db.export_data_to_csv(csv_name)),
+        ("export_data_to_json", lambda: db.export_data_to_json(json_name)),
+        # Reimportar o que acabou de ser exportado passa pelas verificações de conflito e pelos merges
+        ("import_data_from_csv", lambda: db.import_data_from_csv(**csv_files())),
+        ("import_data_from_json", lambda: db.import_data_from_json(json_name)),
+        ("delete_assets", lambda: db.delete_assets([asset_id()])),
+    ]
+
+
+def _scan_table(detail):
+    """Tabela (ou apelido) lida por inteiro em uma linha do plano, ou None"""
+    if not detail.startswith("SCAN "):
+        return None
+    table = detail.split()[1]
+    return None if table in CATALOG_TABLES else table
+
+
+def audit_queries(db_name=None):
+    """Roda EXPLAIN QUERY PLAN em todas as consultas do DatabaseManager.
+
+    A auditoria é feita em uma cópia do banco db_name (ou em um banco novo,
+    se db_name for None), com o esquema e as migrações atuais. Retorna uma
+    lista de (método, sql, detalhe do plano, esperado) para cada varredura
+    completa de tabela encontrada.
+    """
+    workdir = tempfile.mkdtemp(prefix="auditoria_consultas_")
+    audit_db = os.path.join(workdir, "auditoria.db")
+    try:
+        if db_name and os.path.exists(db_name):
+            source = sqlite3.connect(db_name)
+            target = sqlite3.connect(audit_db)
+            source.backup(target)
+            source.close()
+            target.close()
+        db = DatabaseManager(audit_db)
+        calls = _exercise(db, workdir)
+
+        executed = []
+        current = {"method": None}
+        db.pool.set_trace_callback(lambda sql: executed.append((current["method"], sql)))
+        for method, call in calls:
+            current["method"] = method
+            call()
+        db.pool.set_trace_callback(None)
+
+        findings = []
+        seen = set()
+        with db.pool.writer() as conn:
+            for method, sql in executed:
+                statement = " ".join(sql.split())
+                if statement.upper().startswith("CREATE TEMP"):
+                    # As tabelas temporárias (preparação da importação de CSV) já foram
+                    # apagadas; são recriadas para os comandos que as usam terem plano
+                    try:
+                        conn.execute(statement)
+                    except sqlite3.Error:
+                        pass
+                    continue
+                if statement.upper().startswith(IGNORED_PREFIXES) or (method, statement) in seen:
+                    continue
+                seen.add((method, statement))
+                try:
+                    plan = conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+                except sqlite3.Error:
+                    continue
+                for row in plan:
+                    table = _scan_table(row[3])
+                    if table:
+                        expected = table in EXPECTED_FULL_SCANS.get(method, set())
+                        findings.append((method, statement, row[3], expected))
+            conn.rollback()
+        db.close()
+        return findings
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(findings):
+    unexpected = [f for f in findings if not f[3]]
+    for method, statement, detail, expected in findings:
+        status = "esperado" if expected else "VARREDURA COMPLETA"
+        print(f"[{status}] {method}: {detail}\n    {statement[:160]}")
+    print(f"{len(findings)} varreduras encontradas, {len(unexpected)} inesperadas.")
+    return not unexpected
+
+
+if __name__ == "__main__":
+    # Uso: python query_plan_audit.py [banco.db]
+    ok = print_report(audit_queries(sys.argv[1] if len(sys.argv) > 1 else "investment_carteira.db"))
+    sys.exit(0 if ok else 1)
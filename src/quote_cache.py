@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Tempo de validade (em segundos) das cotações por classe de ativo
+DEFAULT_TTLS = {
+    "Ação": 5 * 60,
+    "FII": 15 * 60,
+    "ETF": 5 * 60,
+    "Índice": 5 * 60,
+    "Tesouro": 24 * 60 * 60,
+    "Outro": 60 * 60,
+}
+DEFAULT_TTL = 5 * 60
+# Nome do cache persistente quando não há um banco do app para ficar ao lado
+DEFAULT_CACHE_NAME = "quote_cache.db"
+
+
+def default_cache_path(db_name):
+    """Cache de cotações ao lado do banco (carteira.db -> carteira_cotacoes.db)"""
+    return os.path.splitext(db_name)[0] + "_cotacoes.db"
+
+
+def user_cache_path():
+    """Cache de cotações na pasta de cache do usuário (XDG_CACHE_HOME ou ~/.cache)"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "carteira", DEFAULT_CACHE_NAME)
+
+
+def classify_ticker(ticker):
+    """Deduz a classe de um ticker quando o tipo do ativo não é informado"""
+    if ticker.startswith("^"):
+        return "Índice"
+    base = ticker.split(".")[0]
+    # FIIs (e ETFs) da B3 terminam em 11
+    if base.endswith("11"):
+        return "FII"
+    return "Ação"
+
+
+class QuoteCache:
+    """Cache de cotações em dois níveis: LRU em memória e tabela SQLite persistente.
+
+    Cada cotação expira conforme o TTL da classe do ativo. O nível persistente
+    sobrevive a reinicializações do app, de modo que a primeira atualização
+    após abrir o programa não precisa consultar o Yahoo Finance.
+    """
+
+    def __init__(self, db_name=None, max_entries=1024, ttls=None):
+        # Sem db_name, o cache vai para a pasta de cache do usuário, e não para a pasta atual
+        self.db_name = db_name or user_cache_path()
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.lock = threading.Lock()
+        self._memory = OrderedDict()  # ticker -> (preço, timestamp, classe)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.conn = None
+        try:
+            if self.db_name != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_name)), exist_ok=True)
+            self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS quote_cache (
+                    ticker TEXT PRIMARY KEY,
+                    price REAL NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    asset_class TEXT NOT NULL
+                )
+            """)
+            self.conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Erro ao abrir cache persistente de cotações: {e}")
+            self.conn = None
+
+    def ttl_for(self, asset_class):
+        return self.ttls.get(asset_class, DEFAULT_TTL)
+
+    def _is_fresh(self, fetched_at, asset_class, now):
+        return now - fetched_at < self.ttl_for(asset_class)
+
+    def _remember(self, ticker, price, fetched_at, asset_class):
+        self._memory[ticker] = (price, fetched_at, asset_class)
+        self._memory.move_to_end(ticker)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, ticker, asset_class=None):
+        """Retorna o preço em cache ainda válido, ou None"""
+        found, _ = self.get_many([ticker], {ticker: asset_class} if asset_class else None)
+        return found.get(ticker)
+
+    def get_many(self, tickers, asset_classes=None):
+        """Consulta vários tickers de uma vez.
+
+        Retorna uma tupla (encontrados, faltantes), onde encontrados é um
+        dicionário {ticker: preço} e faltantes a lista dos tickers a buscar.
+        """
+        asset_classes = asset_classes or {}
+        now = time.time()
+        found = {}
+        pending = []
+        with self.lock:
+            for ticker in tickers:
+                asset_class = asset_classes.get(ticker) or classify_ticker(ticker)
+                entry = self._memory.get(ticker)
+                if entry and self._is_fresh(entry[1], asset_class, now):
+                    self._memory.move_to_end(ticker)
+                    found[ticker] = entry[0]
+                    self.memory_hits += 1
+                else:
+                    pending.append(ticker)
+
+            missing = []
+            for ticker, row in zip(pending, self._load_from_disk(pending)):
+                asset_class = asset_classes.get(ticker) or classify_ticker(ticker)
+                if row and self._is_fresh(row[1], asset_class, now):
+                    self._remember(ticker, row[0], row[1], asset_class)
+                    found[ticker] = row[0]
+                    self.disk_hits += 1
+                else:
+                    missing.append(ticker)
+                    self.misses += 1
+        return found, missing
+
+    def _load_from_disk(self, tickers):
+        """Lê do nível persistente, na mesma ordem de tickers (None quando ausente)"""
+        if not self.conn or not tickers:
+            return [None] * len(tickers)
+        rows = {}
+        try:
+            # Consultas em blocos para respeitar o limite de parâmetros do SQLite
+            for start in range(0, len(tickers), 500):
+                chunk = tickers[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                cursor = self.conn.execute(
+                    f"SELECT ticker, price, fetched_at FROM quote_cache WHERE ticker IN ({placeholders})", chunk)
+                for ticker, price, fetched_at in cursor.fetchall():
+                    rows[ticker] = (price, fetched_at)
+        except sqlite3.Error as e:
+            print(f"Erro ao ler cache persistente de cotações: {e}")
+        return [rows.get(ticker) for ticker in tickers]
+
+    def put(self, ticker, price, asset_class=None):
+        self.put_many({ticker: price}, {ticker: asset_class} if asset_class else None)
+
+    def put_many(self, prices, asset_classes=None):
+        """Armazena as cotações nos dois níveis (valores None são ignorados)"""
+        asset_classes = asset_classes or {}
+        now = time.time()
+        rows = []
+        with self.lock:
+            for ticker, price in prices.items():
+                if price is None:
+                    continue
+                asset_class = asset_classes.get(ticker) or classify_ticker(ticker)
+                self._remember(ticker, price, now, asset_class)
+                rows.append((ticker, price, now, asset_class))
+            if self.conn and rows:
+                try:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO quote_cache (ticker, price, fetched_at, asset_class) VALUES (?, ?, ?, ?)",
+                        rows)
+                    self.conn.commit()
+                except sqlite3.Error as e:
+                    print(f"Erro ao gravar cache persistente de cotações: {e}")
+
+    def invalidate(self, tickers=None):
+        """Remove do cache os tickers informados, ou todas as cotações se None"""
+        with self.lock:
+            if tickers is not None:
+                tickers = list(tickers)
+                for ticker in tickers:
+                    self._memory.pop(ticker, None)
+            else:
+                self._memory.clear()
+            if self.conn:
+                try:
+                    if tickers is None:
+                        self.conn.execute("DELETE FROM quote_cache")
+                    else:
+                        self.conn.executemany("DELETE FROM quote_cache WHERE ticker = ?", [(t,) for t in tickers])
+                    self.conn.commit()
+                except sqlite3.Error as e:
+                    print(f"Erro ao invalidar cache persistente de cotações: {e}")
+
+    def stats(self):
+        """Contadores de acertos e falhas, para dimensionar o cache"""
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
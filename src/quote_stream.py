@@ -0,0 +1,191 @@
+import datetime
+import queue
+import random
+import threading
+import time
+from collections import namedtuple
+
+# Tamanho máximo da fila de cada consumidor; acima disso os ticks mais antigos são descartados
+DEFAULT_QUEUE_SIZE = 10000
+
+QuoteTick = namedtuple("QuoteTick", ["ticker", "price", "timestamp"])
+
+
+class QuoteStream:
+    """Barramento de cotações em processo.
+
+    Produtores publicam ticks (ticker, preço, horário) e cada consumidor
+    inscrito recebe todos eles na sua própria fila. Um consumidor lento não
+    atrasa os outros: quando a fila dele enche, o tick mais antigo é
+    descartado.
+    """
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self._subscribers = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, name):
+        with self.lock:
+            subscriber = self._subscribers.get(name)
+            if subscriber is None:
+                subscriber = queue.Queue(maxsize=self.queue_size)
+                self._subscribers[name] = subscriber
+            return subscriber
+
+    def unsubscribe(self, name):
+        with self.lock:
+            self._subscribers.pop(name, None)
+
+    def publish(self, ticker, price, timestamp=None):
+        tick = QuoteTick(ticker, price, timestamp if timestamp is not None else time.time())
+        with self.lock:
+            subscribers = list(self._subscribers.values())
+            self.published += 1
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(tick)
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                        with self.lock:
+                            self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def publish_prices(self, prices):
+        """Publica {ticker: preço}; tickers sem preço são ignorados"""
+        now = time.time()
+        for ticker, price in prices.items():
+            if price is not None:
+                self.publish(ticker, price, now)
+
+
+def drain_latest(subscriber, timeout=None):
+    """Esvazia a fila de um consumidor e retorna o tick mais recente de cada ticker.
+
+    Com timeout, espera até esse tempo pelo primeiro tick; sem timeout, só
+    consome o que já está na fila.
+    """
+    latest = {}
+    try:
+        tick = subscriber.get(timeout=timeout) if timeout else subscriber.get_nowait()
+    except queue.Empty:
+        return latest
+    while True:
+        latest[tick.ticker] = tick
+        try:
+            tick = subscriber.get_nowait()
+        except queue.Empty:
+            return latest
+
+
+class ProviderTickSource:
+    """Produtor de ticks a partir das cotações do agendador de atualização.
+
+    Não faz requisições próprias: cada lote consultado pelo agendador (dentro
+    do orçamento dele) vira ticks no barramento.
+    """
+
+    def __init__(self, scheduler, stream):
+        self.scheduler = scheduler
+        self.stream = stream
+        scheduler.on_prices = stream.publish_prices
+
+    def start(self):
+        self.scheduler.start()
+
+    def stop(self):
+        self.scheduler.stop()
+
+
+class SimulatedTickSource:
+    """Produtor de ticks simulados, para usar o modo em fluxo sem acesso à rede.
+
+    Parte dos preços iniciais informados e publica, a cada interval segundos,
+    um passeio aleatório com desvio relativo volatility por tick.
+    """
+
+    def __init__(self, stream, initial_prices, interval=1.0, volatility=0.002, seed=None):
+        self.stream = stream
+        self.prices = {ticker: price for ticker, price in initial_prices.items() if price}
+        self.interval = interval
+        self.volatility = volatility
+        self._random = random.Random(seed)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def step(self):
+        """Gera e publica um tick para cada ticker"""
+        for ticker, price in self.prices.items():
+            price = round(price * (1 + self._random.gauss(0, self.volatility)), 2)
+            self.prices[ticker] = price
+            self.stream.publish(ticker, price)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.step()
+
+
+class PriceHistoryRecorder:
+    """Consumidor que grava em price_history o preço do dia recebido pelo barramento.
+
+    Os ticks são acumulados e gravados a cada flush_seconds, só com o último
+    preço de cada ativo, para não escrever no banco a cada tick. O preço do
+    dia já gravado é substituído pelo mais recente.
+    """
+
+    def __init__(self, db_manager, stream, flush_seconds=5.0):
+        self.db = db_manager
+        self.subscriber = stream.subscribe("price_history")
+        self.flush_seconds = flush_seconds
+        self._asset_ids = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _asset_id(self, ticker):
+        if ticker not in self._asset_ids:
+            self._asset_ids = {name + ".SA": asset_id for asset_id, name, _ in self.db.get_all_assets()}
+        return self._asset_ids.get(ticker)
+
+    def flush(self):
+        """Grava os ticks pendentes em uma única transação. Retorna quantos registros foram gravados"""
+        latest = drain_latest(self.subscriber)
+        rows = []
+        for ticker, tick in latest.items():
+            asset_id = self._asset_id(ticker)
+            if asset_id is None:
+                continue
+            record_date = datetime.date.fromtimestamp(tick.timestamp).strftime("%Y-%m-%d")
+            rows.append((asset_id, tick.price, record_date))
+        written, ignored = self.db.upsert_price_history_bulk(rows)
+        return written
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Erro ao gravar histórico de preços do fluxo de cotações: {e}")
@@ -0,0 +1,163 @@
+import heapq
+import math
+import threading
+import time
+
+# Prioridades de atualização, da mais alta para a mais baixa
+PRIORITY_ALERT = "alerta"        # ativos com alertas ativos
+PRIORITY_VISIBLE = "visível"     # ativos visíveis na tabela
+PRIORITY_DORMANT = "inativo"     # demais posições
+PRIORITY_ORDER = (PRIORITY_ALERT, PRIORITY_VISIBLE, PRIORITY_DORMANT)
+
+# Intervalo (segundos) entre atualizações de um ticker, por prioridade
+DEFAULT_INTERVALS = {
+    PRIORITY_ALERT: 60,
+    PRIORITY_VISIBLE: 2 * 60,
+    PRIORITY_DORMANT: 15 * 60,
+}
+# Orçamento global de requisições ao provedor: no máximo DEFAULT_REQUESTS_PER_WINDOW
+# requisições em lote a cada DEFAULT_WINDOW_SECONDS segundos
+DEFAULT_REQUESTS_PER_WINDOW = 1
+DEFAULT_WINDOW_SECONDS = 60
+# Intervalo (segundos) entre verificações dos prazos
+DEFAULT_TICK_SECONDS = 5
+
+
+class QuoteRefreshScheduler:
+    """Atualiza as cotações de cada ticker no seu próprio prazo.
+
+    Cada ticker tem uma prioridade (alerta, visível ou inativo) que define de
+    quanto em quanto tempo ele é atualizado. Os prazos ficam em um heap. O
+    orçamento global é de requests_per_window requisições em lote a cada
+    window_seconds: enquanto não há requisição disponível, os tickers que
+    vencem se acumulam, e todos são consultados juntos na próxima, os de maior
+    prioridade primeiro. O que não couber nos lotes fica para a janela seguinte.
+    """
+
+    def __init__(self, price_provider, on_prices=None, intervals=None, requests_per_window=DEFAULT_REQUESTS_PER_WINDOW,
+                 window_seconds=DEFAULT_WINDOW_SECONDS, tick_seconds=DEFAULT_TICK_SECONDS):
+        self.price_provider = price_provider
+        self.on_prices = on_prices
+        self.intervals = dict(DEFAULT_INTERVALS)
+        if intervals:
+            self.intervals.update(intervals)
+        self.requests_per_window = requests_per_window
+        self.window_seconds = window_seconds
+        # Tickers por requisição: o tamanho do lote do provedor
+        self.tickers_per_request = getattr(price_provider, "chunk_size", None) or 100
+        self.tick_seconds = tick_seconds
+        self.lock = threading.Lock()
+        self._heap = []  # (prazo, sequência, ticker)
+        self._deadlines = {}  # ticker -> prazo vigente (entradas antigas do heap são ignoradas)
+        self._priorities = {}
+        self._asset_types = {}
+        self._sequence = 0
+        self._tokens = float(requests_per_window)
+        self._last_refill = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _push(self, ticker, deadline):
+        self._sequence += 1
+        self._deadlines[ticker] = deadline
+        heapq.heappush(self._heap, (deadline, self._sequence, ticker))
+
+    def set_tickers(self, priorities, asset_types=None, now=None, fetched_at=None):
+        """Define os tickers acompanhados: {ticker: prioridade}.
+
+        Tickers novos vencem um intervalo depois da última consulta, informada
+        em fetched_at ({ticker: instante em time.monotonic()}), ou imediatamente
+        se nunca foram consultados. Quando a prioridade de um ticker aumenta,
+        seu prazo é antecipado para o intervalo da nova prioridade.
+        """
+        fetched_at = fetched_at or {}
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            for ticker in list(self._priorities):
+                if ticker not in priorities:
+                    del self._priorities[ticker]
+                    self._deadlines.pop(ticker, None)
+            for ticker, priority in priorities.items():
+                previous = self._priorities.get(ticker)
+                self._priorities[ticker] = priority
+                if previous is None:
+                    last_fetch = fetched_at.get(ticker)
+                    self._push(ticker, now if last_fetch is None else last_fetch + self.intervals[priority])
+                elif PRIORITY_ORDER.index(priority) < PRIORITY_ORDER.index(previous):
+                    deadline = min(self._deadlines[ticker], now + self.intervals[priority])
+                    self._push(ticker, deadline)
+            if asset_types:
+                self._asset_types.update(asset_types)
+
+    def _refill(self, now):
+        if self._last_refill is not None:
+            elapsed = now - self._last_refill
+            self._tokens = min(float(self.requests_per_window),
+                               self._tokens + elapsed * self.requests_per_window / self.window_seconds)
+        self._last_refill = now
+
+    def _take_due(self, now):
+        """Retira do heap os tickers vencidos que cabem nas requisições disponíveis"""
+        with self.lock:
+            self._refill(now)
+            requests = int(self._tokens)
+            if requests < 1:
+                # Sem requisição disponível: os vencidos esperam e vão juntos no próximo lote
+                return []
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, ticker = heapq.heappop(self._heap)
+                if self._deadlines.get(ticker) == deadline:
+                    due.append((PRIORITY_ORDER.index(self._priorities[ticker]), deadline, ticker))
+            due.sort()
+            capacity = requests * self.tickers_per_request
+            selected, postponed = due[:capacity], due[capacity:]
+            for _, deadline, ticker in postponed:
+                self._push(ticker, deadline)
+            self._tokens -= math.ceil(len(selected) / self.tickers_per_request)
+            return [ticker for _, _, ticker in selected]
+
+    def _reschedule(self, tickers, now):
+        with self.lock:
+            for ticker in tickers:
+                priority = self._priorities.get(ticker)
+                if priority is not None:
+                    self._push(ticker, now + self.intervals[priority])
+
+    def run_once(self, now=None):
+        """Atualiza os tickers vencidos. Retorna {ticker: preço} dos consultados"""
+        now = time.monotonic() if now is None else now
+        tickers = self._take_due(now)
+        if not tickers:
+            return {}
+        try:
+            # O agendador é quem decide quando a cotação está velha
+            self.price_provider.invalidate_quotes(tickers)
+            prices = self.price_provider.get_current_prices(
+                tickers, asset_types={t: self._asset_types.get(t) for t in tickers})
+        finally:
+            self._reschedule(tickers, now)
+        if self.on_prices:
+            self.on_prices(prices)
+        return prices
+
+    def priority_of(self, ticker):
+        with self.lock:
+            return self._priorities.get(ticker)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Erro na atualização agendada de cotações: {e}")
+            self._stop_event.wait(self.tick_seconds)
@@ -0,0 +1,122 @@
+import os
+import random
+import threading
+import time
+import pandas as pd
+from price_provider import PriceProvider
+from quote_cache import QuoteCache
+
+
+class ReplayPriceProvider(PriceProvider):
+    """Provedor de cotações que reproduz fechamentos gravados em arquivo.
+
+    Lê um CSV ou Parquet com as colunas ticker, date e close (ou price) e
+    responde às mesmas consultas do provedor do Yahoo Finance, sem acesso à
+    rede. A latência de cada requisição pode ser simulada com latency (fixa,
+    em segundos) e jitter (variação aleatória uniforme, reprodutível via seed),
+    o que permite testes de desempenho determinísticos.
+    """
+
+    def __init__(self, path, latency=0.0, jitter=0.0, seed=None, as_of=None, cache=None, **kwargs):
+        # Por padrão o cache fica só em memória, para não misturar as cotações
+        # gravadas com as do cache persistente do app
+        super().__init__(cache=cache if cache is not None else QuoteCache(":memory:"), **kwargs)
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.as_of = pd.Timestamp(as_of) if as_of else None
+        self.request_count = 0
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._series = self._load(path)
+
+    def _load(self, path):
+        """Carrega o arquivo em {ticker: Series de fechamentos indexada por data}"""
+        if os.path.splitext(path)[1].lower() == ".parquet":
+            df = pd.read_parquet(path)
+        else:
+            df = pd.read_csv(path)
+        if "close" not in df.columns and "price" in df.columns:
+            df = df.rename(columns={"price": "close"})
+        missing_columns = {"ticker", "date", "close"} - set(df.columns)
+        if missing_columns:
+            raise ValueError(f"Arquivo de cotações sem as colunas: {', '.join(sorted(missing_columns))}")
+
+        df["date"] = pd.to_datetime(df["date"])
+        df = df.dropna(subset=["close"]).sort_values("date")
+        series = {}
+        for ticker, group in df.groupby("ticker"):
+            series[ticker] = group.set_index("date")["close"].astype(float)
+        return series
+
+    def _simulate_latency(self):
+        with self._random_lock:
+            self.request_count += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _closes(self, ticker, start_date=None, end_date=None):
+        series = self._series.get(ticker)
+        if series is None:
+            return None
+        if self.as_of is not None:
+            series = series[series.index <= self.as_of]
+        if start_date:
+            series = series[series.index >= pd.Timestamp(start_date)]
+        if end_date:
+            # Mesma semântica do yfinance: data final exclusiva
+            series = series[series.index < pd.Timestamp(end_date)]
+        return series
+
+    def _fetch_current_prices(self, tickers):
+        self._simulate_latency()
+        prices = {}
+        for ticker in tickers:
+            series = self._closes(ticker)
+            if series is None or series.empty:
+                print(f"Não foi possível obter dados para {ticker}")
+                continue
+            prices[ticker] = float(series.iloc[-1])
+        return prices
+
+    def _fetch_historical_prices(self, ticker, start_date=None, end_date=None):
+        self._simulate_latency()
+        series = self._closes(ticker, start_date, end_date)
+        if series is None or series.empty:
+            print(f"Não foi possível obter dados históricos para {ticker}")
+            return None
+        return list(zip(series.index.strftime("%d/%m/%Y"), series.tolist()))
+
+    def _fetch_historical_prices_bulk(self, tickers, start_date=None, end_date=None):
+        self._simulate_latency()
+        history = {}
+        for ticker in tickers:
+            series = self._closes(ticker, start_date, end_date)
+            if series is not None and not series.empty:
+                history[ticker] = list(zip(series.index.strftime("%Y-%m-%d"), series.tolist()))
+        return history
+
+    @staticmethod
+    def record(source_provider, tickers, path, start_date=None, end_date=None):
+        """Grava em CSV/Parquet o histórico de tickers obtido de outro provedor"""
+        history = source_provider.get_historical_prices_bulk(tickers, start_date, end_date)
+        rows = [(ticker, date, price) for ticker, prices in history.items() for date, price in prices]
+        df = pd.DataFrame(rows, columns=["ticker", "date", "close"])
+        if os.path.splitext(path)[1].lower() == ".parquet":
+            df.to_parquet(path, index=False)
+        else:
+            df.to_csv(path, index=False)
+        print(f"{len(df)} cotações de {len(history)} tickers gravadas em: {path}")
+        return len(df)
+
+
+if __name__ == "__main__":
+    # Exemplo: gravar cotações reais e reproduzi-las offline com 50 ms de latência
+    from yfinance_integration import YFinanceIntegration
+
+    ReplayPriceProvider.record(YFinanceIntegration(), ["PETR4.SA", "VALE3.SA", "^BVSP"], "cotacoes_gravadas.csv", "2023-01-01", "2023-12-31")
+    replay = ReplayPriceProvider("cotacoes_gravadas.csv", latency=0.05, seed=42)
+    start = time.perf_counter()
+    print(replay.get_current_prices(["PETR4.SA", "VALE3.SA"]))
+    print(f"Tempo: {time.perf_counter() - start:.3f}s em {replay.request_count} requisições")
@@ -2,17 +2,25 @@ import pandas as pd
 import numpy as np
 import datetime
 from tkinter import messagebox
+from benchmark_history import BenchmarkHistoryStore
 
 MSG_DADOS_INSUFICIENTES = (
     "Não há dados de histórico suficientes no banco de dados para realizar esta operação.\n"
     "Por favor, cadastre ou importe mais dados de preços históricos para os ativos da carteira."
 )
 MSG_BUSCA_API = "Tentando buscar dados históricos de 1 ano atrás automaticamente via API (Yahoo Finance)..."
+MSG_BACKFILL_AGENDADO = (
+    "O histórico de preços está sendo baixado em segundo plano.\n"
+    "Tente novamente em alguns instantes."
+)
 
 class RiskAnalysis:
-    def __init__(self, db_manager, yf_integration):
+    def __init__(self, db_manager, price_provider, backfill_service=None, benchmark_store=None, price_archive=None):
         self.db = db_manager
-        self.yf = yf_integration
+        self.price_provider = price_provider
+        self.backfill = backfill_service
+        self.price_archive = price_archive
+        self.benchmarks = benchmark_store if benchmark_store is not None else BenchmarkHistoryStore(db_manager, price_provider)
 
     def _show_warning(self, msg, gui_parent=None):
         print(msg)
@@ -29,9 +37,20 @@ class RiskAnalysis:
             return None
         asset_id = asset[0]
 
+        if self.price_archive is not None:
+            # Arquivo colunar: preços já como arrays, sem montar tuplas do SQLite
+            prices = self.price_archive.get_price_series(asset_id, start_date, end_date)
+            if len(prices) >= 2:
+                return prices.pct_change().rename("Daily_Return").dropna()
+
         price_history = self.db.get_price_history(asset_id, start_date, end_date)
         if not price_history or len(price_history) < 2:
             self._show_warning(MSG_DADOS_INSUFICIENTES, gui_parent)
+            if self.backfill:
+                # O histórico é completado pelo serviço de backfill, fora da análise
+                self.backfill.request_backfill()
+                self._show_warning(MSG_BACKFILL_AGENDADO, gui_parent)
+                return None
             self._show_warning(MSG_BUSCA_API, gui_parent)
             if not end_date:
                 end_date_obj = datetime.date.today()
@@ -40,13 +59,12 @@ class RiskAnalysis:
                 end_date_obj = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
             start_date_obj = end_date_obj - datetime.timedelta(days=365)
             start_date = start_date_obj.strftime("%Y-%m-%d")
-            yf_data = self.yf.get_historical_prices(asset_name + ".SA", start_date, end_date)
+            yf_data = self.price_provider.get_historical_prices(asset_name + ".SA", start_date, end_date)
             if yf_data and len(yf_data) >= 2:
                 print(f"✅ Dados do Yahoo Finance obtidos para {asset_name}: {len(yf_data)} registros")
-                for date, price in yf_data:
-                    self.db.add_price_history(asset_id, price, date)
+                self.db.add_price_history_bulk((asset_id, price, date) for date, price in yf_data)
                 df = pd.DataFrame(yf_data, columns=["Date", "Price"])
-                df["Date"] = pd.to_datetime(df["Date"], dayfirst=True, errors="coerce")
+                df["Date"] = pd.to_datetime(df["Date"], format="%d/%m/%Y", errors="coerce")
                 df = df.dropna(subset=["Date"])
                 df.set_index("Date", inplace=True)
                 df["Daily_Return"] = df["Price"].pct_change()
@@ -54,8 +72,12 @@ class RiskAnalysis:
             else:
                 self._show_warning(MSG_DADOS_INSUFICIENTES, gui_parent)
                 return None
+        return self._returns_from_history(price_history)
+
+    def _returns_from_history(self, price_history):
         df = pd.DataFrame(price_history, columns=["Date", "Price"])
-        df["Date"] = pd.to_datetime(df["Date"], dayfirst=True, errors="coerce")
+        # O banco guarda as datas no formato canônico AAAA-MM-DD
+        df["Date"] = pd.to_datetime(df["Date"], format="%Y-%m-%d", errors="coerce")
         df = df.dropna(subset=["Date"])
         df.set_index("Date", inplace=True)
         df["Daily_Return"] = df["Price"].pct_change()
@@ -71,21 +93,36 @@ class RiskAnalysis:
         return volatility
 
     def calculate_beta(self, asset_name, benchmark_ticker, start_date=None, end_date=None, gui_parent=None):
-        asset_returns = self.calculate_daily_returns(asset_name, start_date, end_date, gui_parent)
+        if self.backfill is None:
+            # Sem o backfill agendado (ex: uso fora do app), o benchmark é baixado aqui mesmo;
+            # o download grava no banco, então fica fora do retrato, para ser visto por ele
+            self.benchmarks.refresh(benchmark_ticker, start_date)
+        else:
+            # O download fica com o backfill agendado, fora do caminho das análises
+            self.benchmarks.track(benchmark_ticker, start_date)
+        # Ativo e benchmark lidos pela conexão fixada no retrato, e não pelo arquivo colunar
+        # ou pela série em memória do benchmark, que podem estar em outro ponto do banco
+        with self.db.snapshot():
+            asset = self.db.get_asset_by_name(asset_name)
+            price_history = self.db.get_price_history(asset[0], start_date, end_date) if asset else []
+            benchmark_prices = self.benchmarks.read_series(benchmark_ticker, start_date, end_date)
+        if len(price_history) >= 2:
+            asset_returns = self._returns_from_history(price_history)
+        else:
+            # Sem histórico no banco: backfill ou busca na API, com os avisos ao usuário
+            asset_returns = self.calculate_daily_returns(asset_name, start_date, end_date, gui_parent)
+        benchmark_daily_returns = benchmark_prices.pct_change().dropna()
         if asset_returns is None or asset_returns.empty or len(asset_returns) < 2:
             self._show_warning(MSG_DADOS_INSUFICIENTES, gui_parent)
             return 0.0
-        benchmark_data = self.yf.get_historical_prices(benchmark_ticker, start_date, end_date)
-        if not benchmark_data or len(benchmark_data) < 2:
+        if len(benchmark_daily_returns) < 2:
             self._show_warning(MSG_DADOS_INSUFICIENTES, gui_parent)
-            self._show_warning(MSG_BUSCA_API, gui_parent)
+            if self.backfill:
+                self.backfill.request_backfill()
+                self._show_warning(MSG_BACKFILL_AGENDADO, gui_parent)
+            else:
+                self._show_warning(MSG_BUSCA_API, gui_parent)
             return 0.0
-        benchmark_df = pd.DataFrame(benchmark_data, columns=["Date", "Price"])
-        benchmark_df["Date"] = pd.to_datetime(benchmark_df["Date"], dayfirst=True, errors="coerce")
-        benchmark_df = benchmark_df.dropna(subset=["Date"])
-        benchmark_df.set_index("Date", inplace=True)
-        benchmark_df["Daily_Return"] = benchmark_df["Price"].pct_change()
-        benchmark_daily_returns = benchmark_df["Daily_Return"].dropna()
         combined_returns = pd.concat([asset_returns, benchmark_daily_returns], axis=1).dropna()
         combined_returns.columns = ["Asset", "Benchmark"]
         if combined_returns.empty or len(combined_returns) < 2:
@@ -0,0 +1,136 @@
+import datetime
+import sqlite3
+from collections import namedtuple
+from logger import log_message
+
+# Linhas por lote nos passos em lote (cada lote é uma transação curta)
+DEFAULT_BATCH_SIZE = 5000
+
+# Uma migração: versão (inteiro crescente), descrição e passos, em ordem.
+# Cada passo é um comando SQL, uma função f(conn) ou um BatchedStatement.
+# Com foreign_keys=False, os passos rodam com as chaves estrangeiras desligadas
+# (reconstrução de tabelas, como no procedimento de ALTER TABLE do SQLite).
+Migration = namedtuple("Migration", ["version", "description", "steps", "foreign_keys"], defaults=(True,))
+
+
+class BatchedStatement:
+    """Passo de migração que percorre uma tabela grande em faixas de rowid.
+
+    sql recebe os parâmetros :first e :last (faixa de rowid do lote) e é
+    executado uma vez por lote, cada lote na sua própria transação. Entre os
+    lotes o escritor fica livre, então o aplicativo continua gravando durante
+    a migração. O comando precisa ser idempotente (ex: filtrar as linhas já
+    convertidas), porque uma migração interrompida recomeça do início.
+    """
+
+    def __init__(self, table, sql, batch_size=DEFAULT_BATCH_SIZE):
+        self.table = table
+        self.sql = sql
+        self.batch_size = batch_size
+
+    def run(self, pool):
+        """Executa todos os lotes. Retorna o número de linhas alteradas"""
+        changed = 0
+        last = 0
+        while True:
+            with pool.writer() as conn:
+                end = conn.execute(
+                    f"SELECT MAX(rowid) FROM (SELECT rowid FROM {self.table} WHERE rowid > ? ORDER BY rowid LIMIT ?)",
+                    (last, self.batch_size)).fetchone()[0]
+                if end is None:
+                    return changed
+                changed += conn.execute(self.sql, {"first": last + 1, "last": end}).rowcount
+            last = end
+
+
+class MigrationRunner:
+    """Aplica as migrações pendentes em ordem, registrando cada uma em schema_version.
+
+    Os passos de uma migração rodam em uma única transação junto com o
+    registro da versão: se algum falhar, nada dela fica aplicado. A exceção
+    são os BatchedStatement, que confirmam lote a lote; os passos anteriores
+    a eles são confirmados antes do primeiro lote.
+    """
+
+    def __init__(self, pool, migrations):
+        self.pool = pool
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+
+    def ensure_version_table(self):
+        """Cria schema_version; em bancos versionados por PRAGMA user_version, importa as versões já aplicadas"""
+        with self.pool.writer() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TEXT NOT NULL
+                )
+            """)
+            if conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0]:
+                return
+            user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            now = datetime.datetime.now().isoformat(timespec="seconds")
+            conn.executemany("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                             [(m.version, m.description, now) for m in self.migrations if m.version <= user_version])
+
+    def applied_versions(self):
+        with self.pool.reader() as conn:
+            return {row[0] for row in conn.execute("SELECT version FROM schema_version")}
+
+    def current_version(self):
+        return max(self.applied_versions(), default=0)
+
+    def pending(self):
+        applied = self.applied_versions()
+        return [m for m in self.migrations if m.version not in applied]
+
+    def _execute(self, conn, step):
+        if callable(step):
+            step(conn)
+        else:
+            conn.execute(step)
+
+    def apply(self, migration):
+        if migration.foreign_keys:
+            self._apply_steps(migration)
+            return
+        # O PRAGMA só muda fora de transação; o bloqueio de escrita fica com esta
+        # thread até o fim, para nenhuma outra gravar com as chaves desligadas
+        with self.pool.exclusive() as conn:
+            conn.execute("PRAGMA foreign_keys = OFF")
+            try:
+                self._apply_steps(migration)
+            finally:
+                conn.execute("PRAGMA foreign_keys = ON")
+
+    def _apply_steps(self, migration):
+        steps = []
+        for step in migration.steps:
+            if isinstance(step, BatchedStatement):
+                if steps:
+                    with self.pool.writer() as conn:
+                        for pending_step in steps:
+                            self._execute(conn, pending_step)
+                    steps = []
+                step.run(self.pool)
+            else:
+                steps.append(step)
+        with self.pool.writer() as conn:
+            for step in steps:
+                self._execute(conn, step)
+            conn.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                         (migration.version, migration.description, datetime.datetime.now().isoformat(timespec="seconds")))
+
+    def run(self):
+        """Aplica as migrações pendentes. Retorna as versões aplicadas; para na primeira que falhar"""
+        self.ensure_version_table()
+        applied = []
+        for migration in self.pending():
+            try:
+                self.apply(migration)
+            except sqlite3.Error as e:
+                log_message(f"Erro ao aplicar a migração {migration.version} ({migration.description}): {e}")
+                raise
+            print(f"Migração {migration.version} aplicada: {migration.description}")
+            applied.append(migration.version)
+        return applied
@@ -0,0 +1,72 @@
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Agrupa chamadas simultâneas pela mesma chave em uma única execução.
+
+    A primeira thread a pedir uma chave (a "líder") executa a consulta; as
+    demais que pedirem a mesma chave enquanto ela está em andamento apenas
+    aguardam e recebem o mesmo resultado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def begin(self, key):
+        """Registra interesse em key. Retorna (chamada, é_líder)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            self.executed += 1
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        """Publica o resultado da líder e libera as threads que aguardam"""
+        call.result = result
+        call.error = error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    def wait(self, call, timeout=None, default=None):
+        """Aguarda o resultado de uma chamada em andamento (default se o tempo acabar)"""
+        if not call.done.wait(timeout):
+            return default
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, func, timeout=None, default=None):
+        """Executa func() uma única vez por chave entre as chamadas simultâneas.
+
+        Quem aguarda outra thread e esgota timeout recebe default.
+        """
+        call, is_leader = self.begin(key)
+        if not is_leader:
+            return self.wait(call, timeout, default)
+        try:
+            result = func()
+        except Exception as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"executed": self.executed, "shared": self.shared, "in_flight": len(self._calls)}
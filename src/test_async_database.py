@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from async_database import AsyncDatabase, BackgroundWorker
+from database_manager import DatabaseManager
+
+
+class FilaDeEventos:
+    """Substitui o root do Tk: guarda os callbacks de after() para rodar na thread do teste"""
+
+    def __init__(self):
+        self.pendentes = []
+
+    def after(self, ms, func):
+        self.pendentes.append(func)
+
+    def processar(self):
+        pendentes, self.pendentes = self.pendentes, []
+        for func in pendentes:
+            func()
+
+
+def test_consultas_na_thread_do_banco_e_callbacks_na_interface(tmp_path):
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    root = FilaDeEventos()
+    async_db = AsyncDatabase(db, root)
+    resultados = []
+
+    future = async_db.add_asset("PETR4", "Ação")
+    asset_id = future.result(5)
+    threads = async_db.submit(threading.get_ident).result(5), async_db.submit(threading.get_ident).result(5)
+    assert threads[0] == threads[1] != threading.get_ident()
+
+    async_db.get_asset_by_id(asset_id, callback=lambda asset: resultados.append((asset[1], threading.get_ident())))
+    async_db.submit(lambda: 1 / 0, on_error=lambda e: resultados.append(type(e).__name__))
+    # As chamadas rodam em ordem: quando esta termina, as anteriores já entregaram seus callbacks
+    async_db.submit(lambda: None).result(5)
+    # Nada é entregue antes de a interface processar os eventos
+    assert resultados == []
+    root.processar()
+    assert resultados == [("PETR4", threading.get_ident()), "ZeroDivisionError"]
+    async_db.close()
+    db.close()
+
+
+def test_tarefa_demorada_nao_prende_a_fila_do_banco(tmp_path):
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    root = FilaDeEventos()
+    async_db = AsyncDatabase(db, root)
+    background = BackgroundWorker(root, max_workers=2)
+    liberar = threading.Event()
+    resultados = []
+
+    # Ex: um download lento em segundo plano
+    tarefa = background.submit(lambda: liberar.wait(5) and "baixado", callback=resultados.append)
+    # A consulta do banco termina enquanto a tarefa ainda espera
+    assert async_db.add_asset("PETR4", "Ação").result(5)
+    assert not tarefa.done()
+    liberar.set()
+    # Ao encerrar, a tarefa já entregou seu callback
+    background.close()
+    root.processar()
+    assert resultados == ["baixado"]
+    async_db.close()
+    db.close()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database_manager import DatabaseManager
+from replay_price_provider import ReplayPriceProvider
+from benchmark_history import BenchmarkHistoryStore
+from price_backfill import PriceBackfillService
+
+COTACOES = """ticker,date,close
+^BVSP,2023-01-02,106000
+^BVSP,2023-01-03,104000
+^BVSP,2023-01-04,105000
+"""
+
+
+def test_benchmark_baixado_uma_unica_vez(tmp_path):
+    """O benchmark é gravado no banco e reaproveitado, sem novas requisições"""
+    path = tmp_path / "cotacoes.csv"
+    path.write_text(COTACOES)
+    provider = ReplayPriceProvider(str(path))
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    store = BenchmarkHistoryStore(db, provider)
+
+    assert store.get_history("^BVSP", "2023-01-01", "2023-01-03") == [("2023-01-02", 106000.0), ("2023-01-03", 104000.0)]
+    for _ in range(200):
+        returns = store.get_daily_returns("^BVSP", "2023-01-01", "2023-01-31")
+    assert len(returns) == 2
+    assert provider.request_count == 1
+
+    # Um novo store (app reiniciado) lê o banco e só busca o que falta
+    store = BenchmarkHistoryStore(db, provider)
+    assert len(store.get_history("^BVSP", "2023-01-01")) == 3
+    assert provider.request_count == 2
+    db.close()
+
+
+def test_leitura_direta_ignora_a_serie_em_memoria(tmp_path):
+    """read_series lê o banco (e o retrato aberto), não a série guardada em memória"""
+    path = tmp_path / "cotacoes.csv"
+    path.write_text(COTACOES)
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    store = BenchmarkHistoryStore(db, ReplayPriceProvider(str(path)))
+    store.get_series("^BVSP", "2023-01-01")
+
+    with db.snapshot():
+        db.add_benchmark_history("^BVSP", [("2023-01-05", 107000.0)])
+        assert len(store.read_series("^BVSP", "2023-01-01")) == 3
+    assert len(store.read_series("^BVSP", "2023-01-01")) == 4
+    assert len(store.read_series("^BVSP", "2023-01-03", "2023-01-04")) == 2
+    db.close()
+
+
+def test_falha_no_download_e_tentada_de_novo_pelo_backfill(tmp_path):
+    """Uma consulta sem dados não marca o dia como verificado; o backfill agendado atualiza os benchmarks"""
+    path = tmp_path / "cotacoes.csv"
+    path.write_text(COTACOES)
+    provider = ReplayPriceProvider(str(path))
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    db.add_benchmark_history("^BVSP", [("2023-01-02", 106000.0), ("2023-01-03", 104000.0)])
+    store = BenchmarkHistoryStore(db, provider)
+    store.track("^BVSP", "2023-01-01")
+    backfill = PriceBackfillService(db, provider, benchmark_store=store)
+    real_download = provider.get_historical_prices_bulk
+    provider.get_historical_prices_bulk = lambda *args: {}
+    backfill.backfill_all()
+    assert db.get_benchmark_date_range("^BVSP") == ("2023-01-02", "2023-01-03")
+
+    # No mesmo dia, a atualização incremental é tentada de novo
+    provider.get_historical_prices_bulk = real_download
+    backfill.backfill_all()
+    assert db.get_benchmark_date_range("^BVSP") == ("2023-01-02", "2023-01-04")
+    db.close()
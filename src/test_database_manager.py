@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database_manager import DatabaseManager
+
+
+def test_leitura_nao_espera_gravacao(tmp_path):
+    """Com uma gravação em andamento em outra thread, a leitura responde com os dados já confirmados"""
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    db.add_asset("PETR4", "Ação")
+    gravando = threading.Event()
+    liberar = threading.Event()
+
+    def gravacao_longa():
+        with db.pool.writer() as conn:
+            conn.execute("INSERT INTO assets (name, type) VALUES ('VALE3', 'Ação')")
+            gravando.set()
+            liberar.wait(5)
+
+    writer = threading.Thread(target=gravacao_longa)
+    writer.start()
+    gravando.wait(5)
+    try:
+        assert [a[1] for a in db.get_all_assets()] == ["PETR4"]
+    finally:
+        liberar.set()
+        writer.join()
+    assert [a[1] for a in db.get_all_assets()] == ["PETR4", "VALE3"]
+    with db.pool.reader() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    db.close()
+
+
+def test_gravacao_em_lote_conta_inseridos_e_ignorados(tmp_path):
+    import pandas as pd
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    asset_id = db.add_asset("PETR4", "Ação")
+    assert db.add_price_history_bulk([(asset_id, 22.0, "2023-01-02"), (asset_id, 22.5, "2023-01-03")]) == (2, 0)
+    df = pd.DataFrame({"asset_id": [asset_id] * 2, "price": [22.5, 23.1], "record_date": ["2023-01-03", "2023-01-04"]})
+    assert db.add_price_history_bulk(df) == (1, 1)
+    assert db.add_transactions_bulk([(asset_id, "compra", 100, 22.0, "2023-01-02"), (asset_id, "venda", None, 23.0, "2023-01-04")]) == (1, 1)
+    assert db.add_dividends_bulk([]) == (0, 0)
+    assert len(db.get_price_history(asset_id)) == 3
+    db.close()
+
+
+def test_transacao_desfaz_tudo_em_caso_de_erro(tmp_path):
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    try:
+        with db.transaction():
+            asset_id = db.add_asset("PETR4", "Ação")
+            # Dentro da transação, a leitura já enxerga o ativo ainda não confirmado
+            assert db.get_asset_by_name("PETR4")[0] == asset_id
+            # Falha tratada em um bloco aninhado desfaz só o próprio savepoint
+            assert db.add_asset("PETR4", "Ação") is None
+            db.add_transaction(asset_id, "compra", 100, 22.0, "2023-01-02")
+            raise RuntimeError("falha no meio da operação")
+    except RuntimeError:
+        pass
+    assert db.get_all_assets() == []
+
+    with db.transaction():
+        asset_id = db.add_asset("PETR4", "Ação")
+        db.add_transaction(asset_id, "compra", 100, 22.0, "2023-01-02")
+    assert db.delete_asset(asset_id)
+    assert db.get_all_assets() == [] and db.get_asset_transactions(asset_id) == []
+    db.close()
+
+
+def test_auditoria_sem_varreduras_inesperadas(monkeypatch):
+    import database_manager
+    from query_plan_audit import audit_queries
+    assert [f for f in audit_queries() if not f[3]] == []
+    # Sem os índices da migração, a auditoria aponta as varreduras
+    monkeypatch.setattr(database_manager, "SCHEMA_MIGRATIONS", [])
+    unexpected = {f[0] for f in audit_queries() if not f[3]}
+    assert {"get_asset_transactions", "get_events", "delete_assets"} <= unexpected
+
+
+def test_migracao_converte_datas_para_iso(tmp_path):
+    path = str(tmp_path / "carteira.db")
+    db = DatabaseManager(path)
+    asset_id = db.add_asset("PETR4", "Ação")
+    # Linhas gravadas no formato antigo, antes da migração
+    with db.transaction() as conn:
+        conn.executemany("INSERT INTO price_history (asset_id, price, record_date) VALUES (?, ?, ?)",
+                         [(asset_id, 22.0, "02/01/2023"), (asset_id, 22.4, "2023-01-03"), (asset_id, 22.5, "03/01/2023"),
+                          (asset_id, 23.0, "2023-01-04 10:00:00")])
+        conn.execute("INSERT INTO transactions (asset_id, transaction_type, quantity, price, transaction_date) VALUES (?, 'compra', 1, 1, '15/12/2022')", (asset_id,))
+        conn.execute("DELETE FROM schema_version WHERE version >= 2")
+    db.close()
+
+    db = DatabaseManager(path)
+    assert db.get_price_history(asset_id) == [("2023-01-02", 22.0), ("2023-01-03", 22.4), ("2023-01-04", 23.0)]
+    assert db.get_asset_transactions(asset_id)[0][5] == "2022-12-15"
+    # Gravações e filtros aceitam DD/MM/AAAA, mas o banco só guarda AAAA-MM-DD
+    db.add_price_history(asset_id, 23.5, "05/01/2023")
+    assert db.get_price_history(asset_id, "04/01/2023", "2023-01-05") == [("2023-01-04", 23.0), ("2023-01-05", 23.5)]
+    db.close()
+
+
+def test_migracao_da_cascata_guarda_linhas_orfas(tmp_path):
+    """A reconstrução com ON DELETE CASCADE não apaga as linhas de ativos inexistentes: guarda em <tabela>_orphans"""
+    path = str(tmp_path / "carteira.db")
+    db = DatabaseManager(path)
+    asset_id = db.add_asset("PETR4", "Ação")
+    db.add_transaction(asset_id, "compra", 10, 20.0, "2024-01-02")
+    with db.pool.exclusive() as conn:
+        conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute("INSERT INTO transactions (asset_id, transaction_type, quantity, price, transaction_date) VALUES (99, 'compra', 5, 1.0, '2024-01-03')")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("DELETE FROM schema_version WHERE version >= 5")
+        conn.commit()
+    db.close()
+
+    db = DatabaseManager(path)
+    assert db.get_schema_version() == 6
+    with db.pool.reader() as conn:
+        assert conn.execute("SELECT asset_id, quantity FROM transactions_orphans").fetchall() == [(99, 5.0)]
+        assert conn.execute("SELECT asset_id FROM transactions").fetchall() == [(asset_id,)]
+        assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    assert db.delete_assets([asset_id])["transactions"] == 1
+    db.close()
+
+
+def test_posicoes_acompanham_as_transacoes(tmp_path):
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    petr = db.add_asset("PETR4", "Ação")
+    vale = db.add_asset("VALE3", "Ação")
+    db.add_transactions_bulk([(petr, "compra", 100, 20.0, "2024-01-02"), (petr, "venda", 40, 25.0, "2024-02-01"),
+                              (vale, "compra", 10, 60.0, "2024-01-03")])
+    assert db.get_all_assets_with_transactions() == [(petr, "PETR4", "Ação", 60, 2000.0), (vale, "VALE3", "Ação", 10, 600.0)]
+
+    with db.transaction() as conn:
+        conn.execute("UPDATE transactions SET quantity = 20, asset_id = ? WHERE transaction_type = 'venda'", (vale,))
+        conn.execute("DELETE FROM transactions WHERE asset_id = ? AND transaction_type = 'compra'", (petr,))
+    # Ativo sem transações restantes sai da carteira
+    assert db.get_all_assets_with_transactions() == [(vale, "VALE3", "Ação", -10, 600.0)]
+    assert db.verify_positions() == []
+
+    with db.transaction() as conn:
+        conn.execute("UPDATE positions SET total_quantity = 999")
+    assert len(db.verify_positions()) == 2
+    assert db.rebuild_positions() == 1
+    assert db.verify_positions() == []
+    db.delete_asset(vale)
+    assert db.get_all_assets_with_transactions() == []
+    db.close()
+
+
+def test_exportacao_em_blocos_com_compressao(tmp_path):
+    import gzip
+    import json
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    asset_id = db.add_asset("PETR4", "Ação")
+    db.add_price_history_bulk([(asset_id, 20.0 + i, f"2024-01-{i + 1:02d}") for i in range(25)])
+    progress = []
+    filename = str(tmp_path / "dados.json.gz")
+    assert db.export_data_to_json(filename, chunk_size=10, progress=lambda *p: progress.append(p))
+    with gzip.open(filename, "rt") as f:
+        data = json.load(f)
+    assert data["assets"] == [{"id": asset_id, "name": "PETR4", "type": "Ação"}]
+    assert len(data["price_history"]) == 25 and data["events"] == []
+    assert [p[0] for p in progress] == [1, 11, 21, 26] and progress[-1][1] == 26
+
+    assert db.export_data_to_csv(str(tmp_path / "dados.csv"), chunk_size=7)
+    with open(tmp_path / "price_history_dados.csv") as f:
+        lines = f.read().splitlines()
+    assert lines[0] == "id,asset_id,price,record_date" and lines[1] == "1,1,20.0,2024-01-01" and len(lines) == 26
+    db.close()
+
+
+def test_importacao_json_em_fluxo_retoma_apos_falha(tmp_path):
+    import io
+    import json
+    import pytest
+    from data_import import JsonStreamReader
+    origem = DatabaseManager(str(tmp_path / "origem.db"))
+    asset_id = origem.add_asset("PETR4", "Ação")
+    origem.add_transactions_bulk([(asset_id, "compra", 10 + i, 20.0, "2024-01-02") for i in range(5)])
+    origem.add_price_history_bulk([(asset_id, 20.0 + i, f"2024-01-{i + 1:02d}") for i in range(25)])
+    origem.add_alert(asset_id, "price_target", target_value=30.0)
+    filename = str(tmp_path / "dados.json")
+    origem.export_data_to_json(filename)
+    origem.close()
+
+    # Leituras de poucos caracteres: registros partidos entre blocos
+    with open(filename) as f:
+        text = f.read()
+    reader = JsonStreamReader(io.StringIO(text), read_size=7)
+    assert reader.start() == "{"
+    assert [(section, item) for section, item in reader.object_items()] == [
+        (section, item) for section, items in json.loads(text).items() for item in items]
+
+    db = DatabaseManager(str(tmp_path / "destino.db"))
+    calls = []
+
+    def interromper(position, section):
+        calls.append((position, section))
+        if section == "price_history":
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        db.import_data_from_json(filename, batch_size=10, progress=interromper)
+    assert calls == [(1, "assets"), (6, "transactions"), (16, "price_history")]
+    assert len(db.get_price_history(asset_id)) == 10
+
+    assert db.import_data_from_json(filename, batch_size=10)
+    assert len(db.get_price_history(asset_id)) == 25
+    assert len(db.get_asset_transactions(asset_id)) == 5
+    assert len(db.get_active_alerts()) == 1
+    db.close()
+
+
+def test_importacao_json_com_ativos_no_fim_do_arquivo(tmp_path):
+    import json
+    origem = DatabaseManager(str(tmp_path / "origem.db"))
+    asset_id = origem.add_asset("PETR4", "Ação")
+    origem.add_transactions_bulk([(asset_id, "compra", 10 + i, 20.0, "2024-01-02") for i in range(5)])
+    origem.add_price_history_bulk([(asset_id, 20.0 + i, f"2024-01-{i + 1:02d}") for i in range(25)])
+    filename = str(tmp_path / "dados.json")
+    origem.export_data_to_json(filename)
+    origem.close()
+
+    # Seções filhas antes de "assets": não podem ser descartadas como ativo inexistente
+    with open(filename) as f:
+        data = json.load(f)
+    assets = data.pop("assets")
+    data["assets"] = assets
+    with open(filename, "w") as f:
+        json.dump(data, f)
+
+    db = DatabaseManager(str(tmp_path / "destino.db"))
+    sections = []
+    assert db.import_data_from_json(filename, batch_size=10, progress=lambda position, section: sections.append(section))
+    assert sections[0] == "assets"
+    assert len(db.get_asset_transactions(asset_id)) == 5
+    assert len(db.get_price_history(asset_id)) == 25
+    db.close()
+
+
+def test_importacao_csv_rejeita_linhas_invalidas(tmp_path):
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    asset_id = db.add_asset("PETR4", "Ação")
+    db.add_price_history(asset_id, 20.0, "2024-01-02")
+    (tmp_path / "assets.csv").write_text("id,name,type\n1,PETR4,Ação\n2,VALE3,Ação\n")
+    (tmp_path / "transactions.csv").write_text(
+        "id,asset_id,transaction_type,quantity,price,transaction_date\n"
+        "1,1,compra,100,20.0,02/01/2024\n2,2,doação,5,60.0,2024-01-03\n3,9,compra,5,60.0,2024-01-03\n4,2,compra,abc,60.0,2024-01-03\n")
+    (tmp_path / "price_history.csv").write_text(
+        "id,asset_id,price,record_date\n7,1,21.0,2024-01-02\n8,1,22.0,2024-13-45\n9,2,61.0,2024-01-03\n10,2,62.0,2024-01-03\n")
+    report = db.import_data_from_csv(*(str(tmp_path / f"{t}.csv") for t in ("assets", "transactions", "price_history", "dividends")), chunk_size=2)
+    # PETR4 já está gravado com o mesmo id e conteúdo: é mantido, não reimportado
+    assert report and report.imported == {"assets": 1, "transactions": 1, "price_history": 3}
+    assert report.rejected == {"assets": 0, "transactions": 3, "price_history": 1}
+    assert set(report.skipped) == {"dividends", "alerts", "events"}
+    # Preço repetido para a mesma data substitui o gravado
+    assert db.get_price_history(asset_id) == [("2024-01-02", 21.0)]
+    assert db.get_price_history(2) == [("2024-01-03", 62.0)]
+    assert db.get_asset_transactions(asset_id)[0][5] == "2024-01-02"
+    with open(tmp_path / "rejeitados_transactions.csv") as f:
+        rejected = f.read().splitlines()
+    assert rejected[1:] == ["3,tipo de transação deve ser compra ou venda,2,2,doação,5,60.0,2024-01-03",
+                            "4,ativo inexistente,3,9,compra,5,60.0,2024-01-03",
+                            "5,quantity não é numérico,4,2,compra,abc,60.0,2024-01-03"]
+    db.close()
+
+
+def test_importacao_csv_nao_sobrescreve_registro_com_mesmo_id(tmp_path):
+    """CSV de outra carteira: um id já usado por outro ativo é rejeitado, com as linhas que o referenciam"""
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    asset_id = db.add_asset("PETR4", "Ação")
+    db.add_transaction(asset_id, "compra", 100, 20.0, "2024-01-02")
+    (tmp_path / "assets.csv").write_text(f"id,name,type\n{asset_id},VALE3,Ação\n")
+    (tmp_path / "transactions.csv").write_text(
+        f"id,asset_id,transaction_type,quantity,price,transaction_date\n7,{asset_id},venda,5,60.0,2024-01-03\n")
+    report = db.import_data_from_csv(str(tmp_path / "assets.csv"), str(tmp_path / "transactions.csv"), None)
+    assert report and report.imported == {"assets": 0, "transactions": 0}
+    assert report.rejected == {"assets": 1, "transactions": 1}
+    assert db.get_asset_by_id(asset_id)[1] == "PETR4"
+    assert [(t[2], t[3]) for t in db.get_asset_transactions(asset_id)] == [("compra", 100)]
+    with open(tmp_path / "rejeitados_assets.csv") as f:
+        assert f.read().splitlines()[1] == f"2,id já usado por outro registro,{asset_id},VALE3,Ação"
+    with open(tmp_path / "rejeitados_transactions.csv") as f:
+        assert f.read().splitlines()[1].startswith("2,ativo rejeitado na importação,")
+    db.close()
+
+
+def test_backup_incremental_e_restauracao_a_quente(tmp_path):
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    asset_id = db.add_asset("PETR4", "Ação")
+    import datetime
+    db.add_price_history_bulk((asset_id, 1.0 + i, datetime.date(2000, 1, 1) + datetime.timedelta(days=i)) for i in range(3000))
+    progress = []
+
+    def gravar_durante_o_backup(copied, total, speed):
+        progress.append((copied, total))
+        if len(progress) == 2:
+            # Gravações não esperam o backup e não entram na cópia em andamento
+            db.add_asset("VALE3", "Ação")
+
+    backup = str(tmp_path / "backup.db")
+    assert db.backup_database(backup, pages=5, sleep=0, progress=gravar_durante_o_backup)
+    assert len(progress) > 2 and progress[-1][0] == progress[-1][1]
+    assert db.get_asset_by_name("VALE3")
+
+    with db.pool.reader() as conn:
+        # A restauração não invalida as conexões de leitura já abertas
+        conn.execute("SELECT COUNT(*) FROM assets").fetchone()
+    assert db.restore_database(backup)
+    assert db.get_asset_by_name("VALE3") is None
+    assert len(db.get_price_history(asset_id)) == 3000
+    assert os.path.exists(str(tmp_path / "carteira.db.bak"))
+    db.close()
+
+
+def test_exclusao_de_ativos_em_cascata(tmp_path):
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    petr = db.add_asset("PETR4", "Ação")
+    vale = db.add_asset("VALE3", "Ação")
+    itub = db.add_asset("ITUB4", "Ação")
+    for asset_id in (petr, vale, itub):
+        db.add_transactions_bulk([(asset_id, "compra", 10, 20.0, "2024-01-02")])
+        db.add_price_history_bulk([(asset_id, 20.0, "2024-01-02"), (asset_id, 21.0, "2024-01-03")])
+        db.add_event("2024-01-10", "dividendo", "Data com", asset_id)
+    db.add_dividend(petr, 0.5, "2024-01-15")
+    db.add_alert(vale, "price_target", target_value=30.0)
+
+    assert db.delete_assets([petr, vale]) == {"transactions": 2, "price_history": 4, "dividends": 1, "alerts": 1,
+                                              "events": 2, "assets": 2}
+    assert [a[1] for a in db.get_all_assets_with_transactions()] == ["ITUB4"]
+    with db.pool.reader() as conn:
+        for table in ("transactions", "price_history", "events", "positions"):
+            assert conn.execute(f"SELECT COUNT(*) FROM {table} WHERE asset_id != ?", (itub,)).fetchone()[0] == 0
+    # Linhas de ativos inexistentes são ignoradas na gravação em lote
+    assert db.add_price_history_bulk([(petr, 22.0, "2024-01-04"), (itub, 22.0, "2024-01-04")]) == (1, 1)
+    db.close()
+
+
+def test_retrato_de_leitura_consistente(tmp_path):
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    asset_id = db.add_asset("PETR4", "Ação")
+    db.add_price_history(asset_id, 20.0, "2024-01-02")
+
+    def atualizacao():
+        db.add_price_history(asset_id, 21.0, "2024-01-03")
+        db.add_asset("VALE3", "Ação")
+
+    with db.snapshot():
+        assert len(db.get_price_history(asset_id)) == 1
+        # A gravação de outra thread não espera o retrato terminar...
+        writer = threading.Thread(target=atualizacao)
+        writer.start()
+        writer.join(5)
+        assert not writer.is_alive()
+        # ...e não aparece em nenhuma leitura feita dentro dele
+        assert len(db.get_price_history(asset_id)) == 1
+        assert [a[1] for a in db.get_all_assets()] == ["PETR4"]
+        with db.snapshot():
+            assert db.get_asset_by_name("VALE3") is None
+    assert len(db.get_price_history(asset_id)) == 2
+    assert db.get_asset_by_name("VALE3")
+    db.close()
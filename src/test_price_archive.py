@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database_manager import DatabaseManager
+from price_archive import PriceArchive
+
+
+def test_arquivo_acompanha_o_historico(tmp_path):
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    petr = db.add_asset("PETR4", "Ação")
+    vale = db.add_asset("VALE3", "Ação")
+    db.add_price_history_bulk([(petr, 20.0, "2023-12-28"), (petr, 21.0, "2024-01-02"), (vale, 60.0, "2024-01-02"),
+                               (vale, 61.0, "2024-01-03")])
+    archive = PriceArchive(db, str(tmp_path / "precos"), sync_seconds=0)
+
+    dates, prices = archive.get_series(petr)
+    assert dates.tolist() == [np.datetime64("2023-12-28"), np.datetime64("2024-01-02")]
+    assert prices.tolist() == [20.0, 21.0]
+    # Intervalo dentro de um ano: visão do arquivo mapeado, sem cópia
+    dates, prices = archive.get_series(vale, "2024-01-01", "2024-01-02")
+    assert isinstance(prices, np.memmap) and prices.tolist() == [60.0]
+
+    db.add_price_history(petr, 22.0, "2024-01-03")
+    dates, matrix = archive.get_matrix([petr, vale], "2024-01-01")
+    assert len(dates) == 2
+    assert matrix.tolist() == [[21.0, 60.0], [22.0, 61.0]]
+
+    # Exclusão no banco: o arquivo é reconstruído
+    db.delete_asset(vale)
+    assert len(archive.get_series(vale)[0]) == 0
+    assert PriceArchive(db, str(tmp_path / "precos")).get_series(petr)[1].tolist() == [20.0, 21.0, 22.0]
+    db.close()
+
+
+def test_arquivo_acompanha_precos_alterados_na_importacao(tmp_path):
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    petr = db.add_asset("PETR4", "Ação")
+    db.add_price_history_bulk([(petr, 20.0, "2024-01-02"), (petr, 21.0, "2024-01-03")])
+    archive = PriceArchive(db, str(tmp_path / "precos"), sync_seconds=0)
+    assert archive.get_series(petr)[1].tolist() == [20.0, 21.0]
+
+    # Importação sobre uma data já gravada: o preço é atualizado no lugar, sem id novo
+    csv_path = tmp_path / "price_history.csv"
+    csv_path.write_text(f"asset_id,price,record_date\n{petr},99.0,2024-01-02\n{petr},22.0,2024-01-04\n")
+    assert db.import_data_from_csv(None, None, str(csv_path))
+    assert db.get_price_history(petr)[0][1] == 99.0
+    assert archive.get_series(petr)[1].tolist() == [99.0, 21.0, 22.0]
+    assert archive.get_matrix([petr])[1][:, 0].tolist() == [99.0, 21.0, 22.0]
+    db.close()
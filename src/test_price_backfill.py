@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import datetime
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database_manager import DatabaseManager
+from replay_price_provider import ReplayPriceProvider
+from price_backfill import PriceBackfillService
+
+
+def test_ativos_com_lacunas_diferentes_baixados_juntos(tmp_path):
+    """Ativos com históricos até datas diferentes geram uma única requisição em lote"""
+    today = datetime.date.today()
+    days = [(today - datetime.timedelta(days=n)).isoformat() for n in range(5, 0, -1)]
+    path = tmp_path / "cotacoes.csv"
+    path.write_text("ticker,date,close\n" + "".join(
+        f"{ticker}.SA,{day},{price + i}\n" for ticker, price in (("PETR4", 20), ("VALE3", 80)) for i, day in enumerate(days)))
+    provider = ReplayPriceProvider(str(path))
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    petr4 = db.add_asset("PETR4", "Ação")
+    vale3 = db.add_asset("VALE3", "Ação")
+    db.add_price_history_bulk([(petr4, 20.0, days[0]), (vale3, 80.0, days[0]), (vale3, 81.0, days[1]), (vale3, 82.0, days[2])])
+
+    assert PriceBackfillService(db, provider).backfill_all() == 6
+    assert provider.request_count == 1
+    assert [price for _, price in db.get_price_history(petr4)] == [20.0, 21.0, 22.0, 23.0, 24.0]
+    assert [price for _, price in db.get_price_history(vale3)] == [80.0, 81.0, 82.0, 83.0, 84.0]
+    db.close()
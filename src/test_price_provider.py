@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import time
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from replay_price_provider import ReplayPriceProvider
+
+COTACOES = """ticker,date,close
+PETR4.SA,2023-01-02,22.00
+PETR4.SA,2023-01-03,22.50
+PETR4.SA,2023-01-04,23.10
+VALE3.SA,2023-01-02,85.00
+VALE3.SA,2023-01-03,86.20
+^BVSP,2023-01-02,106000
+^BVSP,2023-01-03,104000
+"""
+
+
+def _criar_arquivo(tmp_path):
+    path = tmp_path / "cotacoes.csv"
+    path.write_text(COTACOES)
+    return str(path)
+
+
+def test_cotacoes_atuais_em_lote(tmp_path):
+    """Cotação atual é o último fechamento gravado; ticker desconhecido fica com None"""
+    provider = ReplayPriceProvider(_criar_arquivo(tmp_path))
+    prices = provider.get_current_prices(["PETR4.SA", "VALE3.SA", "INVALIDTICKER"])
+    assert prices == {"PETR4.SA": 23.10, "VALE3.SA": 86.20, "INVALIDTICKER": None}
+    # Um único lote => uma única requisição
+    assert provider.request_count == 1
+
+
+def test_cache_evita_nova_requisicao(tmp_path):
+    provider = ReplayPriceProvider(_criar_arquivo(tmp_path))
+    provider.get_current_prices(["PETR4.SA"])
+    provider.get_current_prices(["PETR4.SA"])
+    assert provider.request_count == 1
+    assert provider.cache_stats()["memory_hits"] == 1
+
+
+def test_cache_persistente_fora_da_pasta_atual(tmp_path, monkeypatch):
+    """Sem caminho, o cache de cotações vai para a pasta de cache do usuário; o app o grava ao lado do banco"""
+    from quote_cache import QuoteCache, default_cache_path
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    cache = QuoteCache()
+    assert cache.db_name == str(tmp_path / "cache" / "carteira" / "quote_cache.db")
+    assert os.path.exists(cache.db_name) and not os.path.exists("quote_cache.db")
+    cache.close()
+    assert default_cache_path("/dados/carteira.db") == "/dados/carteira_cotacoes.db"
+
+
+def test_as_of_e_historico(tmp_path):
+    provider = ReplayPriceProvider(_criar_arquivo(tmp_path), as_of="2023-01-03")
+    assert provider.get_current_price("PETR4.SA") == 22.50
+    assert provider.get_historical_prices("^BVSP", "2023-01-01", "2023-01-03") == [("02/01/2023", 106000.0)]
+    bulk = provider.get_historical_prices_bulk(["PETR4.SA", "VALE3.SA"], "2023-01-03")
+    assert bulk == {"PETR4.SA": [("2023-01-03", 22.50)], "VALE3.SA": [("2023-01-03", 86.20)]}
+
+
+def test_latencia_simulada_e_concorrencia(tmp_path):
+    """Consultas por ticker rodam em paralelo: 4 x 100 ms com 4 workers levam ~100 ms"""
+    provider = ReplayPriceProvider(_criar_arquivo(tmp_path), latency=0.1, max_workers=4)
+    start = time.perf_counter()
+    results = dict(provider.iter_historical_prices(["PETR4.SA", "VALE3.SA", "^BVSP", "INVALIDTICKER"]))
+    elapsed = time.perf_counter() - start
+    assert results["INVALIDTICKER"] is None
+    assert len(results["PETR4.SA"]) == 3
+    assert elapsed < 0.35
+
+
+def test_lotes_de_cotacoes_em_paralelo(tmp_path):
+    """Com chunk_size=1 cada ticker é um lote; os 3 lotes de 100 ms rodam juntos"""
+    provider = ReplayPriceProvider(_criar_arquivo(tmp_path), latency=0.1, chunk_size=1, max_workers=3)
+    start = time.perf_counter()
+    prices = provider.get_current_prices(["PETR4.SA", "VALE3.SA", "INVALIDTICKER"])
+    elapsed = time.perf_counter() - start
+    assert prices == {"PETR4.SA": 23.10, "VALE3.SA": 86.20, "INVALIDTICKER": None}
+    assert provider.request_count == 3
+    assert elapsed < 0.25
+
+
+def test_consultas_simultaneas_compartilham_requisicao(tmp_path):
+    """Threads pedindo o mesmo histórico ao mesmo tempo geram uma única requisição"""
+    provider = ReplayPriceProvider(_criar_arquivo(tmp_path), latency=0.2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(provider.get_historical_prices("^BVSP")))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert provider.request_count == 1
+    assert len(results) == 4 and all(r == results[0] for r in results)
+
+
+def test_ticker_com_falha_fica_suprimido(tmp_path):
+    """Ticker sem dados não é consultado de novo até o fim do recuo"""
+    provider = ReplayPriceProvider(_criar_arquivo(tmp_path))
+    provider.get_current_prices(["PETR4.SA", "INVALIDTICKER"])
+    assert provider.get_current_prices(["INVALIDTICKER"]) == {"INVALIDTICKER": None}
+    assert provider.request_count == 1
+    assert provider.suppressed_tickers()["INVALIDTICKER"][0] == 1
+
+
+def test_lote_sem_dados_nao_suprime_os_tickers(tmp_path):
+    """Um lote que falha inteiro conta uma vez para o disjuntor e não suprime os tickers"""
+    from circuit_breaker import CircuitBreaker
+    provider = ReplayPriceProvider(_criar_arquivo(tmp_path), circuit_breaker=CircuitBreaker(min_requests=2))
+    provider._fetch_current_prices = lambda tickers: {}
+    assert provider.get_current_prices(["PETR4.SA", "VALE3.SA"]) == {"PETR4.SA": None, "VALE3.SA": None}
+    assert provider.suppressed_tickers() == {}
+    assert provider.circuit_status() == "fechado"
+    # A segunda falha do lote completa as min_requests do disjuntor
+    provider.get_current_prices(["PETR4.SA", "VALE3.SA"])
+    assert provider.circuit_status() == "aberto"
+
+
+def test_circuito_abre_com_muitos_erros(tmp_path):
+    """Com a fonte falhando, o circuito abre e as consultas deixam de ser feitas"""
+    from circuit_breaker import CircuitBreaker
+    provider = ReplayPriceProvider(_criar_arquivo(tmp_path), circuit_breaker=CircuitBreaker(min_requests=3))
+
+    def fonte_fora_do_ar(tickers):
+        provider._simulate_latency()
+        raise ConnectionError("fonte fora do ar")
+
+    provider._fetch_current_prices = fonte_fora_do_ar
+    for i in range(5):
+        provider.get_current_price(f"FALHA{i}")
+    assert provider.circuit_status() == "aberto"
+    assert provider.request_count == 3
+    assert provider.get_current_price("PETR4.SA") is None
+    assert provider.request_count == 3
+
+
+def test_tickers_invalidos_nao_abrem_o_circuito(tmp_path):
+    """Tickers sem dados vão para o cache negativo, uma vez por consulta, sem contar como erro da fonte"""
+    from circuit_breaker import CircuitBreaker
+    provider = ReplayPriceProvider(_criar_arquivo(tmp_path), latency=0.2, circuit_breaker=CircuitBreaker(min_requests=3))
+    threads = [threading.Thread(target=provider.get_current_price, args=("INVALIDTICKER",)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i in range(5):
+        provider.get_current_price(f"FALHA{i}")
+    assert provider.circuit_status() == "fechado"
+    # As três consultas simultâneas viraram uma requisição e uma única falha
+    assert provider.suppressed_tickers()["INVALIDTICKER"][0] == 1
+    assert provider.get_current_price("PETR4.SA") == 23.10
+
+
+def test_espera_por_consulta_compartilhada_expira(tmp_path):
+    """Quem aguarda a consulta de outra thread e esgota o tempo limite recebe None, sem erro"""
+    provider = ReplayPriceProvider(_criar_arquivo(tmp_path), latency=1.0, request_timeout=0.2)
+    results = {}
+
+    def consultar(nome, func):
+        results[nome] = func()
+
+    lider = threading.Thread(target=consultar, args=("lider", lambda: provider.get_current_price("PETR4.SA")))
+    lider.start()
+    time.sleep(0.1)
+    assert provider.get_current_price("PETR4.SA") is None
+    assert provider.get_current_prices(["PETR4.SA"]) == {"PETR4.SA": None}
+    lider.join()
+    assert results["lider"] == 23.10
+
+    historico = threading.Thread(target=consultar, args=("historico", lambda: provider.get_historical_prices_bulk(["^BVSP"])))
+    historico.start()
+    time.sleep(0.1)
+    assert provider.get_historical_prices_bulk(["^BVSP"]) == {}
+    historico.join()
+    assert len(results["historico"]["^BVSP"]) == 2
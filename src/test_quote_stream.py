@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database_manager import DatabaseManager
+from quote_stream import QuoteStream, SimulatedTickSource, PriceHistoryRecorder, drain_latest
+from alert_engine import AlertEngine
+
+
+def test_ticks_chegam_a_todos_os_consumidores(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # log_message grava app_log.txt no diretório atual
+    db = DatabaseManager(str(tmp_path / "carteira.db"))
+    asset_id = db.add_asset("PETR4", "Ação")
+    db.add_transaction(asset_id, "compra", 100, 20.0, "2023-01-02")
+    db.add_alert(asset_id, "price_target", target_value=25.0)
+
+    stream = QuoteStream()
+    tree = stream.subscribe("treeview")
+    disparados = []
+    engine = AlertEngine(db, stream, on_alert=lambda title, msg: disparados.append(title))
+    engine.reload()
+    recorder = PriceHistoryRecorder(db, stream)
+
+    source = SimulatedTickSource(stream, {"PETR4.SA": 22.0}, seed=1)
+    source.step()
+    stream.publish("PETR4.SA", 26.0)
+
+    # A tabela só precisa do último tick de cada ticker
+    assert drain_latest(tree)["PETR4.SA"].price == 26.0
+    for ticker, tick in drain_latest(engine.subscriber).items():
+        engine.evaluate(ticker, tick.price)
+    assert disparados == ["Alerta de Preço"]
+    assert db.get_active_alerts() == []
+    assert recorder.flush() == 1
+    assert db.get_price_history(asset_id)[0][1] == 26.0
+    # Vale o último preço do dia
+    stream.publish("PETR4.SA", 27.5)
+    assert recorder.flush() == 1
+    assert db.get_price_history(asset_id) == [(db.get_price_history(asset_id)[0][0], 27.5)]
+    db.close()
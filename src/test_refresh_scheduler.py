@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from replay_price_provider import ReplayPriceProvider
+from refresh_scheduler import QuoteRefreshScheduler, PRIORITY_ALERT, PRIORITY_VISIBLE, PRIORITY_DORMANT
+
+COTACOES = """ticker,date,close
+PETR4.SA,2023-01-02,22.00
+VALE3.SA,2023-01-02,85.00
+ITUB4.SA,2023-01-02,25.00
+"""
+
+
+def test_prioridades_e_orcamento(tmp_path):
+    """Uma requisição de 2 tickers por minuto: alerta e visível passam na frente do inativo"""
+    path = tmp_path / "cotacoes.csv"
+    path.write_text(COTACOES)
+    provider = ReplayPriceProvider(str(path), chunk_size=2)
+    scheduler = QuoteRefreshScheduler(provider, requests_per_window=1, window_seconds=60)
+    scheduler.set_tickers({"ITUB4.SA": PRIORITY_DORMANT, "VALE3.SA": PRIORITY_VISIBLE, "PETR4.SA": PRIORITY_ALERT}, now=0)
+
+    assert set(scheduler.run_once(now=0)) == {"PETR4.SA", "VALE3.SA"}
+    # Sem requisição disponível na janela, o inativo espera
+    assert scheduler.run_once(now=1) == {}
+    assert scheduler.run_once(now=30) == {}
+    # Na janela seguinte, o inativo vai junto com o ticker com alerta, que venceu de novo
+    assert scheduler.run_once(now=60) == {"PETR4.SA": 22.0, "ITUB4.SA": 25.0}
+    assert set(scheduler.run_once(now=125)) == {"PETR4.SA", "VALE3.SA"}
+    # Uma requisição por janela
+    assert provider.request_count == 3
+
+
+def test_tickers_recem_consultados_nao_vencem_na_hora(tmp_path):
+    """Os tickers cotados pela carga inicial da tabela só vencem um intervalo depois"""
+    path = tmp_path / "cotacoes.csv"
+    path.write_text(COTACOES)
+    provider = ReplayPriceProvider(str(path))
+    scheduler = QuoteRefreshScheduler(provider)
+    scheduler.set_tickers({"PETR4.SA": PRIORITY_ALERT, "VALE3.SA": PRIORITY_VISIBLE, "ITUB4.SA": PRIORITY_DORMANT},
+                          now=10, fetched_at={"PETR4.SA": 10, "VALE3.SA": 10})
+
+    # Só o ticker que a carga inicial não cotou vence agora
+    assert scheduler.run_once(now=10) == {"ITUB4.SA": 25.0}
+    assert scheduler.run_once(now=70) == {"PETR4.SA": 22.0}
+    assert provider.request_count == 2
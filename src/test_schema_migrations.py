@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import sqlite3
+import pytest
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from connection_pool import ConnectionPool
+from schema_migrations import BatchedStatement, Migration, MigrationRunner
+
+
+def test_versoes_de_user_version_sao_importadas(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "carteira.db"))
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.execute("PRAGMA user_version = 1")
+    migrations = [Migration(1, "já aplicada", ["CREATE TABLE t (x INTEGER)"]),
+                  Migration(2, "índice", ["CREATE INDEX idx_t ON t (x)"])]
+    runner = MigrationRunner(pool, migrations)
+    assert runner.run() == [2]
+    assert runner.run() == []
+    assert runner.current_version() == 2
+    pool.close()
+
+
+def test_migracao_com_erro_nao_fica_aplicada(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "carteira.db"))
+    runner = MigrationRunner(pool, [Migration(1, "com erro", ["CREATE TABLE t (x INTEGER)", "INSERT INTO inexistente VALUES (1)"])])
+    with pytest.raises(sqlite3.Error):
+        runner.run()
+    assert runner.current_version() == 0
+    with pool.reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 't'").fetchone()[0] == 0
+    pool.close()
+
+
+def test_passo_em_lote_percorre_a_tabela_toda(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "carteira.db"))
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(1050)])
+        conn.execute("DELETE FROM t WHERE x % 7 = 0")
+    step = BatchedStatement("t", "UPDATE t SET x = -x WHERE rowid BETWEEN :first AND :last AND x > 0", batch_size=100)
+    assert MigrationRunner(pool, [Migration(1, "negativos", [step])]).run() == [1]
+    with pool.reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t WHERE x > 0").fetchone()[0] == 0
+    assert step.run(pool) == 0
+    pool.close()
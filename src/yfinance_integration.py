@@ -1,16 +1,21 @@
 import yfinance as yf
 import pandas as pd
+import threading
+from price_provider import PriceProvider
 
-class YFinanceIntegration:
-    def __init__(self):
-        pass
+# yf.download guarda estado em variáveis globais do módulo, então downloads
+# em lote não podem rodar simultaneamente
+_download_lock = threading.Lock()
 
-    def get_current_price(self, ticker):
+class YFinanceIntegration(PriceProvider):
+    """Provedor de cotações ao vivo via Yahoo Finance (pacote yfinance)"""
+
+    def _fetch_current_price(self, ticker):
         try:
             stock = yf.Ticker(ticker)
-            hist = stock.history(period="1d")
+            hist = stock.history(period="1d", timeout=self.request_timeout)
             if not hist.empty:
-                return hist["Close"].iloc[-1]
+                return float(hist["Close"].iloc[-1])
             else:
                 print(f"Não foi possível obter dados para {ticker}")
                 return None
@@ -18,10 +23,41 @@ class YFinanceIntegration:
             print(f"Erro ao consultar {ticker} no yfinance: {e}")
             return None
 
-    def get_historical_prices(self, ticker, start_date=None, end_date=None):
+    def _download_closes(self, tickers, **period_args):
+        """Baixa os fechamentos de um lote de tickers em uma única chamada ao yf.download"""
+        try:
+            with _download_lock:
+                data = yf.download(tickers, group_by="column", progress=False, timeout=self.request_timeout, **period_args)
+        except Exception as e:
+            print(f"Erro ao consultar lote de {len(tickers)} tickers no yfinance: {e}")
+            return None
+        if data is None or data.empty:
+            print(f"Não foi possível obter dados para o lote: {', '.join(tickers)}")
+            return None
+
+        closes = data["Close"]
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(name=tickers[0])
+        return closes
+
+    def _fetch_current_prices(self, tickers):
+        # period="5d" garante um último fechamento mesmo em fins de semana e feriados
+        closes = self._download_closes(tickers, period="5d")
+        prices = {}
+        if closes is None:
+            return prices
+        for ticker in tickers:
+            series = closes[ticker].dropna() if ticker in closes.columns else None
+            if series is None or series.empty:
+                print(f"Não foi possível obter dados para {ticker}")
+                continue
+            prices[ticker] = float(series.iloc[-1])
+        return prices
+
+    def _fetch_historical_prices(self, ticker, start_date=None, end_date=None):
         try:
             stock = yf.Ticker(ticker)
-            hist = stock.history(start=start_date, end=end_date)
+            hist = stock.history(start=start_date, end=end_date, timeout=self.request_timeout)
             if not hist.empty:
                 # Retorna uma lista de tuplas (data, preço de fechamento)
                 return list(zip(hist.index.strftime("%d/%m/%Y"), hist["Close"].tolist()))
@@ -32,6 +68,19 @@ class YFinanceIntegration:
             print(f"Erro ao consultar histórico de {ticker} no yfinance: {e}")
             return None
 
+    def _fetch_historical_prices_bulk(self, tickers, start_date=None, end_date=None):
+        closes = self._download_closes(tickers, start=start_date, end=end_date)
+        history = {}
+        if closes is None:
+            return history
+        for ticker in tickers:
+            if ticker not in closes.columns:
+                continue
+            series = closes[ticker].dropna()
+            if not series.empty:
+                history[ticker] = list(zip(series.index.strftime("%Y-%m-%d"), series.astype(float).tolist()))
+        return history
+
 if __name__ == "__main__":
     yf_integration = YFinanceIntegration()
     # Exemplo de uso
@@ -47,6 +96,11 @@ if __name__ == "__main__":
     if price_invalid:
         print(f"Preço atual de INVALIDTICKER: {price_invalid:.2f}")
 
+    # Teste de cotação em lote
+    batch_prices = yf_integration.get_current_prices(["PETR4.SA", "VALE3.SA", "INVALIDTICKER"])
+    print(f"Cotações em lote: {batch_prices}")
+    print(f"Estatísticas do cache: {yf_integration.cache_stats()}")
+
     # Teste de histórico de preços
     historical_petr4 = yf_integration.get_historical_prices("PETR4.SA", start_date="2023-01-01", end_date="2023-01-31")
     if historical_petr4: